@@ -0,0 +1,122 @@
+"""Compare the in-memory and SQLite query history stores.
+
+Usage::
+
+    python benchmarks/history_stores.py --entries 10000000 --path /tmp/history.db
+
+Entries are spread over ``--clients`` clients and ``--tables`` tables with one
+submission per second. The script reports append throughput, resident memory
+growth and the median latency of typical history lookups for each store.
+"""
+
+from __future__ import annotations
+
+import argparse
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from query import (  # noqa: E402
+    InMemoryQueryHistoryStore,
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    QueryHistoryStore,
+    SQLiteQueryHistoryStore,
+)
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def generate(count: int, clients: int, tables: int) -> Iterator[QueryHistoryEntry]:
+    for index in range(count):
+        yield QueryHistoryEntry(
+            query_id=f"q-{index:09d}",
+            client_id=f"client-{index % clients}",
+            statement="SELECT count(*) FROM analytics.events WHERE event_type = 'click'",
+            status="FAILED" if index % 50 == 0 else "SUCCEEDED",
+            submitted_at=BASE + timedelta(seconds=index),
+            completed_at=BASE + timedelta(seconds=index, milliseconds=250),
+            elapsed_ms=250.0,
+            data_scanned_mb=12.5,
+            row_count=1,
+            cost_usd=0.0001,
+            tables=(f"analytics.table_{index % tables}",),
+        )
+
+
+def rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(store: QueryHistoryStore, args: argparse.Namespace) -> float:
+    started = time.perf_counter()
+    batch: List[QueryHistoryEntry] = []
+    for entry in generate(args.entries, args.clients, args.tables):
+        batch.append(entry)
+        if len(batch) == args.batch:
+            store.append_many(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+    return time.perf_counter() - started
+
+
+def median_ms(call: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def lookups(args: argparse.Namespace) -> dict[str, QueryHistoryFilter]:
+    newest = BASE + timedelta(seconds=args.entries)
+    middle = BASE + timedelta(seconds=args.entries // 2)
+    return {
+        "latest 100": QueryHistoryFilter(client_id="client-1", limit=100),
+        "last day, limit 100": QueryHistoryFilter(client_id="client-1", start=newest - timedelta(days=1), limit=100),
+        "one hour, unlimited": QueryHistoryFilter(client_id="client-1", start=middle, end=middle + timedelta(hours=1)),
+        "table, limit 100": QueryHistoryFilter(client_id="client-1", table=f"table_{1 % args.tables}", limit=100),
+    }
+
+
+def run(name: str, store: QueryHistoryStore, args: argparse.Namespace) -> None:
+    before = rss_mb()
+    elapsed = load(store, args)
+    print(f"{name}: {args.entries / elapsed:,.0f} entries/s, max RSS +{rss_mb() - before:,.0f} MB")
+    for label, query in lookups(args).items():
+        rows = len(store.search(query))
+        print(f"  {label:<22} {median_ms(lambda: store.search(query), args.repeat):8.2f} ms ({rows} rows)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--path", type=Path, help="SQLite database file (a temporary file by default)")
+    parser.add_argument("--skip-memory", action="store_true", help="only benchmark the SQLite store")
+    args = parser.parse_args()
+
+    # SQLite runs first so the in-memory store's growth does not skew its RSS reading.
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteQueryHistoryStore(args.path or Path(directory) / "history.db")
+        run("sqlite", store, args)
+        store.close()
+    if not args.skip_memory:
+        run("in-memory", InMemoryQueryHistoryStore(), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
 """API level helpers for enforcing entitlements."""
 
-from .entitlements import EntitlementError, EntitlementService, QueryExecutionStats
+from .async_entitlements import AsyncEntitlementService
+from .entitlements import EntitlementCache, EntitlementError, EntitlementService, QueryExecutionStats
+from .rate_limit import InMemorySharedCounter, RateLimiter, RateLimitExceeded, RedisSharedCounter
+from .usage import UsageBuffer, UsageTotals
 
 __all__ = [
+    "AsyncEntitlementService",
+    "EntitlementCache",
     "EntitlementError",
     "EntitlementService",
+    "InMemorySharedCounter",
     "QueryExecutionStats",
+    "RateLimitExceeded",
+    "RateLimiter",
+    "RedisSharedCounter",
+    "UsageBuffer",
+    "UsageTotals",
 ]
@@ -1,25 +1,46 @@
 """Minimal Flask application exposing billing endpoints for the frontend."""
 from __future__ import annotations
 
+import json
 import logging
+import math
 import os
+import re
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
 from billing.checkout import create_billing_portal_session, create_checkout_session, plan_display_names
 from billing.stripe_catalog import get_plan_by_id
 from api.entitlements import EntitlementError
-from query import QueryError, QueryHistoryFilter, QueryService, serialize_history_entry, summarise_history
-from query.history import QueryHistoryStore
-from query.models import QueryRequest
+from api.rate_limit import RateLimitExceeded
+from query import QueryError, QueryHistoryFilter, QueryService, serialize_history_entry, summarise_search
+from query.arrow import ARROW_STREAM_MIME_TYPE, arrow_available, iter_arrow_ipc_stream
+from query.history import QueryHistoryStore, decode_history_cursor, page_history
+from query.jobs import QueryJobInfo, QueryJobManager
+from query.models import (
+    RESULT_FORMAT_ARROW,
+    RESULT_FORMAT_ROWS,
+    QueryRequest,
+    QueryResult,
+    QueryStatistics,
+    chunk_rows,
+)
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:  # pragma: no cover - used for type checking only
     from billing.firestore_repository import BillingRepository
 
 LOGGER = logging.getLogger(__name__)
+NDJSON_MIME_TYPE = "application/x-ndjson"
+_DEFAULT_HISTORY_PAGE_SIZE = 50
+_MAX_HISTORY_PAGE_SIZE = 500
+_UNAVAILABLE_ERROR_CODES = frozenset({"engine_busy", "engine_unavailable", "queue_full", "queue_timeout", "spool_full"})
+_CONFLICT_ERROR_CODES = frozenset({"query_cancelled", "duplicate_query_id"})
+_TOO_MANY_ERROR_CODES = frozenset({"too_many_jobs"})
+# Query ids key history documents and in-flight bookkeeping, so they stay path-safe.
+_QUERY_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
 
@@ -37,11 +58,198 @@ def _parse_datetime(value: str | None) -> Optional[datetime]:
         raise ValueError(f"Invalid ISO-8601 timestamp: {value}")
 
 
+class _InvalidQueryPayload(ValueError):
+    """Raised when a query request body fails validation."""
+
+    def __init__(self, error: str, message: str | None = None) -> None:
+        super().__init__(message or error)
+        self.error = error
+        self.message = message
+
+    def response(self) -> Any:
+        body = {"error": self.error}
+        if self.message:
+            body["message"] = self.message
+        return jsonify(body), 400
+
+
+def _parse_query_request(payload: Dict[str, Any], **options: Any) -> QueryRequest:
+    client_id = payload.get("client_id") or payload.get("clientId")
+    sql = payload.get("sql") or payload.get("query")
+    limit = payload.get("limit")
+    snapshot_id = payload.get("snapshot_id") or payload.get("snapshotId")
+    as_of_raw = payload.get("as_of_timestamp") or payload.get("asOfTimestamp")
+    estimated_scan = payload.get("estimated_scan_mb") or payload.get("estimatedScanMb")
+    timeout = payload.get("timeout_ms") or payload.get("timeoutMs")
+    query_id = payload.get("query_id") or payload.get("queryId")
+    params = payload.get("params")
+
+    if not client_id or not isinstance(client_id, str):
+        raise _InvalidQueryPayload("missing_client_id")
+    if not sql or not isinstance(sql, str):
+        raise _InvalidQueryPayload("missing_query")
+
+    try:
+        as_of_timestamp = _parse_datetime(as_of_raw if isinstance(as_of_raw, str) else None)
+    except ValueError as exc:
+        raise _InvalidQueryPayload("invalid_time_travel", str(exc)) from exc
+
+    parsed_limit: Optional[int] = None
+    if isinstance(limit, int):
+        parsed_limit = limit
+    elif isinstance(limit, str) and limit.strip():
+        try:
+            parsed_limit = int(limit)
+        except ValueError as exc:
+            raise _InvalidQueryPayload("invalid_limit") from exc
+
+    estimated_scan_value: Optional[float] = None
+    if isinstance(estimated_scan, (int, float)):
+        estimated_scan_value = float(estimated_scan)
+    elif isinstance(estimated_scan, str) and estimated_scan.strip():
+        try:
+            estimated_scan_value = float(estimated_scan)
+        except ValueError as exc:
+            raise _InvalidQueryPayload("invalid_estimated_scan") from exc
+
+    parsed_timeout: Optional[int] = None
+    if timeout is not None:
+        try:
+            parsed_timeout = int(timeout)
+        except (TypeError, ValueError) as exc:
+            raise _InvalidQueryPayload("invalid_timeout") from exc
+        if parsed_timeout <= 0:
+            raise _InvalidQueryPayload("invalid_timeout")
+
+    if params is not None and not isinstance(params, (list, dict)):
+        raise _InvalidQueryPayload("invalid_params", "params must be a list or an object")
+
+    if query_id is not None and (not isinstance(query_id, str) or not _QUERY_ID_PATTERN.match(query_id)):
+        raise _InvalidQueryPayload(
+            "invalid_query_id", "query_id must be 1-128 letters, digits, underscores or hyphens"
+        )
+
+    return QueryRequest(
+        client_id=client_id,
+        sql=sql,
+        limit=parsed_limit,
+        snapshot_id=snapshot_id if isinstance(snapshot_id, str) else None,
+        as_of_timestamp=as_of_timestamp,
+        estimated_scan_mb=estimated_scan_value,
+        timeout_ms=parsed_timeout,
+        query_id=query_id,
+        parameters=params,
+        **options,
+    )
+
+
+def _query_error_status(code: str) -> int:
+    if code == "internal_error":
+        return 500
+    if code == "query_timeout":
+        return 504
+    if code in _CONFLICT_ERROR_CODES:
+        return 409
+    if code in _TOO_MANY_ERROR_CODES:
+        return 429
+    if code in _UNAVAILABLE_ERROR_CODES:
+        return 503
+    return 400
+
+
+def _request_client_id() -> Optional[str]:
+    return request.args.get("clientId") or request.args.get("client_id")
+
+
+def _serialize_columns(columns: Any) -> list[Dict[str, Any]]:
+    return [column.__dict__ for column in columns]
+
+
+def _serialize_job(job: QueryJobInfo) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "queryId": job.query_id,
+        "clientId": job.client_id,
+        "statement": job.statement,
+        "status": job.status,
+        "submittedAt": job.submitted_at.isoformat(),
+        "startedAt": job.started_at.isoformat() if job.started_at else None,
+        "completedAt": job.completed_at.isoformat() if job.completed_at else None,
+        "progress": {
+            "rowsSpooled": job.rows_spooled,
+            "pagesAvailable": job.pages_available,
+            "pageSize": job.page_size,
+            "truncated": job.truncated,
+        },
+        "columns": _serialize_columns(job.columns),
+        "stats": _serialize_stats(job.stats) if job.stats else None,
+    }
+    if job.error_code:
+        body["error"] = job.error_code
+        body["message"] = job.error_message
+    return body
+
+
+def _serialize_stats(stats: QueryStatistics) -> Dict[str, Any]:
+    serialized: Dict[str, Any] = {
+        "elapsed_ms": stats.elapsed_ms,
+        "data_scanned_mb": stats.data_scanned_mb,
+        "row_count": stats.row_count,
+        "snapshot_id": stats.snapshot_id,
+        "snapshot_timestamp": stats.snapshot_timestamp.isoformat() if stats.snapshot_timestamp else None,
+        "queue_ms": stats.queue_ms,
+    }
+    serialized["elapsedMs"] = serialized["elapsed_ms"]
+    serialized["dataScannedMb"] = serialized["data_scanned_mb"]
+    serialized["rowCount"] = serialized["row_count"]
+    serialized["snapshotId"] = serialized["snapshot_id"]
+    serialized["snapshotTimestamp"] = serialized["snapshot_timestamp"]
+    serialized["queueMs"] = serialized["queue_ms"]
+    return serialized
+
+
+def _negotiate_result_mimetype() -> str:
+    # JSON is listed first so wildcard Accept headers keep the JSON response.
+    best = request.accept_mimetypes.best_match(["application/json", ARROW_STREAM_MIME_TYPE, NDJSON_MIME_TYPE])
+    return best or "application/json"
+
+
+def _iter_ndjson(app: Flask, result: QueryResult) -> Iterator[str]:
+    """Yield ``result`` as NDJSON: a header record, row chunks and trailing stats."""
+
+    stream = result.stream
+    yield app.json.dumps(
+        {
+            "type": "header",
+            "statement": result.statement,
+            "columns": _serialize_columns(result.columns),
+        }
+    ) + "\n"
+    chunks = stream if stream is not None else [result.iter_rows()]
+    try:
+        for chunk in chunks:
+            yield app.json.dumps({"type": "rows", "rows": [list(row) for row in chunk_rows(chunk)]}) + "\n"
+    except QueryError as exc:
+        yield app.json.dumps({"type": "error", "error": exc.code, "message": str(exc)}) + "\n"
+        return
+    stats = stream.stats if stream is not None else result.stats
+    yield app.json.dumps({"type": "stats", "stats": _serialize_stats(stats) if stats else None}) + "\n"
+
+
+def _streaming_response(body: Iterator[Any], result: QueryResult, **kwargs: Any) -> Response:
+    response = Response(body, **kwargs)
+    if result.stream is not None:
+        # A generator's ``finally`` never runs when the client leaves before the first
+        # chunk, so the response releases the stream (slot, connection, history) itself.
+        response.call_on_close(result.stream.close)
+    return response
+
+
 def create_app(
     *,
     billing_repository: "BillingRepository" | None = None,
     query_service: QueryService | None = None,
     query_history_store: QueryHistoryStore | None = None,
+    query_jobs: QueryJobManager | None = None,
 ) -> Flask:
     app = Flask(__name__)
     if billing_repository is not None:
@@ -51,6 +259,9 @@ def create_app(
 
         repository = BillingRepository()
     history_store = query_history_store
+    jobs = query_jobs
+    if jobs is None and query_service is not None:
+        jobs = QueryJobManager(query_service)
 
     @app.get("/api/billing/plans")
     def list_plans() -> Any:
@@ -96,88 +307,128 @@ def create_app(
         if query_service is None:
             return jsonify({"error": "query_engine_unavailable"}), 503
 
+        mimetype = _negotiate_result_mimetype()
+        wants_arrow = mimetype == ARROW_STREAM_MIME_TYPE
         payload: Dict[str, Any] = request.get_json(force=True)  # type: ignore[assignment]
-        client_id = payload.get("client_id") or payload.get("clientId")
-        sql = payload.get("sql") or payload.get("query")
-        limit = payload.get("limit")
-        snapshot_id = payload.get("snapshot_id") or payload.get("snapshotId")
-        as_of_raw = payload.get("as_of_timestamp") or payload.get("asOfTimestamp")
-        estimated_scan = payload.get("estimated_scan_mb") or payload.get("estimatedScanMb")
-
-        if not client_id or not isinstance(client_id, str):
-            return jsonify({"error": "missing_client_id"}), 400
-        if not sql or not isinstance(sql, str):
-            return jsonify({"error": "missing_query"}), 400
-
         try:
-            as_of_timestamp = _parse_datetime(as_of_raw if isinstance(as_of_raw, str) else None)
-        except ValueError as exc:
-            return jsonify({"error": "invalid_time_travel", "message": str(exc)}), 400
-
-        parsed_limit: Optional[int] = None
-        if isinstance(limit, int):
-            parsed_limit = limit
-        elif isinstance(limit, str) and limit.strip():
-            try:
-                parsed_limit = int(limit)
-            except ValueError:
-                return jsonify({"error": "invalid_limit"}), 400
-
-        estimated_scan_value: Optional[float] = None
-        if isinstance(estimated_scan, (int, float)):
-            estimated_scan_value = float(estimated_scan)
-        elif isinstance(estimated_scan, str) and estimated_scan.strip():
-            try:
-                estimated_scan_value = float(estimated_scan)
-            except ValueError:
-                return jsonify({"error": "invalid_estimated_scan"}), 400
-
-        request_model = QueryRequest(
-            client_id=client_id,
-            sql=sql,
-            limit=parsed_limit,
-            snapshot_id=snapshot_id if isinstance(snapshot_id, str) else None,
-            as_of_timestamp=as_of_timestamp,
-            estimated_scan_mb=estimated_scan_value,
-        )
+            request_model = _parse_query_request(
+                payload,
+                result_format=RESULT_FORMAT_ARROW if wants_arrow else RESULT_FORMAT_ROWS,
+                stream=mimetype == NDJSON_MIME_TYPE,
+            )
+        except _InvalidQueryPayload as exc:
+            return exc.response()
+        if wants_arrow and not arrow_available():
+            return jsonify({"error": "unsupported_format", "message": "Arrow results are not available"}), 406
 
         try:
             result = query_service.execute(request_model)
+        except RateLimitExceeded as exc:
+            LOGGER.info("Query rejected by rate limiting: %s", exc)
+            retry_after = str(max(math.ceil(exc.retry_after_s), 1))
+            return jsonify({"error": "rate_limited", "message": str(exc)}), 429, {"Retry-After": retry_after}
         except EntitlementError as exc:
             LOGGER.info("Query rejected by entitlement checks: %s", exc)
             return jsonify({"error": "entitlement_denied", "message": str(exc)}), 429
         except QueryError as exc:
-            status_code = 500 if exc.code == "internal_error" else 400
             LOGGER.info("Query execution failed: %s", exc)
-            return jsonify({"error": exc.code, "message": str(exc)}), status_code
+            return jsonify({"error": exc.code, "message": str(exc)}), _query_error_status(exc.code)
         except Exception as exc:  # pragma: no cover - defensive
             LOGGER.exception("Unhandled exception during query execution")
             return jsonify({"error": "query_failed", "message": str(exc)}), 500
 
+        if mimetype == NDJSON_MIME_TYPE:
+            return _streaming_response(_iter_ndjson(app, result), result, mimetype=NDJSON_MIME_TYPE)
+        if wants_arrow:
+            headers = {"X-Query-Stats": json.dumps(_serialize_stats(result.stats))} if result.stats else {}
+            return _streaming_response(
+                iter_arrow_ipc_stream(result), result, mimetype=ARROW_STREAM_MIME_TYPE, headers=headers
+            )
+
         response = {
             "statement": result.statement,
-            "columns": [column.__dict__ for column in result.columns],
-            "rows": list(result.rows),
+            "columns": _serialize_columns(result.columns),
+            "rows": list(result.iter_rows()),
         }
         if result.stats:
-            stats = {
-                "elapsed_ms": result.stats.elapsed_ms,
-                "data_scanned_mb": result.stats.data_scanned_mb,
-                "row_count": result.stats.row_count,
-                "snapshot_id": result.stats.snapshot_id,
-                "snapshot_timestamp": result.stats.snapshot_timestamp.isoformat()
-                if result.stats.snapshot_timestamp
-                else None,
-            }
-            response["stats"] = stats
-            response["stats"]["elapsedMs"] = stats["elapsed_ms"]
-            response["stats"]["dataScannedMb"] = stats["data_scanned_mb"]
-            response["stats"]["rowCount"] = stats["row_count"]
-            response["stats"]["snapshotId"] = stats["snapshot_id"]
-            response["stats"]["snapshotTimestamp"] = stats["snapshot_timestamp"]
+            response["stats"] = _serialize_stats(result.stats)
 
         return jsonify(response)
 
+    @app.post("/queries")
+    def submit_query() -> Any:
+        if jobs is None:
+            return jsonify({"error": "query_engine_unavailable"}), 503
+
+        payload: Dict[str, Any] = request.get_json(force=True)  # type: ignore[assignment]
+        try:
+            request_model = _parse_query_request(payload)
+        except _InvalidQueryPayload as exc:
+            return exc.response()
+        try:
+            job = jobs.submit(request_model)
+        except QueryError as exc:
+            return jsonify({"error": exc.code, "message": str(exc)}), _query_error_status(exc.code)
+        location = f"/queries/{job.query_id}?clientId={job.client_id}"
+        return jsonify(_serialize_job(job)), 202, {"Location": location}
+
+    @app.get("/queries/<query_id>")
+    def query_status(query_id: str) -> Any:
+        client_id = _request_client_id()
+        if not client_id:
+            return jsonify({"error": "missing_client_id"}), 400
+        job = jobs.get(query_id, client_id=client_id) if jobs is not None else None
+        if job is None:
+            return jsonify({"error": "query_not_found"}), 404
+        return jsonify(_serialize_job(job))
+
+    @app.delete("/queries/<query_id>")
+    def cancel_query(query_id: str) -> Any:
+        client_id = _request_client_id()
+        if not client_id:
+            return jsonify({"error": "missing_client_id"}), 400
+        if query_service is None:
+            return jsonify({"error": "query_not_found"}), 404
+        job = jobs.get(query_id, client_id=client_id) if jobs is not None else None
+        if job is not None:
+            cancelled = jobs.cancel(query_id, client_id=client_id)
+        else:
+            cancelled = query_service.cancel(query_id, client_id=client_id)
+            if not cancelled:
+                return jsonify({"error": "query_not_found"}), 404
+        if not cancelled:
+            return jsonify({"error": "query_not_running", "status": job.status}), 409
+        return jsonify({"queryId": query_id, "status": "CANCELLING"}), 202
+
+    @app.get("/queries/<query_id>/results")
+    def query_results(query_id: str) -> Any:
+        client_id = _request_client_id()
+        if not client_id:
+            return jsonify({"error": "missing_client_id"}), 400
+        if jobs is None:
+            return jsonify({"error": "query_not_found"}), 404
+        page_param = request.args.get("page", "0")
+        try:
+            page_number = int(page_param)
+            page = jobs.fetch_page(query_id, page_number, client_id=client_id)
+        except ValueError:
+            return jsonify({"error": "invalid_page"}), 400
+        job = jobs.get(query_id, client_id=client_id)
+        if page is None or job is None:
+            return jsonify({"error": "query_not_found"}), 404
+        if job.error_code:
+            return jsonify(_serialize_job(job)), _query_error_status(job.error_code or "")
+        body = {
+            "queryId": query_id,
+            "status": job.status,
+            "page": page.page,
+            "ready": page.ready,
+            "nextPage": page.next_page,
+            "columns": _serialize_columns(page.columns),
+            "rows": [list(row) for row in page.rows],
+        }
+        return jsonify(body), 200 if page.ready else 202
+
     @app.get("/api/clients/<client_id>/query-history")
     def query_history(client_id: str) -> Any:
         store = history_store or getattr(query_service, "history_store", None)
@@ -202,28 +453,46 @@ def create_app(
             except ValueError:
                 return jsonify({"error": "invalid_limit"}), 400
 
-        entries = store.search(
-            QueryHistoryFilter(
-                client_id=client_id,
-                start=start_dt,
-                end=end_dt,
-                table=table,
-                limit=limit,
-            )
-        )
-        summary = summarise_history(entries)
+        history_filter = QueryHistoryFilter(client_id=client_id, start=start_dt, end=end_dt, table=table, limit=limit)
+        cursor = params.get("cursor")
+        page_size_param = params.get("pageSize")
+        next_cursor = None
+        paged = bool(cursor or page_size_param)
+        if paged:
+            try:
+                page_size = int(page_size_param) if page_size_param else limit or _DEFAULT_HISTORY_PAGE_SIZE
+            except ValueError:
+                return jsonify({"error": "invalid_page_size"}), 400
+            if page_size < 1:
+                return jsonify({"error": "invalid_page_size"}), 400
+            if cursor:
+                try:
+                    decode_history_cursor(cursor)
+                except ValueError as exc:
+                    return jsonify({"error": "invalid_cursor", "message": str(exc)}), 400
+            page = page_history(store, history_filter, page_size=min(page_size, _MAX_HISTORY_PAGE_SIZE), cursor=cursor)
+            entries = page.entries
+            next_cursor = page.next_cursor
+        else:
+            entries = store.search(history_filter)
+        summary = summarise_search(store, history_filter, entries)
         response = {
             "entries": [serialize_history_entry(entry) for entry in entries],
             "summary": {
                 "totalQueries": summary.total_queries,
                 "failedQueries": summary.failed_queries,
                 "totalCostUsd": summary.total_cost_usd,
+                "totalScannedMb": summary.total_scanned_mb,
+                "p50ElapsedMs": summary.p50_elapsed_ms,
+                "p95ElapsedMs": summary.p95_elapsed_ms,
                 "range": {
                     "start": summary.range_start.isoformat() if summary.range_start else None,
                     "end": summary.range_end.isoformat() if summary.range_end else None,
                 },
             },
         }
+        if paged:
+            response["nextCursor"] = next_cursor
         return jsonify(response)
 
     return app
@@ -0,0 +1,388 @@
+"""Asyncio variant of :class:`~api.entitlements.EntitlementService`."""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional
+
+from billing.models import PlanEntitlements
+
+from .entitlements import (
+    _MAX_BATCH_WRITES,
+    EntitlementCache,
+    EntitlementError,
+    QueryExecutionStats,
+    _Admission,
+    _check_admission,
+    _check_usage,
+    _EntitlementDocuments,
+    _entitlements_from_document,
+    _fold_usage,
+    _lease_ids,
+    _live_leases,
+    _renew_leases,
+    _shard_count,
+    _sum_shards,
+    _usage_delta,
+    _usage_document,
+    _write_leases,
+    firestore,
+)
+from .usage import UsageBuffer, UsageKey, UsageTotals
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle
+    from .rate_limit import RateLimiter
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncEntitlementService(_EntitlementDocuments):
+    """Enforce entitlements through the asyncio Firestore client.
+
+    Behaviour matches :class:`~api.entitlements.EntitlementService` (cached
+    entitlements, one transaction to admit and one to release a query, expiring
+    concurrency leases, optional rate limiting and write-behind usage), but every
+    round trip is awaited instead of blocking a worker thread. Clients with
+    ``usage_shards`` write to random shard documents that an aggregator task
+    sums into the daily document. The lease heartbeat, usage flusher and
+    aggregator run as tasks on the event loop of the first admission; call
+    :meth:`close` before the loop shuts down.
+    """
+
+    def __init__(
+        self,
+        client: Optional["firestore.AsyncClient"] = None,
+        *,
+        cache: Optional[EntitlementCache] = None,
+        usage_buffer: Optional[UsageBuffer] = None,
+        lease_ttl_s: float = 60.0,
+        aggregate_interval_s: float = 5.0,
+        rate_limiter: Optional["RateLimiter"] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if lease_ttl_s <= 0:
+            raise ValueError("lease_ttl_s must be positive")
+        self._db = client or firestore.AsyncClient()
+        self._cache = cache if cache is not None else EntitlementCache()
+        self._usage_buffer = usage_buffer
+        self._rate_limiter = rate_limiter
+        self._lease_ttl_s = lease_ttl_s
+        self._clock = clock
+        self._admissions: Dict[int, _Admission] = {}
+        self._aggregate_interval_s = aggregate_interval_s
+        self._usage_shards: Dict[str, int] = {}
+        self._unaggregated: Dict[UsageKey, int] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._closed = False
+
+    async def close(self) -> None:
+        """Stop the background tasks and write any buffered usage."""
+
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush_usage()
+        await self.aggregate_usage()
+
+    async def renew_leases(self) -> int:
+        """Extend the lease of every running query admitted by this instance."""
+
+        clients = {admission.client_id for admission in self._admissions.values() if admission.lease_id is not None}
+        renewed = 0
+        for client_id in clients:
+            concurrency_ref = self._concurrency_ref(client_id)
+
+            @firestore.async_transactional
+            async def _run(transaction: Any) -> int:
+                snapshots = await _get_all(transaction.get_all([concurrency_ref]))
+                now = self._clock()
+                # Re-read after the snapshot: a lease released since is no longer ours to extend.
+                lease_ids = _lease_ids(self._admissions.values(), client_id)
+                snapshot = snapshots[0] if snapshots else None
+                return _renew_leases(transaction, concurrency_ref, snapshot, lease_ids, now, now + self._lease_ttl_s)
+
+            renewed += await _run(self._db.transaction())
+        return renewed
+
+    async def flush_usage(self, key: Optional[UsageKey] = None) -> None:
+        """Write buffered usage (all clients, or only ``key``) as batched increments."""
+
+        if self._usage_buffer is None:
+            return
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            deltas = self._usage_buffer.drain(key)
+            if not deltas:
+                return
+            refs = {item: self._usage_document_ref(item[0], item[1]) for item in deltas}
+            try:
+                items = list(deltas.items())
+                for start in range(0, len(items), _MAX_BATCH_WRITES):
+                    batch = self._db.batch()
+                    for (client_id, date_key), delta in items[start : start + _MAX_BATCH_WRITES]:
+                        batch.set(
+                            self._usage_write_ref(client_id, date_key, self._usage_shards.get(client_id, 1)),
+                            _usage_document(date_key, delta),
+                            merge=True,
+                        )
+                    await batch.commit()
+            except Exception:
+                self._usage_buffer.restore(deltas)
+                raise
+            self._usage_buffer.complete(deltas, await self._read_usage(refs))
+
+    async def aggregate_usage(self) -> int:
+        """Sum the shards written since the last run into each daily ``shard_totals``."""
+
+        pending, self._unaggregated = self._unaggregated, {}
+        for (client_id, date_key), shards in pending.items():
+            usage_ref = self._usage_document_ref(client_id, date_key)
+            shard_refs = [self._usage_shard_ref(client_id, date_key, shard) for shard in range(shards)]
+
+            @firestore.async_transactional
+            async def _run(transaction: Any) -> None:
+                totals = _sum_shards(await _get_all(transaction.get_all(shard_refs)))
+                transaction.set(
+                    usage_ref,
+                    {
+                        "date": date_key,
+                        "shard_totals": totals.to_document(),
+                        "shards": shards,
+                        "aggregated_at": firestore.SERVER_TIMESTAMP,
+                    },
+                    merge=True,
+                )
+
+            try:
+                await _run(self._db.transaction())
+            except Exception:
+                self._mark_unaggregated(client_id, date_key, shards)
+                raise
+        return len(pending)
+
+    async def get_usage(self, client_id: str, *, date_key: Optional[str] = None) -> UsageTotals:
+        """Return a client's exact usage for a day, summing its shards when it has any."""
+
+        date_key = date_key or self._current_usage_key()
+        totals = await self._read_usage({(client_id, date_key): self._usage_document_ref(client_id, date_key)})
+        return totals.get((client_id, date_key), UsageTotals())
+
+    def invalidate_entitlements(self, client_id: Optional[str] = None) -> None:
+        """Drop cached entitlements for ``client_id`` (or every client)."""
+
+        self._cache.invalidate(client_id)
+
+    async def get_entitlements(self, client_id: str) -> PlanEntitlements:
+        cached = self._cache.get(client_id)
+        if cached is not None:
+            return cached
+        entitlements = _entitlements_from_document(client_id, await self._client_ref(client_id).get())
+        self._cache.put(client_id, entitlements)
+        return entitlements
+
+    @asynccontextmanager
+    async def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0) -> AsyncIterator[PlanEntitlements]:
+        """Admit a query and hold its concurrency slot for the ``async with`` body."""
+
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire_async(client_id, self._cache.get(client_id))
+        lease_id = uuid.uuid4().hex
+        admitted = await self._admit(client_id, estimated_scan_mb, lease_id)
+        entitlements = replace(admitted)  # unique per admission
+        admission = _Admission(
+            client_id=client_id,
+            entitlements=entitlements,
+            lease_id=lease_id if admitted.max_concurrent_queries is not None else None,
+        )
+        self._admissions[id(entitlements)] = admission
+        if admission.lease_id is not None:
+            self._ensure_task("lease-heartbeat", self.renew_leases, self._lease_ttl_s / 3)
+        try:
+            yield entitlements
+        finally:
+            self._admissions.pop(id(entitlements), None)
+            await self._release(admission)
+
+    async def admit_cached_query(self, client_id: str, stats: QueryExecutionStats) -> PlanEntitlements:
+        """Admit and count a query answered from the result cache, see the blocking service."""
+
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire_async(client_id, self._cache.get(client_id))
+        entitlements = await self.get_entitlements(client_id)
+        await self.record_query_usage(client_id, stats, entitlements=entitlements)
+        return entitlements
+
+    async def record_query_usage(
+        self,
+        client_id: str,
+        stats: QueryExecutionStats,
+        *,
+        entitlements: Optional[PlanEntitlements] = None,
+    ) -> None:
+        if self._usage_buffer is None and entitlements is not None:
+            admission = self._admissions.get(id(entitlements))
+            if admission is not None and admission.client_id == client_id and admission.usage is None:
+                admission.usage = stats  # committed together with the slot release
+                return
+        entitlements = entitlements or await self.get_entitlements(client_id)
+        if self._usage_buffer is not None:
+            await self._record_buffered_usage(client_id, stats, entitlements)
+            return
+        date_key = self._current_usage_key()
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        shards = _shard_count(entitlements)
+
+        @firestore.async_transactional
+        async def _record(transaction: Any) -> None:
+            snapshot = await usage_ref.get(transaction=transaction)
+            delta = _usage_delta(stats)
+            _check_usage(entitlements, UsageTotals.from_document(snapshot.to_dict() if snapshot.exists else None) + delta, stats)
+            transaction.set(self._usage_write_ref(client_id, date_key, shards), _usage_document(date_key, delta), merge=True)
+
+        await _record(self._db.transaction())
+        self._mark_unaggregated(client_id, date_key, shards)
+
+    # Internal helpers ---------------------------------------------------
+
+    async def _admit(self, client_id: str, estimated_scan_mb: float, lease_id: str) -> PlanEntitlements:
+        cached = self._cache.get(client_id)
+        date_key = self._current_usage_key()
+        client_ref = self._client_ref(client_id)
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        concurrency_ref = self._concurrency_ref(client_id)
+        refs = [usage_ref, concurrency_ref] if cached is not None else [client_ref, usage_ref, concurrency_ref]
+
+        @firestore.async_transactional
+        async def _run(transaction: Any) -> PlanEntitlements:
+            snapshots = {snapshot.reference.path: snapshot for snapshot in await _get_all(transaction.get_all(refs))}
+            entitlements = cached or _entitlements_from_document(client_id, snapshots[client_ref.path])
+            usage_snapshot = snapshots.get(usage_ref.path)
+            usage = UsageTotals.from_document(
+                usage_snapshot.to_dict() if usage_snapshot is not None and usage_snapshot.exists else None
+            )
+            if self._usage_buffer is not None:
+                self._usage_buffer.set_persisted((client_id, date_key), usage)
+                usage = usage + self._usage_buffer.unflushed((client_id, date_key))
+            _check_admission(entitlements, usage, estimated_scan_mb)
+            if entitlements.max_concurrent_queries is not None:
+                now = self._clock()
+                leases = _live_leases(snapshots.get(concurrency_ref.path), now)
+                if len(leases) >= int(entitlements.max_concurrent_queries):
+                    raise EntitlementError("Concurrent query limit exceeded")
+                leases[lease_id] = now + self._lease_ttl_s
+                _write_leases(transaction, concurrency_ref, leases)
+            return entitlements
+
+        entitlements = await _run(self._db.transaction())
+        if cached is None:
+            self._cache.put(client_id, entitlements)
+        return entitlements
+
+    async def _release(self, admission: _Admission) -> None:
+        client_id = admission.client_id
+        entitlements = admission.entitlements
+        stats = admission.usage
+        tracked = admission.lease_id is not None
+        if stats is None and not tracked:
+            return
+        date_key = self._current_usage_key()
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        concurrency_ref = self._concurrency_ref(client_id)
+        refs = ([usage_ref] if stats is not None else []) + ([concurrency_ref] if tracked else [])
+        shards = _shard_count(entitlements)
+        write_ref = self._usage_write_ref(client_id, date_key, shards)
+
+        @firestore.async_transactional
+        async def _run(transaction: Any) -> Optional[EntitlementError]:
+            snapshots = {snapshot.reference.path: snapshot for snapshot in await _get_all(transaction.get_all(refs))}
+            violation: Optional[EntitlementError] = None
+            if stats is not None:
+                snapshot = snapshots.get(usage_ref.path)
+                usage = UsageTotals.from_document(snapshot.to_dict() if snapshot is not None and snapshot.exists else None)
+                delta = _usage_delta(stats)
+                try:
+                    _check_usage(entitlements, usage + delta, stats)
+                    transaction.set(write_ref, _usage_document(date_key, delta), merge=True)
+                except EntitlementError as exc:
+                    violation = exc  # the slot is still released below
+            if tracked:
+                snapshot = snapshots.get(concurrency_ref.path)
+                if snapshot is not None and snapshot.exists:
+                    leases = _live_leases(snapshot, self._clock())
+                    leases.pop(admission.lease_id, None)
+                    _write_leases(transaction, concurrency_ref, leases)
+            return violation
+
+        violation = await _run(self._db.transaction())
+        if stats is not None and violation is None:
+            self._mark_unaggregated(client_id, date_key, shards)
+        if violation is not None:
+            raise violation
+
+    async def _record_buffered_usage(
+        self,
+        client_id: str,
+        stats: QueryExecutionStats,
+        entitlements: PlanEntitlements,
+    ) -> None:
+        assert self._usage_buffer is not None
+        key = (client_id, self._current_usage_key())
+        delta = _usage_delta(stats)
+        self._usage_shards[client_id] = _shard_count(entitlements)
+        persisted = self._usage_buffer.persisted(key)
+        if persisted is None:
+            persisted = await self.get_usage(client_id, date_key=key[1])
+            self._usage_buffer.set_persisted(key, persisted)
+        _check_usage(entitlements, persisted + self._usage_buffer.unflushed(key) + delta, stats)
+        self._usage_buffer.add(key, delta)
+        self._ensure_task("usage-flusher", self.flush_usage, self._usage_buffer.flush_interval_s)
+        if self._usage_buffer.needs_flush(key, entitlements):
+            await self.flush_usage(key)
+
+    async def _read_usage(self, refs: Dict[UsageKey, Any]) -> Dict[UsageKey, UsageTotals]:
+        reads, by_path = self._usage_reads(refs)
+        try:
+            return _fold_usage(await _get_all(self._db.get_all(reads)), by_path)
+        except Exception:  # pragma: no cover - the next precheck re-reads stale totals
+            LOGGER.warning("Failed to refresh usage totals after flush", exc_info=True)
+            return {}
+
+    def _mark_unaggregated(self, client_id: str, date_key: str, shards: int) -> None:
+        if shards <= 1:
+            return
+        self._unaggregated[(client_id, date_key)] = shards
+        self._ensure_task("usage-aggregator", self.aggregate_usage, self._aggregate_interval_s)
+
+    def _ensure_task(self, name: str, func: Callable[[], Any], interval_s: float) -> None:
+        if self._closed or any(task.get_name() == name and not task.done() for task in self._tasks):
+            return
+        self._tasks = [task for task in self._tasks if not task.done()]
+        self._tasks.append(asyncio.get_running_loop().create_task(self._repeat(func, interval_s), name=name))
+
+    @staticmethod
+    async def _repeat(func: Callable[[], Any], interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await func()
+            except Exception:  # pragma: no cover - retried on the next tick
+                LOGGER.exception("Background entitlement task failed")
+
+
+async def _get_all(result: Any) -> List[Any]:
+    """Collect snapshots from ``get_all``, which may be a coroutine, an async iterator or a list."""
+
+    if inspect.isawaitable(result):
+        result = await result
+    if hasattr(result, "__aiter__"):
+        return [snapshot async for snapshot in result]
+    return list(result)
@@ -2,10 +2,16 @@
 from __future__ import annotations
 
 import importlib.util
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from typing import Generator, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
 if importlib.util.find_spec("google.cloud.firestore") is not None:  # pragma: no cover - optional dependency
     from google.cloud import firestore  # type: ignore
@@ -23,16 +29,30 @@ else:  # pragma: no cover - fallback used in tests without firestore dependency
     class _FirestoreModule:
         SERVER_TIMESTAMP = object()
         Client = _StubClient
+        AsyncClient = _StubClient
         Transaction = _StubTransaction
 
         @staticmethod
         def transactional(func):  # type: ignore
             return func
 
+        @staticmethod
+        def async_transactional(func):  # type: ignore
+            return func
+
     firestore = _FirestoreModule()  # type: ignore
 
 from billing.models import PlanEntitlements
 
+from .usage import UsageBuffer, UsageKey, UsageTotals
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle
+    from .rate_limit import RateLimiter
+
+LOGGER = logging.getLogger(__name__)
+
+_MAX_BATCH_WRITES = 500
+
 
 @dataclass(frozen=True)
 class QueryExecutionStats:
@@ -46,42 +66,339 @@ class EntitlementError(RuntimeError):
     """Raised when a client exceeds its allotted quota."""
 
 
-class EntitlementService:
-    """Loads entitlement configuration and enforces daily limits."""
+@dataclass
+class _Admission:
+    """An admitted query whose usage is committed when its slot is released."""
+
+    client_id: str
+    entitlements: PlanEntitlements
+    lease_id: Optional[str] = None
+    usage: Optional[QueryExecutionStats] = None
+
+
+class EntitlementCache:
+    """Bounded, per-process LRU of client entitlements that expire after ``ttl_s``."""
+
+    def __init__(
+        self,
+        *,
+        ttl_s: float = 60.0,
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl_s = ttl_s
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, PlanEntitlements]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client_id: str) -> Optional[PlanEntitlements]:
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is None:
+                return None
+            expires_at, entitlements = entry
+            if expires_at <= self._clock():
+                del self._entries[client_id]
+                return None
+            self._entries.move_to_end(client_id)
+            return entitlements
+
+    def put(self, client_id: str, entitlements: PlanEntitlements) -> None:
+        if self._ttl_s <= 0 or self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[client_id] = (self._clock() + self._ttl_s, entitlements)
+            self._entries.move_to_end(client_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, client_id: Optional[str] = None) -> None:
+        """Forget ``client_id``, or every client when it is omitted."""
+
+        with self._lock:
+            if client_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(client_id, None)
+
+
+class _EntitlementDocuments:
+    """Firestore document layout shared by the blocking and asyncio services."""
+
+    _db: firestore.Client
+    _usage_shards: Dict[str, int]
+
+    def _usage_document_ref(self, client_id: str, date_key: Optional[str] = None) -> firestore.DocumentReference:
+        date_key = date_key or self._current_usage_key()
+        return (
+            self._db.collection("clients")
+            .document(client_id)
+            .collection("usage")
+            .document(date_key)
+        )
+
+    def _usage_shard_ref(self, client_id: str, date_key: str, shard: int) -> firestore.DocumentReference:
+        return self._usage_document_ref(client_id, date_key).collection("shards").document(str(shard))
+
+    def _usage_write_ref(self, client_id: str, date_key: str, shards: int) -> firestore.DocumentReference:
+        if shards <= 1:
+            return self._usage_document_ref(client_id, date_key)
+        self._usage_shards[client_id] = shards
+        return self._usage_shard_ref(client_id, date_key, random.randrange(shards))
+
+    def _usage_reads(
+        self, refs: Dict[UsageKey, firestore.DocumentReference]
+    ) -> Tuple[List[firestore.DocumentReference], Dict[str, Tuple[UsageKey, bool]]]:
+        """Return the documents holding exact usage for ``refs`` and, per path, its key and whether it is sharded."""
+
+        reads: List[firestore.DocumentReference] = []
+        by_path: Dict[str, Tuple[UsageKey, bool]] = {}
+        for key, ref in refs.items():
+            shards = self._usage_shards.get(key[0], 1)
+            reads.append(ref)
+            by_path[ref.path] = (key, shards > 1)
+            for shard in range(shards if shards > 1 else 0):
+                shard_ref = self._usage_shard_ref(key[0], key[1], shard)
+                reads.append(shard_ref)
+                by_path[shard_ref.path] = (key, False)
+        return reads, by_path
+
+    def _client_ref(self, client_id: str) -> firestore.DocumentReference:
+        return self._db.collection("clients").document(client_id)
+
+    def _concurrency_ref(self, client_id: str) -> firestore.DocumentReference:
+        return (
+            self._db.collection("clients")
+            .document(client_id)
+            .collection("runtime")
+            .document("concurrency")
+        )
+
+    @staticmethod
+    def _current_usage_key() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class EntitlementService(_EntitlementDocuments):
+    """Loads entitlement configuration and enforces daily limits.
+
+    Entitlements are cached in process for a short TTL; call
+    :meth:`invalidate_entitlements` when a client's plan changes.
 
-    def __init__(self, client: Optional[firestore.Client] = None) -> None:
+    Concurrency slots are leases stored in ``runtime/concurrency`` with an expiry
+    ``lease_ttl_s`` ahead. A heartbeat renews the leases of running queries, and
+    expired leases left behind by crashed instances are reclaimed on the next
+    admission, so a lost release never locks a client out for longer than a TTL.
+
+    With a :class:`~api.usage.UsageBuffer`, usage is accumulated in memory and
+    written behind in batched increments every ``flush_interval_s`` instead of one
+    transaction per query; call :meth:`close` on shutdown to flush the remainder.
+
+    A :class:`~api.rate_limit.RateLimiter` rejects clients exceeding their request
+    rate from the cached entitlements before admission touches Firestore.
+
+    Tenants whose entitlements set ``usage_shards`` above one write usage to a
+    random ``usage/<date>/shards/<n>`` document instead of the single daily
+    document, which Firestore caps at about one write per second. Every
+    ``aggregate_interval_s`` the shards are summed into the daily document's
+    ``shard_totals``, which is what admission prechecks read;
+    :meth:`get_usage` sums the shards for an exact figure.
+    """
+
+    def __init__(
+        self,
+        client: Optional[firestore.Client] = None,
+        *,
+        cache: Optional[EntitlementCache] = None,
+        usage_buffer: Optional[UsageBuffer] = None,
+        lease_ttl_s: float = 60.0,
+        rate_limiter: Optional["RateLimiter"] = None,
+        aggregate_interval_s: float = 5.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if lease_ttl_s <= 0:
+            raise ValueError("lease_ttl_s must be positive")
         self._db = client or firestore.Client()
+        self._cache = cache if cache is not None else EntitlementCache()
+        self._usage_buffer = usage_buffer
+        self._rate_limiter = rate_limiter
+        self._flush_lock = threading.Lock()
+        self._stop_flusher = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._lease_ttl_s = lease_ttl_s
+        self._clock = clock
+        self._admissions: Dict[int, _Admission] = {}
+        self._admissions_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._aggregate_interval_s = aggregate_interval_s
+        self._aggregator: Optional[threading.Thread] = None
+        self._usage_shards: Dict[str, int] = {}
+        self._unaggregated: Dict[UsageKey, int] = {}
+        if usage_buffer is not None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="usage-flusher", daemon=True)
+            self._flusher.start()
+
+    def close(self) -> None:
+        """Stop the background threads and write any buffered usage."""
+
+        self._stop_flusher.set()
+        for thread in (self._flusher, self._heartbeat, self._aggregator):
+            if thread is not None:
+                thread.join()
+        self._flusher = None
+        self._heartbeat = None
+        self._aggregator = None
+        self.flush_usage()
+        self.aggregate_usage()
+
+    def renew_leases(self) -> int:
+        """Extend the lease of every running query admitted by this instance."""
+
+        with self._admissions_lock:
+            clients = {admission.client_id for admission in self._admissions.values() if admission.lease_id is not None}
+        renewed = 0
+        for client_id in clients:
+            concurrency_ref = self._concurrency_ref(client_id)
+
+            @firestore.transactional
+            def _run(transaction: firestore.Transaction) -> int:
+                snapshots = list(transaction.get_all([concurrency_ref]))
+                now = self._clock()
+                # Re-read after the snapshot: a lease released since is no longer ours to extend.
+                with self._admissions_lock:
+                    lease_ids = _lease_ids(self._admissions.values(), client_id)
+                snapshot = snapshots[0] if snapshots else None
+                return _renew_leases(transaction, concurrency_ref, snapshot, lease_ids, now, now + self._lease_ttl_s)
+
+            renewed += _run(self._db.transaction())
+        return renewed
+
+    def flush_usage(self, key: Optional[UsageKey] = None) -> None:
+        """Write buffered usage (all clients, or only ``key``) as batched increments."""
+
+        if self._usage_buffer is None:
+            return
+        with self._flush_lock:
+            deltas = self._usage_buffer.drain(key)
+            if not deltas:
+                return
+            refs = {item: self._usage_document_ref(item[0], item[1]) for item in deltas}
+            try:
+                items = list(deltas.items())
+                for start in range(0, len(items), _MAX_BATCH_WRITES):
+                    batch = self._db.batch()
+                    for (client_id, date_key), delta in items[start : start + _MAX_BATCH_WRITES]:
+                        batch.set(
+                            self._usage_write_ref(client_id, date_key, self._usage_shards.get(client_id, 1)),
+                            _usage_document(date_key, delta),
+                            merge=True,
+                        )
+                    batch.commit()
+            except Exception:
+                self._usage_buffer.restore(deltas)
+                raise
+            self._usage_buffer.complete(deltas, self._read_usage(refs))
+
+    def aggregate_usage(self) -> int:
+        """Sum the shards written since the last run into each daily ``shard_totals``."""
+
+        with self._admissions_lock:
+            pending, self._unaggregated = self._unaggregated, {}
+        for (client_id, date_key), shards in pending.items():
+            usage_ref = self._usage_document_ref(client_id, date_key)
+            shard_refs = [self._usage_shard_ref(client_id, date_key, shard) for shard in range(shards)]
+
+            @firestore.transactional
+            def _run(transaction: firestore.Transaction) -> None:
+                totals = _sum_shards(transaction.get_all(shard_refs))
+                transaction.set(
+                    usage_ref,
+                    {
+                        "date": date_key,
+                        "shard_totals": totals.to_document(),
+                        "shards": shards,
+                        "aggregated_at": firestore.SERVER_TIMESTAMP,
+                    },
+                    merge=True,
+                )
+
+            try:
+                _run(self._db.transaction())
+            except Exception:
+                self._mark_unaggregated(client_id, date_key, shards)
+                raise
+        return len(pending)
+
+    def get_usage(self, client_id: str, *, date_key: Optional[str] = None) -> UsageTotals:
+        """Return a client's exact usage for a day, summing its shards when it has any."""
+
+        date_key = date_key or self._current_usage_key()
+        return self._read_usage({(client_id, date_key): self._usage_document_ref(client_id, date_key)}).get(
+            (client_id, date_key), UsageTotals()
+        )
+
+    def invalidate_entitlements(self, client_id: Optional[str] = None) -> None:
+        """Drop cached entitlements for ``client_id`` (or every client)."""
+
+        self._cache.invalidate(client_id)
 
     def get_entitlements(self, client_id: str) -> PlanEntitlements:
-        doc = self._db.collection("clients").document(client_id).get()
-        if not doc.exists:
-            raise EntitlementError(f"Client {client_id} does not exist")
-        data = doc.to_dict() or {}
-        entitlements_data = data.get("entitlements")
-        if entitlements_data:
-            return PlanEntitlements(
-                max_queries_per_day=entitlements_data.get("max_queries_per_day"),
-                max_scan_mb_per_day=entitlements_data.get("max_scan_mb_per_day"),
-                max_concurrent_queries=entitlements_data.get("max_concurrent_queries"),
-                max_result_rows=entitlements_data.get("max_result_rows"),
-            )
-        plan_id = data.get("plan_id")
-        if not plan_id:
-            raise EntitlementError(f"Client {client_id} does not have a plan assigned")
-        from billing.stripe_catalog import get_plan_by_id  # imported lazily to avoid optional dependency at import time
+        cached = self._cache.get(client_id)
+        if cached is not None:
+            return cached
+        entitlements = self._load_entitlements(client_id)
+        self._cache.put(client_id, entitlements)
+        return entitlements
 
-        plan = get_plan_by_id(plan_id)
-        return plan.entitlements
+    def _load_entitlements(self, client_id: str) -> PlanEntitlements:
+        return _entitlements_from_document(client_id, self._client_ref(client_id).get())
 
     @contextmanager
     def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0) -> Generator[PlanEntitlements, None, None]:
-        entitlements = self.get_entitlements(client_id)
-        self._acquire_concurrency_slot(client_id, entitlements)
+        """Admit a query and hold its concurrency slot for the ``with`` body.
+
+        Admission loads the entitlements, checks the daily usage and takes the
+        concurrency slot in a single transaction. Usage recorded for the yielded
+        entitlements inside the body is committed in the same transaction that
+        releases the slot, so a query costs two round trips in total.
+        """
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(client_id, self._cache.get(client_id))
+        lease_id = uuid.uuid4().hex
+        admitted = self._admit(client_id, estimated_scan_mb, lease_id)
+        entitlements = replace(admitted)  # unique per admission
+        admission = _Admission(
+            client_id=client_id,
+            entitlements=entitlements,
+            lease_id=lease_id if admitted.max_concurrent_queries is not None else None,
+        )
+        with self._admissions_lock:
+            self._admissions[id(entitlements)] = admission
+        if admission.lease_id is not None:
+            self._ensure_heartbeat()
         try:
-            self._precheck_usage(client_id, entitlements, estimated_scan_mb)
             yield entitlements
         finally:
-            self._release_concurrency_slot(client_id, entitlements)
+            with self._admissions_lock:
+                self._admissions.pop(id(entitlements), None)
+            self._release(admission)
+
+    def admit_cached_query(self, client_id: str, stats: QueryExecutionStats) -> PlanEntitlements:
+        """Admit and count a query answered from the result cache.
+
+        A cache hit holds no concurrency slot, so only the rate limiter and the
+        plan (from the entitlement cache while fresh) apply before the query is
+        recorded against the daily allotments; that write enforces them, locally
+        when usage is buffered.
+        """
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(client_id, self._cache.get(client_id))
+        entitlements = self.get_entitlements(client_id)
+        self.record_query_usage(client_id, stats, entitlements=entitlements)
+        return entitlements
 
     def record_query_usage(
         self,
@@ -90,117 +407,308 @@ class EntitlementService:
         *,
         entitlements: Optional[PlanEntitlements] = None,
     ) -> None:
+        if self._usage_buffer is None and entitlements is not None:
+            with self._admissions_lock:
+                admission = self._admissions.get(id(entitlements))
+                if admission is not None and admission.client_id == client_id and admission.usage is None:
+                    admission.usage = stats  # committed together with the slot release
+                    return
         entitlements = entitlements or self.get_entitlements(client_id)
-        usage_ref = self._usage_document_ref(client_id)
+        if self._usage_buffer is not None:
+            self._record_buffered_usage(client_id, stats, entitlements)
+            return
         date_key = self._current_usage_key()
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        shards = _shard_count(entitlements)
 
         @firestore.transactional
         def _record(transaction: firestore.Transaction) -> None:
             snapshot = usage_ref.get(transaction=transaction)
-            existing = snapshot.to_dict() if snapshot.exists else {}
-            queries = int(existing.get("queries", 0)) + 1
-            scanned = float(existing.get("data_scanned_mb", 0.0)) + float(stats.data_scanned_mb)
-            rows = int(existing.get("rows_returned", 0)) + int(stats.result_rows)
-
-            if entitlements.max_queries_per_day is not None and queries > entitlements.max_queries_per_day:
-                raise EntitlementError("Daily query allotment exhausted")
-            if entitlements.max_scan_mb_per_day is not None and scanned > entitlements.max_scan_mb_per_day:
-                raise EntitlementError("Daily data scan allotment exhausted")
-            if entitlements.max_result_rows is not None and stats.result_rows > entitlements.max_result_rows:
-                raise EntitlementError("Result row limit exceeded for plan")
-
-            transaction.set(
-                usage_ref,
-                {
-                    "date": date_key,
-                    "queries": queries,
-                    "data_scanned_mb": scanned,
-                    "rows_returned": rows,
-                    "updated_at": firestore.SERVER_TIMESTAMP,
-                },
-                merge=True,
-            )
+            delta = _usage_delta(stats)
+            _check_usage(entitlements, UsageTotals.from_document(snapshot.to_dict() if snapshot.exists else None) + delta, stats)
+            transaction.set(self._usage_write_ref(client_id, date_key, shards), _usage_document(date_key, delta), merge=True)
 
         _record(self._db.transaction())
+        self._mark_unaggregated(client_id, date_key, shards)
 
     # Internal helpers ---------------------------------------------------
 
-    def _precheck_usage(self, client_id: str, entitlements: PlanEntitlements, estimated_scan_mb: float) -> None:
-        if entitlements.max_queries_per_day is None and entitlements.max_scan_mb_per_day is None:
-            return
-        usage = self._usage_document_ref(client_id).get().to_dict() or {}
-        if entitlements.max_queries_per_day is not None and int(usage.get("queries", 0)) >= entitlements.max_queries_per_day:
-            raise EntitlementError("Daily query allotment exhausted")
-        if (
-            entitlements.max_scan_mb_per_day is not None
-            and float(usage.get("data_scanned_mb", 0.0)) + estimated_scan_mb > entitlements.max_scan_mb_per_day
-        ):
-            raise EntitlementError("Daily data scan allotment exhausted")
-
-    def _acquire_concurrency_slot(self, client_id: str, entitlements: PlanEntitlements) -> None:
-        if entitlements.max_concurrent_queries is None:
-            return
-        ref = self._concurrency_ref(client_id)
+    def _admit(self, client_id: str, estimated_scan_mb: float, lease_id: str) -> PlanEntitlements:
+        cached = self._cache.get(client_id)
+        date_key = self._current_usage_key()
+        client_ref = self._client_ref(client_id)
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        concurrency_ref = self._concurrency_ref(client_id)
+        refs = [usage_ref, concurrency_ref] if cached is not None else [client_ref, usage_ref, concurrency_ref]
 
         @firestore.transactional
-        def _acquire(transaction: firestore.Transaction) -> None:
-            snapshot = ref.get(transaction=transaction)
-            active = int(snapshot.to_dict().get("active", 0)) if snapshot.exists else 0
-            if active >= int(entitlements.max_concurrent_queries):
-                raise EntitlementError("Concurrent query limit exceeded")
-            transaction.set(
-                ref,
-                {
-                    "active": active + 1,
-                    "updated_at": firestore.SERVER_TIMESTAMP,
-                },
-                merge=True,
+        def _run(transaction: firestore.Transaction) -> PlanEntitlements:
+            snapshots = {snapshot.reference.path: snapshot for snapshot in transaction.get_all(refs)}
+            entitlements = cached or _entitlements_from_document(client_id, snapshots[client_ref.path])
+            usage_snapshot = snapshots.get(usage_ref.path)
+            usage = UsageTotals.from_document(
+                usage_snapshot.to_dict() if usage_snapshot is not None and usage_snapshot.exists else None
             )
-
-        _acquire(self._db.transaction())
-
-    def _release_concurrency_slot(self, client_id: str, entitlements: PlanEntitlements) -> None:
-        if entitlements.max_concurrent_queries is None:
+            if self._usage_buffer is not None:
+                self._usage_buffer.set_persisted((client_id, date_key), usage)
+                usage = usage + self._usage_buffer.unflushed((client_id, date_key))
+            _check_admission(entitlements, usage, estimated_scan_mb)
+            if entitlements.max_concurrent_queries is not None:
+                now = self._clock()
+                leases = _live_leases(snapshots.get(concurrency_ref.path), now)
+                if len(leases) >= int(entitlements.max_concurrent_queries):
+                    raise EntitlementError("Concurrent query limit exceeded")
+                leases[lease_id] = now + self._lease_ttl_s
+                _write_leases(transaction, concurrency_ref, leases)
+            return entitlements
+
+        entitlements = _run(self._db.transaction())
+        if cached is None:
+            self._cache.put(client_id, entitlements)
+        return entitlements
+
+    def _release(self, admission: "_Admission") -> None:
+        client_id = admission.client_id
+        entitlements = admission.entitlements
+        stats = admission.usage
+        tracked = admission.lease_id is not None
+        if stats is None and not tracked:
             return
-        ref = self._concurrency_ref(client_id)
+        date_key = self._current_usage_key()
+        usage_ref = self._usage_document_ref(client_id, date_key)
+        concurrency_ref = self._concurrency_ref(client_id)
+        refs = ([usage_ref] if stats is not None else []) + ([concurrency_ref] if tracked else [])
+        shards = _shard_count(entitlements)
+        write_ref = self._usage_write_ref(client_id, date_key, shards)
 
         @firestore.transactional
-        def _release(transaction: firestore.Transaction) -> None:
-            snapshot = ref.get(transaction=transaction)
-            if not snapshot.exists:
-                return
-            active = max(int(snapshot.to_dict().get("active", 0)) - 1, 0)
-            if active == 0:
-                transaction.delete(ref)
-            else:
-                transaction.set(
-                    ref,
-                    {
-                        "active": active,
-                        "updated_at": firestore.SERVER_TIMESTAMP,
-                    },
-                    merge=True,
-                )
-
-        _release(self._db.transaction())
-
-    def _usage_document_ref(self, client_id: str) -> firestore.DocumentReference:
-        date_key = self._current_usage_key()
-        return (
-            self._db.collection("clients")
-            .document(client_id)
-            .collection("usage")
-            .document(date_key)
-        )
+        def _run(transaction: firestore.Transaction) -> Optional[EntitlementError]:
+            snapshots = {snapshot.reference.path: snapshot for snapshot in transaction.get_all(refs)}
+            violation: Optional[EntitlementError] = None
+            if stats is not None:
+                snapshot = snapshots.get(usage_ref.path)
+                usage = UsageTotals.from_document(snapshot.to_dict() if snapshot is not None and snapshot.exists else None)
+                delta = _usage_delta(stats)
+                try:
+                    _check_usage(entitlements, usage + delta, stats)
+                    transaction.set(write_ref, _usage_document(date_key, delta), merge=True)
+                except EntitlementError as exc:
+                    violation = exc  # the slot is still released below
+            if tracked:
+                snapshot = snapshots.get(concurrency_ref.path)
+                if snapshot is not None and snapshot.exists:
+                    leases = _live_leases(snapshot, self._clock())
+                    leases.pop(admission.lease_id, None)
+                    _write_leases(transaction, concurrency_ref, leases)
+            return violation
+
+        violation = _run(self._db.transaction())
+        if stats is not None and violation is None:
+            self._mark_unaggregated(client_id, date_key, shards)
+        if violation is not None:
+            raise violation
+
+    def _record_buffered_usage(
+        self,
+        client_id: str,
+        stats: QueryExecutionStats,
+        entitlements: PlanEntitlements,
+    ) -> None:
+        assert self._usage_buffer is not None
+        key = (client_id, self._current_usage_key())
+        delta = _usage_delta(stats)
+        self._usage_shards[client_id] = _shard_count(entitlements)
+        _check_usage(entitlements, self._buffered_usage(key) + delta, stats)
+        self._usage_buffer.add(key, delta)
+        if self._usage_buffer.needs_flush(key, entitlements):
+            self.flush_usage(key)
+
+    def _buffered_usage(self, key: UsageKey) -> UsageTotals:
+        assert self._usage_buffer is not None
+        persisted = self._usage_buffer.persisted(key)
+        if persisted is None:
+            persisted = self.get_usage(key[0], date_key=key[1])
+            self._usage_buffer.set_persisted(key, persisted)
+        return persisted + self._usage_buffer.unflushed(key)
+
+    def _read_usage(self, refs: Dict[UsageKey, firestore.DocumentReference]) -> Dict[UsageKey, UsageTotals]:
+        """Read exact totals: the daily document plus, for sharded clients, every shard."""
+
+        reads, by_path = self._usage_reads(refs)
+        try:
+            return _fold_usage(self._db.get_all(reads), by_path)
+        except Exception:  # pragma: no cover - the next precheck re-reads stale totals
+            LOGGER.warning("Failed to refresh usage totals after flush", exc_info=True)
+            return {}
 
-    def _concurrency_ref(self, client_id: str) -> firestore.DocumentReference:
-        return (
-            self._db.collection("clients")
-            .document(client_id)
-            .collection("runtime")
-            .document("concurrency")
+    def _mark_unaggregated(self, client_id: str, date_key: str, shards: int) -> None:
+        if shards <= 1:
+            return
+        with self._admissions_lock:
+            self._unaggregated[(client_id, date_key)] = shards
+            if self._aggregator is not None or self._stop_flusher.is_set():
+                return
+            self._aggregator = threading.Thread(target=self._aggregate_periodically, name="usage-aggregator", daemon=True)
+            self._aggregator.start()
+
+    def _aggregate_periodically(self) -> None:
+        while not self._stop_flusher.wait(self._aggregate_interval_s):
+            try:
+                self.aggregate_usage()
+            except Exception:  # pragma: no cover - retried on the next tick
+                LOGGER.exception("Failed to aggregate sharded usage")
+
+    def _ensure_heartbeat(self) -> None:
+        with self._admissions_lock:
+            if self._heartbeat is not None or self._stop_flusher.is_set():
+                return
+            self._heartbeat = threading.Thread(target=self._renew_periodically, name="lease-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _renew_periodically(self) -> None:
+        while not self._stop_flusher.wait(self._lease_ttl_s / 3):
+            try:
+                self.renew_leases()
+            except Exception:  # pragma: no cover - retried on the next beat, well before expiry
+                LOGGER.exception("Failed to renew concurrency leases")
+
+    def _flush_periodically(self) -> None:
+        assert self._usage_buffer is not None
+        while not self._stop_flusher.wait(self._usage_buffer.flush_interval_s):
+            try:
+                self.flush_usage()
+            except Exception:  # pragma: no cover - retried on the next tick
+                LOGGER.exception("Failed to flush buffered usage")
+
+
+
+def _entitlements_from_document(client_id: str, doc: firestore.DocumentSnapshot) -> PlanEntitlements:
+    if not doc.exists:
+        raise EntitlementError(f"Client {client_id} does not exist")
+    data = doc.to_dict() or {}
+    entitlements_data = data.get("entitlements")
+    if entitlements_data:
+        return PlanEntitlements(
+            max_queries_per_day=entitlements_data.get("max_queries_per_day"),
+            max_scan_mb_per_day=entitlements_data.get("max_scan_mb_per_day"),
+            max_concurrent_queries=entitlements_data.get("max_concurrent_queries"),
+            max_result_rows=entitlements_data.get("max_result_rows"),
+            query_timeout_ms=entitlements_data.get("query_timeout_ms"),
+            usage_shards=entitlements_data.get("usage_shards"),
+            plan_id=data.get("plan_id"),
         )
-
-    @staticmethod
-    def _current_usage_key() -> str:
-        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    plan_id = data.get("plan_id")
+    if not plan_id:
+        raise EntitlementError(f"Client {client_id} does not have a plan assigned")
+    from billing.stripe_catalog import get_plan_by_id  # imported lazily to avoid optional dependency at import time
+
+    plan = get_plan_by_id(plan_id)
+    return replace(plan.entitlements, plan_id=plan.plan_id)
+
+
+def _usage_delta(stats: QueryExecutionStats) -> UsageTotals:
+    return UsageTotals(queries=1, data_scanned_mb=float(stats.data_scanned_mb), rows_returned=int(stats.result_rows))
+
+
+def _check_admission(entitlements: PlanEntitlements, usage: UsageTotals, estimated_scan_mb: float) -> None:
+    if entitlements.max_queries_per_day is not None and usage.queries >= entitlements.max_queries_per_day:
+        raise EntitlementError("Daily query allotment exhausted")
+    if (
+        entitlements.max_scan_mb_per_day is not None
+        and usage.data_scanned_mb + estimated_scan_mb > entitlements.max_scan_mb_per_day
+    ):
+        raise EntitlementError("Daily data scan allotment exhausted")
+
+
+def _check_usage(entitlements: PlanEntitlements, usage: UsageTotals, stats: QueryExecutionStats) -> None:
+    if entitlements.max_queries_per_day is not None and usage.queries > entitlements.max_queries_per_day:
+        raise EntitlementError("Daily query allotment exhausted")
+    if entitlements.max_scan_mb_per_day is not None and usage.data_scanned_mb > entitlements.max_scan_mb_per_day:
+        raise EntitlementError("Daily data scan allotment exhausted")
+    if entitlements.max_result_rows is not None and stats.result_rows > entitlements.max_result_rows:
+        raise EntitlementError("Result row limit exceeded for plan")
+
+
+def _usage_document(date_key: str, delta: UsageTotals) -> Dict[str, object]:
+    return {
+        "date": date_key,
+        "queries": firestore.Increment(delta.queries),
+        "data_scanned_mb": firestore.Increment(delta.data_scanned_mb),
+        "rows_returned": firestore.Increment(delta.rows_returned),
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def _shard_count(entitlements: PlanEntitlements) -> int:
+    return max(int(entitlements.usage_shards or 1), 1)
+
+
+def _sum_shards(snapshots: Iterable[firestore.DocumentSnapshot]) -> UsageTotals:
+    totals = UsageTotals()
+    for snapshot in snapshots:
+        if snapshot.exists:
+            totals = totals + UsageTotals.from_document(snapshot.to_dict(), include_shards=False)
+    return totals
+
+
+def _fold_usage(
+    snapshots: Iterable[firestore.DocumentSnapshot],
+    by_path: Dict[str, Tuple[UsageKey, bool]],
+) -> Dict[UsageKey, UsageTotals]:
+    totals: Dict[UsageKey, UsageTotals] = {}
+    for snapshot in snapshots:
+        entry = by_path.get(snapshot.reference.path)
+        if entry is None:
+            continue
+        key, sharded = entry
+        # Shards are summed directly, so the aggregated ``shard_totals`` would double count.
+        data = snapshot.to_dict() if snapshot.exists else None
+        totals[key] = totals.get(key, UsageTotals()) + UsageTotals.from_document(data, include_shards=not sharded)
+    return totals
+
+
+def _live_leases(snapshot: Optional[firestore.DocumentSnapshot], now: float) -> Dict[str, float]:
+    """Return the unexpired leases recorded in a ``runtime/concurrency`` snapshot."""
+
+    if snapshot is None or not snapshot.exists:
+        return {}
+    leases = (snapshot.to_dict() or {}).get("leases") or {}
+    return {lease_id: float(expires_at) for lease_id, expires_at in leases.items() if float(expires_at) > now}
+
+
+def _lease_ids(admissions: Iterable[_Admission], client_id: str) -> List[str]:
+    return [admission.lease_id for admission in admissions if admission.client_id == client_id and admission.lease_id is not None]
+
+
+def _renew_leases(
+    transaction: firestore.Transaction,
+    ref: firestore.DocumentReference,
+    snapshot: Optional[firestore.DocumentSnapshot],
+    lease_ids: Iterable[str],
+    now: float,
+    expires_at: float,
+) -> int:
+    """Extend the ``lease_ids`` still recorded in ``snapshot``; released leases are never re-added."""
+
+    if snapshot is None or not snapshot.exists:
+        return 0
+    recorded = (snapshot.to_dict() or {}).get("leases") or {}
+    renewed = [lease_id for lease_id in lease_ids if lease_id in recorded]
+    if not renewed:
+        return 0
+    leases = _live_leases(snapshot, now)
+    leases.update(dict.fromkeys(renewed, expires_at))
+    _write_leases(transaction, ref, leases)
+    return len(renewed)
+
+
+def _write_leases(
+    transaction: firestore.Transaction,
+    ref: firestore.DocumentReference,
+    leases: Dict[str, float],
+) -> None:
+    if not leases:
+        transaction.delete(ref)
+        return
+    # Overwrite rather than merge so reclaimed leases (and the legacy counter) disappear.
+    transaction.set(ref, {"leases": leases, "updated_at": firestore.SERVER_TIMESTAMP})
@@ -0,0 +1,264 @@
+"""In-process token-bucket rate limiting of query admissions per client."""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+from billing.models import PlanEntitlements
+
+from .entitlements import EntitlementError
+
+
+class RateLimitExceeded(EntitlementError):
+    """Raised when a client sends requests faster than its plan allows."""
+
+    def __init__(self, client_id: str, retry_after_s: float) -> None:
+        super().__init__(f"Request rate limit exceeded for client {client_id}")
+        self.client_id = client_id
+        self.retry_after_s = retry_after_s
+
+
+class SharedCounter(Protocol):
+    """A cheap counter shared by every API instance, e.g. a Redis key."""
+
+    def increment(self, key: str, amount: int, ttl_s: float) -> int:
+        """Add ``amount`` to ``key`` (created with ``ttl_s``) and return the new total."""
+
+
+@dataclass(frozen=True)
+class BucketSize:
+    """Sustained rate and burst capacity of a client's token bucket."""
+
+    rate_per_s: float
+    capacity: float
+
+    @classmethod
+    def from_entitlements(
+        cls,
+        entitlements: PlanEntitlements,
+        *,
+        requests_per_slot_s: float = 2.0,
+        burst_per_slot: float = 10.0,
+    ) -> Optional["BucketSize"]:
+        """Size a bucket from the plan's concurrency limit; ``None`` means unlimited.
+
+        The daily query quota bounds the burst as well, so a small plan cannot
+        spend its whole day's allowance in one spike of rejected requests.
+        """
+
+        slots = entitlements.max_concurrent_queries
+        if slots is None:
+            return None
+        rate = max(float(slots), 1.0) * requests_per_slot_s
+        capacity = max(float(slots), 1.0) * burst_per_slot
+        if entitlements.max_queries_per_day is not None:
+            capacity = min(capacity, max(float(entitlements.max_queries_per_day), 1.0))
+        return cls(rate_per_s=rate, capacity=capacity)
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at ``size.rate_per_s``."""
+
+    def __init__(self, size: BucketSize, now: float) -> None:
+        self.size = size
+        self._tokens = size.capacity
+        self._updated_at = now
+
+    def resize(self, size: BucketSize) -> None:
+        self.size = size
+        self._tokens = min(self._tokens, size.capacity)
+
+    def try_take(self, now: float, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens; return 0 on success or the seconds until they are available."""
+
+        self._refill(now)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.size.rate_per_s
+
+    def drain(self, now: float, amount: float) -> None:
+        """Remove tokens spent elsewhere without going below an empty bucket."""
+
+        self._refill(now)
+        self._tokens = max(self._tokens - amount, 0.0)
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self._updated_at, 0.0)
+        self._tokens = min(self._tokens + elapsed * self.size.rate_per_s, self.size.capacity)
+        self._updated_at = now
+
+
+@dataclass
+class _ClientState:
+    bucket: TokenBucket
+    window: int = -1
+    pending: int = 0
+    seen_total: int = 0
+    synced_at: float = 0.0
+
+
+class RateLimiter:
+    """Reject obvious overload per client before any entitlement round trip.
+
+    Buckets are sized from the client's :class:`~billing.models.PlanEntitlements`
+    (see :meth:`BucketSize.from_entitlements`); clients whose plan has not been
+    seen yet are let through so their first admission can load it.
+
+    With a :class:`SharedCounter`, every instance reports the tokens it handed out
+    at most every ``sync_interval_s`` to a counter for the current ``window_s``
+    window and drains its local bucket by what the other instances spent, so the
+    combined rate converges on the plan's rate with one counter call per interval.
+    """
+
+    def __init__(
+        self,
+        *,
+        shared: Optional[SharedCounter] = None,
+        sync_interval_s: float = 0.25,
+        window_s: float = 60.0,
+        sizer: Callable[[PlanEntitlements], Optional[BucketSize]] = BucketSize.from_entitlements,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ) -> None:
+        if window_s <= 0:
+            raise ValueError("window_s must be positive")
+        self._shared = shared
+        self._sync_interval_s = sync_interval_s
+        self._window_s = window_s
+        self._sizer = sizer
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._clients: Dict[str, _ClientState] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client_id: str, entitlements: Optional[PlanEntitlements]) -> None:
+        """Take one token for ``client_id`` or raise :class:`RateLimitExceeded`.
+
+        Without ``entitlements`` the bucket sized by an earlier call is reused.
+        """
+
+        state, sync = self._prepare(client_id, entitlements)
+        if state is None:
+            return
+        if sync:
+            self._sync(client_id, state)
+        self._take(client_id, state)
+
+    async def acquire_async(self, client_id: str, entitlements: Optional[PlanEntitlements]) -> None:
+        """Like :meth:`acquire`, but run the shared-counter sync off the event loop."""
+
+        state, sync = self._prepare(client_id, entitlements)
+        if state is None:
+            return
+        if sync:
+            await asyncio.to_thread(self._sync, client_id, state)
+        self._take(client_id, state)
+
+    def forget(self, client_id: Optional[str] = None) -> None:
+        """Drop the bucket of one client, or all of them."""
+
+        with self._lock:
+            if client_id is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(client_id, None)
+
+    # Internal helpers -------------------------------------------------
+
+    def _prepare(
+        self, client_id: str, entitlements: Optional[PlanEntitlements]
+    ) -> Tuple[Optional[_ClientState], bool]:
+        size = self._sizer(entitlements) if entitlements is not None else None
+        now = self._clock()
+        with self._lock:
+            state = self._clients.get(client_id)
+            if entitlements is not None and size is None:
+                self._clients.pop(client_id, None)
+                return None, False
+            if state is None:
+                if size is None:
+                    return None, False
+                state = self._clients[client_id] = _ClientState(bucket=TokenBucket(size, now))
+            elif size is not None and state.bucket.size != size:
+                state.bucket.resize(size)
+            sync = self._shared is not None and now - state.synced_at >= self._sync_interval_s
+            if sync:
+                state.synced_at = now
+        return state, sync
+
+    def _take(self, client_id: str, state: _ClientState) -> None:
+        with self._lock:
+            retry_after_s = state.bucket.try_take(self._clock())
+            if retry_after_s == 0.0:
+                state.pending += 1
+        if retry_after_s:
+            raise RateLimitExceeded(client_id, retry_after_s)
+
+    def _sync(self, client_id: str, state: _ClientState) -> None:
+        assert self._shared is not None
+        window = int(self._wall_clock() // self._window_s)
+        with self._lock:
+            reported = state.pending
+            state.pending = 0
+            if window != state.window:
+                state.window, state.seen_total = window, 0
+            seen_total = state.seen_total
+        try:
+            total = self._shared.increment(f"{client_id}:{window}", reported, self._window_s * 2)
+        except Exception:  # pragma: no cover - degrade to local-only limiting
+            with self._lock:
+                state.pending += reported
+            return
+        with self._lock:
+            foreign = total - seen_total - reported
+            if state.window == window:
+                state.seen_total = max(state.seen_total, total)
+            if foreign > 0:
+                state.bucket.drain(self._clock(), float(foreign))
+
+
+class InMemorySharedCounter:
+    """A :class:`SharedCounter` for a single process, mainly for tests."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._values: Dict[str, Tuple[int, float]] = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, amount: int, ttl_s: float) -> int:
+        now = self._clock()
+        with self._lock:
+            value, expires_at = self._values.get(key, (0, 0.0))
+            if expires_at <= now:
+                value, expires_at = 0, now + ttl_s
+            self._values[key] = (value + amount, expires_at)
+            return value + amount
+
+
+class RedisSharedCounter:
+    """A :class:`SharedCounter` backed by Redis ``INCRBY`` with a key expiry."""
+
+    def __init__(self, client: Any = None, *, url: str = "redis://localhost:6379/0", prefix: str = "ratelimit:") -> None:
+        if client is None:
+            if importlib.util.find_spec("redis") is None:
+                raise RuntimeError(
+                    "The 'redis' package is required for RedisSharedCounter. Install it via 'pip install redis'."
+                )
+            import redis  # type: ignore
+
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self._prefix = prefix
+
+    def increment(self, key: str, amount: int, ttl_s: float) -> int:
+        pipeline = self._client.pipeline()
+        pipeline.incrby(self._prefix + key, amount)
+        pipeline.expire(self._prefix + key, max(int(math.ceil(ttl_s)), 1), nx=True)
+        total, _ = pipeline.execute()
+        return int(total)
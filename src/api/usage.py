@@ -0,0 +1,170 @@
+"""In-memory buffering of query usage ahead of batched Firestore writes."""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional, Tuple
+
+from billing.models import PlanEntitlements
+
+UsageKey = Tuple[str, str]
+"""``(client_id, usage date key)`` identifying a ``usage/<date>`` document."""
+
+
+@dataclass(frozen=True)
+class UsageTotals:
+    """Query count, scanned megabytes and returned rows for one client and day."""
+
+    queries: int = 0
+    data_scanned_mb: float = 0.0
+    rows_returned: int = 0
+
+    def __add__(self, other: "UsageTotals") -> "UsageTotals":
+        return UsageTotals(
+            queries=self.queries + other.queries,
+            data_scanned_mb=self.data_scanned_mb + other.data_scanned_mb,
+            rows_returned=self.rows_returned + other.rows_returned,
+        )
+
+    @classmethod
+    def from_document(cls, data: Optional[Dict[str, object]], *, include_shards: bool = True) -> "UsageTotals":
+        """Read a ``usage/<date>`` document, adding its aggregated ``shard_totals`` by default."""
+
+        data = data or {}
+        totals = cls(
+            queries=int(data.get("queries", 0) or 0),  # type: ignore[arg-type]
+            data_scanned_mb=float(data.get("data_scanned_mb", 0.0) or 0.0),  # type: ignore[arg-type]
+            rows_returned=int(data.get("rows_returned", 0) or 0),  # type: ignore[arg-type]
+        )
+        shard_totals = data.get("shard_totals")
+        if include_shards and isinstance(shard_totals, dict):
+            totals = totals + cls.from_document(shard_totals, include_shards=False)
+        return totals
+
+    def to_document(self) -> Dict[str, object]:
+        return {"queries": self.queries, "data_scanned_mb": self.data_scanned_mb, "rows_returned": self.rows_returned}
+
+
+@dataclass
+class _Persisted:
+    totals: UsageTotals
+    read_at: float
+
+
+class UsageBuffer:
+    """Collect usage deltas per client and day until they are flushed in a batch.
+
+    The buffer also remembers the totals last read from Firestore so that checks
+    can be made against ``persisted + in flight + pending`` without a round trip.
+    ``tolerance`` is the fraction of a daily limit a client may accumulate before
+    :meth:`needs_flush` asks for an early flush, which bounds how far other
+    instances' view of the counters can lag behind.
+    """
+
+    def __init__(
+        self,
+        *,
+        flush_interval_s: float = 1.0,
+        tolerance: float = 0.01,
+        persisted_max_age_s: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if flush_interval_s <= 0:
+            raise ValueError("flush_interval_s must be positive")
+        self.flush_interval_s = flush_interval_s
+        self._tolerance = max(tolerance, 0.0)
+        self._persisted_max_age_s = persisted_max_age_s
+        self._clock = clock
+        self._pending: Dict[UsageKey, UsageTotals] = {}
+        self._in_flight: Dict[UsageKey, UsageTotals] = {}
+        self._persisted: Dict[UsageKey, _Persisted] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: UsageKey, delta: UsageTotals) -> None:
+        with self._lock:
+            self._pending[key] = self._pending.get(key, UsageTotals()) + delta
+
+    def unflushed(self, key: UsageKey) -> UsageTotals:
+        """Usage recorded locally that Firestore has not acknowledged yet."""
+
+        with self._lock:
+            return self._pending.get(key, UsageTotals()) + self._in_flight.get(key, UsageTotals())
+
+    def persisted(self, key: UsageKey) -> Optional[UsageTotals]:
+        """Totals last read from Firestore, or ``None`` when missing or too old."""
+
+        with self._lock:
+            entry = self._persisted.get(key)
+            if entry is None or self._clock() - entry.read_at > self._persisted_max_age_s:
+                return None
+            return entry.totals
+
+    def set_persisted(self, key: UsageKey, totals: UsageTotals) -> None:
+        with self._lock:
+            self._persisted[key] = _Persisted(totals=totals, read_at=self._clock())
+
+    def needs_flush(self, key: UsageKey, entitlements: PlanEntitlements) -> bool:
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is None:
+            return False
+        if entitlements.max_queries_per_day is not None:
+            if pending.queries > self._tolerance * entitlements.max_queries_per_day:
+                return True
+        if entitlements.max_scan_mb_per_day is not None:
+            if pending.data_scanned_mb > self._tolerance * entitlements.max_scan_mb_per_day:
+                return True
+        return False
+
+    def drain(self, key: Optional[UsageKey] = None) -> Dict[UsageKey, UsageTotals]:
+        """Move pending deltas (all, or only ``key``) in flight and return them."""
+
+        with self._lock:
+            keys = [key] if key is not None else list(self._pending)
+            drained: Dict[UsageKey, UsageTotals] = {}
+            for item in keys:
+                delta = self._pending.pop(item, None)
+                if delta is None:
+                    continue
+                drained[item] = delta
+                self._in_flight[item] = self._in_flight.get(item, UsageTotals()) + delta
+            return drained
+
+    def complete(self, deltas: Dict[UsageKey, UsageTotals], persisted: Dict[UsageKey, UsageTotals]) -> None:
+        """Forget flushed ``deltas`` and record the totals read back after the flush."""
+
+        now = self._clock()
+        with self._lock:
+            for key, delta in deltas.items():
+                self._release_in_flight(key, delta)
+                if key in persisted:
+                    self._persisted[key] = _Persisted(totals=persisted[key], read_at=now)
+                else:
+                    # Without a fresh read the cached totals miss this flush; re-read them.
+                    self._persisted.pop(key, None)
+
+    def restore(self, deltas: Dict[UsageKey, UsageTotals]) -> None:
+        """Return ``deltas`` from a failed flush to the pending set."""
+
+        with self._lock:
+            for key, delta in deltas.items():
+                self._release_in_flight(key, delta)
+                self._pending[key] = self._pending.get(key, UsageTotals()) + delta
+
+    # Internal helpers -------------------------------------------------
+
+    def _release_in_flight(self, key: UsageKey, delta: UsageTotals) -> None:
+        remaining = self._in_flight.get(key)
+        if remaining is None:
+            return
+        remaining = replace(
+            remaining,
+            queries=remaining.queries - delta.queries,
+            data_scanned_mb=remaining.data_scanned_mb - delta.data_scanned_mb,
+            rows_returned=remaining.rows_returned - delta.rows_returned,
+        )
+        if remaining.queries <= 0 and remaining.data_scanned_mb <= 1e-9 and remaining.rows_returned <= 0:
+            del self._in_flight[key]
+        else:
+            self._in_flight[key] = remaining
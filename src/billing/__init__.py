@@ -4,12 +4,16 @@ import importlib.util
 
 from .models import PlanDefinition, PlanEntitlements
 if importlib.util.find_spec("google.cloud.firestore") is not None:  # pragma: no cover - optional dependency
-    from .firestore_repository import BillingRepository
+    from .firestore_repository import AsyncBillingRepository, BillingRepository
 else:  # pragma: no cover - fallback when Firestore SDK is unavailable
     class BillingRepository:  # type: ignore
         def __init__(self, *args, **kwargs) -> None:  # noqa: ANN001
             raise RuntimeError("The 'google-cloud-firestore' package is required for BillingRepository.")
 
+    class AsyncBillingRepository:  # type: ignore
+        def __init__(self, *args, **kwargs) -> None:  # noqa: ANN001
+            raise RuntimeError("The 'google-cloud-firestore' package is required for AsyncBillingRepository.")
+
 if importlib.util.find_spec("stripe") is not None:  # pragma: no cover - optional dependency
     from .stripe_catalog import PLAN_CATALOG, PLAN_BY_PRICE_ID, ensure_stripe_catalog, get_plan_by_id, get_plan_by_price_id
     from .checkout import create_billing_portal_session, create_checkout_session
@@ -51,6 +55,7 @@ __all__ = [
     "create_checkout_session",
     "create_billing_portal_session",
     "BillingRepository",
+    "AsyncBillingRepository",
     "StripeWebhookProcessor",
     "StripeWebhookError",
 ]
@@ -33,42 +33,13 @@ class BillingRepository:
 
         LOGGER.info("Linking Stripe customer %s to client %s", customer_id, client_id)
         batch = self._db.batch()
-
-        customer_ref = self._db.collection("stripe_customers").document(customer_id)
-        batch.set(
-            customer_ref,
-            {
-                "client_id": client_id,
-                "subscription_id": subscription_id,
-                "price_id": price_id,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            },
-            merge=True,
-        )
-
-        client_ref = self._db.collection("clients").document(client_id)
-        batch.set(
-            client_ref,
-            {
-                "stripe_customer_id": customer_id,
-                "subscription_id": subscription_id,
-                "price_id": price_id,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            },
-            merge=True,
-        )
-
+        _stage_customer_link(self._db, batch, customer_id, client_id, subscription_id, price_id)
         batch.commit()
 
     def record_checkout_session(self, *, session_id: str, client_id: str, plan_id: str) -> None:
         LOGGER.debug("Recording checkout session %s for client %s", session_id, client_id)
         self._db.collection("stripe_checkout_sessions").document(session_id).set(
-            {
-                "client_id": client_id,
-                "plan_id": plan_id,
-                "created_at": firestore.SERVER_TIMESTAMP,
-            },
-            merge=True,
+            _checkout_session_document(client_id, plan_id), merge=True
         )
 
     def update_client_plan(
@@ -82,16 +53,7 @@ class BillingRepository:
         price_id: Optional[str],
     ) -> None:
         LOGGER.info("Updating client %s plan to %s", client_id, plan.plan_id)
-        doc = {
-            "plan_id": plan.plan_id,
-            "plan_name": plan.display_name,
-            "entitlements": plan.entitlements_dict(),
-            "subscription_status": subscription_status,
-            "subscription_id": subscription_id,
-            "price_id": price_id,
-            "current_period_end": current_period_end,
-            "updated_at": firestore.SERVER_TIMESTAMP,
-        }
+        doc = _plan_document(plan, subscription_status, subscription_id, current_period_end, price_id)
         self._db.collection("clients").document(client_id).set(doc, merge=True)
 
     def update_subscription_status(
@@ -103,12 +65,7 @@ class BillingRepository:
     ) -> None:
         LOGGER.debug("Updating subscription status for client %s to %s", client_id, subscription_status)
         self._db.collection("clients").document(client_id).set(
-            {
-                "subscription_status": subscription_status,
-                "current_period_end": current_period_end,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            },
-            merge=True,
+            _subscription_status_document(subscription_status, current_period_end), merge=True
         )
 
     def get_client_id_for_customer(self, *, customer_id: str) -> Optional[str]:
@@ -125,13 +82,161 @@ class BillingRepository:
         return doc.to_dict()
 
     def record_processed_webhook(self, *, event_id: str, event_type: str) -> None:
-        self._db.collection("stripe_webhook_events").document(event_id).set(
-            {
-                "event_type": event_type,
-                "processed_at": firestore.SERVER_TIMESTAMP,
-            }
-        )
+        self._db.collection("stripe_webhook_events").document(event_id).set(_webhook_event_document(event_type))
 
     def has_processed_event(self, *, event_id: str) -> bool:
         doc = self._db.collection("stripe_webhook_events").document(event_id).get()
         return doc.exists
+
+
+class AsyncBillingRepository:
+    """:class:`BillingRepository` on the asyncio Firestore client; every method is awaitable."""
+
+    def __init__(self, client: Optional["firestore.AsyncClient"] = None) -> None:
+        self._db = client or firestore.AsyncClient()
+
+    @property
+    def db(self) -> "firestore.AsyncClient":
+        return self._db
+
+    async def link_customer_to_client(
+        self,
+        *,
+        customer_id: str,
+        client_id: str,
+        subscription_id: Optional[str],
+        price_id: Optional[str],
+    ) -> None:
+        """Persist the mapping between a Stripe customer and internal client identifier."""
+
+        LOGGER.info("Linking Stripe customer %s to client %s", customer_id, client_id)
+        batch = self._db.batch()
+        _stage_customer_link(self._db, batch, customer_id, client_id, subscription_id, price_id)
+        await batch.commit()
+
+    async def record_checkout_session(self, *, session_id: str, client_id: str, plan_id: str) -> None:
+        LOGGER.debug("Recording checkout session %s for client %s", session_id, client_id)
+        await self._db.collection("stripe_checkout_sessions").document(session_id).set(
+            _checkout_session_document(client_id, plan_id), merge=True
+        )
+
+    async def update_client_plan(
+        self,
+        *,
+        client_id: str,
+        plan: PlanDefinition,
+        subscription_status: str,
+        subscription_id: Optional[str],
+        current_period_end: Optional[int],
+        price_id: Optional[str],
+    ) -> None:
+        LOGGER.info("Updating client %s plan to %s", client_id, plan.plan_id)
+        doc = _plan_document(plan, subscription_status, subscription_id, current_period_end, price_id)
+        await self._db.collection("clients").document(client_id).set(doc, merge=True)
+
+    async def update_subscription_status(
+        self,
+        *,
+        client_id: str,
+        subscription_status: str,
+        current_period_end: Optional[int],
+    ) -> None:
+        LOGGER.debug("Updating subscription status for client %s to %s", client_id, subscription_status)
+        await self._db.collection("clients").document(client_id).set(
+            _subscription_status_document(subscription_status, current_period_end), merge=True
+        )
+
+    async def get_client_id_for_customer(self, *, customer_id: str) -> Optional[str]:
+        doc = await self._db.collection("stripe_customers").document(customer_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict() or {}
+        return data.get("client_id")
+
+    async def get_plan_document(self, *, client_id: str) -> Optional[Dict[str, Any]]:
+        doc = await self._db.collection("clients").document(client_id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    async def record_processed_webhook(self, *, event_id: str, event_type: str) -> None:
+        await self._db.collection("stripe_webhook_events").document(event_id).set(_webhook_event_document(event_type))
+
+    async def has_processed_event(self, *, event_id: str) -> bool:
+        doc = await self._db.collection("stripe_webhook_events").document(event_id).get()
+        return doc.exists
+
+
+# Internal helpers -------------------------------------------------
+
+
+def _stage_customer_link(
+    db: Any,
+    batch: Any,
+    customer_id: str,
+    client_id: str,
+    subscription_id: Optional[str],
+    price_id: Optional[str],
+) -> None:
+    batch.set(
+        db.collection("stripe_customers").document(customer_id),
+        {
+            "client_id": client_id,
+            "subscription_id": subscription_id,
+            "price_id": price_id,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        },
+        merge=True,
+    )
+    batch.set(
+        db.collection("clients").document(client_id),
+        {
+            "stripe_customer_id": customer_id,
+            "subscription_id": subscription_id,
+            "price_id": price_id,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        },
+        merge=True,
+    )
+
+
+def _checkout_session_document(client_id: str, plan_id: str) -> Dict[str, Any]:
+    return {
+        "client_id": client_id,
+        "plan_id": plan_id,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def _plan_document(
+    plan: PlanDefinition,
+    subscription_status: str,
+    subscription_id: Optional[str],
+    current_period_end: Optional[int],
+    price_id: Optional[str],
+) -> Dict[str, Any]:
+    return {
+        "plan_id": plan.plan_id,
+        "plan_name": plan.display_name,
+        "entitlements": plan.entitlements_dict(),
+        "subscription_status": subscription_status,
+        "subscription_id": subscription_id,
+        "price_id": price_id,
+        "current_period_end": current_period_end,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def _subscription_status_document(subscription_status: str, current_period_end: Optional[int]) -> Dict[str, Any]:
+    return {
+        "subscription_status": subscription_status,
+        "current_period_end": current_period_end,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def _webhook_event_document(event_type: str) -> Dict[str, Any]:
+    return {
+        "event_type": event_type,
+        "processed_at": firestore.SERVER_TIMESTAMP,
+    }
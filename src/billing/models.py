@@ -1,7 +1,7 @@
 """Domain models for subscription plans and entitlements."""
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 from typing import Dict, Optional
 
 
@@ -13,11 +13,16 @@ class PlanEntitlements:
     max_scan_mb_per_day: Optional[int]
     max_concurrent_queries: Optional[int]
     max_result_rows: Optional[int] = None
+    query_timeout_ms: Optional[int] = None
+    usage_shards: Optional[int] = None
+    plan_id: Optional[str] = field(default=None, compare=False)
 
     def to_dict(self) -> Dict[str, Optional[int]]:
         """Serialise the entitlement limits for storage in Firestore."""
 
-        return asdict(self)
+        limits = asdict(self)
+        limits.pop("plan_id")
+        return limits
 
 
 @dataclass(frozen=True)
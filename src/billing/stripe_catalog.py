@@ -43,6 +43,7 @@ PLAN_CATALOG: Dict[str, PlanDefinition] = {
             max_scan_mb_per_day=5_000,
             max_concurrent_queries=2,
             max_result_rows=100_000,
+            query_timeout_ms=60_000,
         ),
     ),
     "pro": PlanDefinition(
@@ -58,6 +59,7 @@ PLAN_CATALOG: Dict[str, PlanDefinition] = {
             max_scan_mb_per_day=50_000,
             max_concurrent_queries=5,
             max_result_rows=1_000_000,
+            query_timeout_ms=300_000,
         ),
     ),
     "enterprise": PlanDefinition(
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional
 
 import stripe
 from flask import Request
@@ -18,11 +18,16 @@ class StripeWebhookError(RuntimeError):
     """Raised when Stripe webhook processing fails."""
 
 
+PlanChangeListener = Callable[[str], None]
+"""Callback invoked with a client id after its plan or subscription changes."""
+
+
 class StripeWebhookProcessor:
     """High-level handler for Stripe webhook events."""
 
-    def __init__(self, repository: BillingRepository) -> None:
+    def __init__(self, repository: BillingRepository, *, on_plan_change: Optional[PlanChangeListener] = None) -> None:
         self._repository = repository
+        self._on_plan_change = on_plan_change
 
     def verify_and_parse_event(self, payload: bytes, signature: str) -> stripe.Event:
         secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
@@ -71,6 +76,7 @@ class StripeWebhookProcessor:
                 current_period_end=None,
                 price_id=price_id,
             )
+            self._notify_plan_change(client_id)
         self._repository.link_customer_to_client(
             customer_id=customer_id,
             client_id=client_id,
@@ -121,6 +127,7 @@ class StripeWebhookProcessor:
                 subscription_status="active",
                 current_period_end=period_end,
             )
+        self._notify_plan_change(client_id)
 
     def _handle_customer_subscription_updated(self, event: stripe.Event) -> None:
         subscription = event["data"]["object"]
@@ -159,6 +166,15 @@ class StripeWebhookProcessor:
                 subscription_status=status,
                 current_period_end=current_period_end,
             )
+        self._notify_plan_change(client_id)
+
+    def _notify_plan_change(self, client_id: str) -> None:
+        if self._on_plan_change is None:
+            return
+        try:
+            self._on_plan_change(client_id)
+        except Exception:  # pragma: no cover - listeners must not fail webhook processing
+            LOGGER.exception("Plan change listener failed for client %s", client_id)
 
     # Utility entrypoints ------------------------------------------------
 
@@ -4,7 +4,7 @@ from .bootstrap import CatalogBootstrapResult, ClientCatalogHandle, IcebergCatal
 from .config import CatalogProvider, IcebergCatalogConfig
 from .schema import SchemaEvolutionManager, SchemaEvolutionError
 from .storage import CatalogPrefixMarker, CatalogStorageError, DefaultCatalogStorageFactory, WarehouseStorageManager
-from .tables import DEFAULT_TABLES, IcebergTableSpec, SchemaField
+from .tables import DEFAULT_TABLES, QUERY_HISTORY_TABLE, IcebergTableSpec, SchemaField
 
 __all__ = [
     "CatalogBootstrapResult",
@@ -16,6 +16,7 @@ __all__ = [
     "IcebergCatalogBootstrapper",
     "IcebergCatalogConfig",
     "IcebergTableSpec",
+    "QUERY_HISTORY_TABLE",
     "SchemaEvolutionError",
     "SchemaEvolutionManager",
     "SchemaField",
@@ -11,6 +11,7 @@ from .tables import DEFAULT_TABLES, IcebergTableSpec
 
 if TYPE_CHECKING:  # pragma: no cover - import only for typing
     from pyiceberg.catalog import Catalog
+    from pyiceberg.table import Table
 
 
 class CatalogBootstrapError(RuntimeError):
@@ -113,18 +114,7 @@ class IcebergCatalogBootstrapper:
             identifier = table.identifier(namespace)
             if catalog.table_exists(identifier):
                 continue
-            schema = table.to_pyiceberg_schema()
-            partition_spec = table.to_pyiceberg_partition_spec(schema)
-            location = table.location(config, client_id)
-            create_kwargs: dict[str, object] = {
-                "schema": schema,
-                "location": location,
-            }
-            if partition_spec is not None and getattr(partition_spec, "fields", None):
-                create_kwargs["partition_spec"] = partition_spec
-            if table.properties:
-                create_kwargs["properties"] = dict(table.properties)
-            catalog.create_table(identifier, **create_kwargs)
+            self._create_table(catalog, identifier, table, config, client_id)
             created_tables.append(identifier)
 
         return CatalogBootstrapResult(
@@ -136,6 +126,52 @@ class IcebergCatalogBootstrapper:
             prefix_markers=tuple(prefix_markers),
         )
 
+    def ensure_table(self, client_id: str, config: IcebergCatalogConfig, table: IcebergTableSpec) -> "Table":
+        """Load ``table`` from the client's namespace, creating it first when missing.
+
+        The namespace itself must already exist, see :meth:`bootstrap_client`.
+        """
+
+        handle = self.open_catalog(client_id, config)
+        identifier = table.identifier(handle.namespace)
+        if not handle.catalog.table_exists(identifier):
+            try:
+                return self._create_table(handle.catalog, identifier, table, config, client_id)
+            except Exception:
+                # Another process may have created it concurrently.
+                if not handle.catalog.table_exists(identifier):
+                    raise
+        return handle.catalog.load_table(identifier)
+
+    def load_table(self, client_id: str, config: IcebergCatalogConfig, table: IcebergTableSpec) -> "Table | None":
+        """Load ``table`` from the client's namespace, or return ``None`` when it does not exist."""
+
+        handle = self.open_catalog(client_id, config)
+        identifier = table.identifier(handle.namespace)
+        if not handle.catalog.table_exists(identifier):
+            return None
+        return handle.catalog.load_table(identifier)
+
+    def _create_table(
+        self,
+        catalog: "Catalog",
+        identifier: Tuple[str, ...],
+        table: IcebergTableSpec,
+        config: IcebergCatalogConfig,
+        client_id: str,
+    ) -> "Table":
+        schema = table.to_pyiceberg_schema()
+        partition_spec = table.to_pyiceberg_partition_spec(schema)
+        create_kwargs: dict[str, object] = {
+            "schema": schema,
+            "location": table.location(config, client_id),
+        }
+        if partition_spec is not None and getattr(partition_spec, "fields", None):
+            create_kwargs["partition_spec"] = partition_spec
+        if table.properties:
+            create_kwargs["properties"] = dict(table.properties)
+        return catalog.create_table(identifier, **create_kwargs)
+
     def _prepare_storage(
         self,
         config: IcebergCatalogConfig,
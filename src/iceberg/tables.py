@@ -99,6 +99,7 @@ class IcebergTableSpec:
 
     name: str
     fields: Sequence[SchemaField]
+    # Column names, or ``year(col)``/``month(col)``/``day(col)``/``hour(col)`` transforms.
     partition_by: Sequence[str] = field(default_factory=tuple)
     properties: Mapping[str, str] = field(default_factory=dict)
 
@@ -121,15 +122,29 @@ class IcebergTableSpec:
             return None
         try:
             from pyiceberg.partitioning import PartitionField, PartitionSpec  # type: ignore
-            from pyiceberg.transforms import IdentityTransform  # type: ignore
+            from pyiceberg.transforms import (  # type: ignore
+                DayTransform,
+                HourTransform,
+                IdentityTransform,
+                MonthTransform,
+                YearTransform,
+            )
         except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
             raise ModuleNotFoundError(
                 "The 'pyiceberg' package is required to materialize Iceberg schemas. Install it via 'pip install pyiceberg'."
             ) from exc
 
+        transforms = {
+            "identity": IdentityTransform,
+            "year": YearTransform,
+            "month": MonthTransform,
+            "day": DayTransform,
+            "hour": HourTransform,
+        }
         fields: list[PartitionField] = []
         next_field_id = schema.highest_field_id + 1
-        for offset, column in enumerate(self.partition_by):
+        for offset, expression in enumerate(self.partition_by):
+            transform, column = _parse_partition(expression)
             target = schema.find_field(column)
             if target is None:
                 raise ValueError(f"Partition column '{column}' is not present in the schema for table '{self.name}'.")
@@ -137,8 +152,8 @@ class IcebergTableSpec:
                 PartitionField(
                     source_id=target.field_id,
                     field_id=next_field_id + offset,
-                    transform=IdentityTransform(),
-                    name=column,
+                    transform=transforms[transform](),
+                    name=column if transform == "identity" else f"{column}_{transform}",
                 )
             )
         return PartitionSpec(*fields)
@@ -194,6 +209,45 @@ DEFAULT_TABLES: Tuple[IcebergTableSpec, ...] = (
 )
 
 
+QUERY_HISTORY_TABLE = IcebergTableSpec(
+    name="query_history",
+    fields=(
+        SchemaField("query_id", "string", required=True, doc="Identifier of the query execution."),
+        SchemaField("client_id", "string", required=True, doc="Client that submitted the query."),
+        SchemaField("statement", "string", doc="SQL text as submitted."),
+        SchemaField("status", "string", doc="Final status of the execution."),
+        SchemaField("submitted_at", "timestamptz", required=True, doc="When the query was submitted."),
+        SchemaField("completed_at", "timestamptz", doc="When the query finished, if it did."),
+        SchemaField("elapsed_ms", "double", doc="Execution time in milliseconds."),
+        SchemaField("data_scanned_mb", "double", doc="Data scanned in megabytes."),
+        SchemaField("row_count", "long", doc="Rows returned."),
+        SchemaField("cost_usd", "double", doc="Cost charged for the execution."),
+        SchemaField("error_message", "string", doc="Error reported for failed executions."),
+        SchemaField("tables", "string", doc="JSON array of the tables referenced by the statement."),
+        SchemaField("snapshot_id", "string", doc="Snapshot the query read, if pinned."),
+        SchemaField("as_of_timestamp", "timestamptz", doc="Point in time the query read, if pinned."),
+        SchemaField("cache_hit", "boolean", doc="Whether the result was served from the cache."),
+    ),
+    partition_by=("day(submitted_at)",),
+    properties={
+        "write.format.default": "parquet",
+    },
+)
+
+
+def _parse_partition(expression: str) -> Tuple[str, str]:
+    """Split ``day(col)`` style partition expressions into ``(transform, column)``."""
+
+    text = expression.strip()
+    if not text.endswith(")") or "(" not in text:
+        return "identity", text
+    transform, _, column = text[:-1].partition("(")
+    transform = transform.strip().lower()
+    if transform not in {"identity", "year", "month", "day", "hour"}:
+        raise ValueError(f"Unsupported partition transform: {expression!s}")
+    return transform, column.strip()
+
+
 def _parse_decimal(spec: str) -> Tuple[int, int]:
     start = spec.find("(")
     end = spec.find(")")
@@ -1,31 +1,99 @@
 """Query execution service and history tracking utilities."""
 
+from .cache import QueryResultCache, ResultCacheKey, ResultCacheStats
+from .coalesce import BILL_ALL, BILL_LEADER, BILL_SPLIT, QueryCoalescer
+from .duckdb_engine import (
+    DuckDBConnectionPool,
+    DuckDBQueryEngine,
+    iceberg_catalog_snapshots,
+    iceberg_table_locations,
+    iceberg_warehouse_prefixes,
+)
 from .engine import QueryEngine, QueryError
 from .history import (
+    HistoryRollup,
+    LatencySketch,
     QueryHistoryEntry,
     QueryHistoryFilter,
+    QueryHistoryPage,
     QueryHistoryStore,
     QueryHistorySummary,
     InMemoryQueryHistoryStore,
+    append_entries,
+    decode_history_cursor,
+    encode_history_cursor,
+    page_history,
     serialize_history_entry,
     summarise_history,
+    table_lookup_keys,
 )
-from .models import QueryRequest, QueryResult, QueryResultColumn, QueryStatistics
+from .history_firestore import FirestoreQueryHistoryStore
+from .history_iceberg import IcebergQueryHistoryStore
+from .history_rollup import RollupQueryHistoryStore, daily_rollups, summarise_range, summarise_search
+from .history_sqlite import SQLiteQueryHistoryStore
+from .history_writer import BufferedHistoryWriter, HistoryWriterStats
+from .jobs import QueryJobInfo, QueryJobManager, QueryResultPage
+from .models import QueryRequest, QueryResult, QueryResultColumn, QueryResultStream, QueryStatistics
+from .planning import IcebergScanPlanner, ScanEstimate, catalog_table_loader
+from .scheduler import AdmissionTicket, FairShareScheduler, SchedulerStats
 from .service import QueryService
+from .sql import SqlAnalysis, analyze_sql, extract_tables
 
 __all__ = [
+    "AdmissionTicket",
+    "BILL_ALL",
+    "BILL_LEADER",
+    "BILL_SPLIT",
+    "BufferedHistoryWriter",
+    "DuckDBConnectionPool",
+    "DuckDBQueryEngine",
+    "FairShareScheduler",
+    "FirestoreQueryHistoryStore",
+    "HistoryRollup",
+    "HistoryWriterStats",
+    "IcebergQueryHistoryStore",
+    "IcebergScanPlanner",
+    "LatencySketch",
+    "QueryCoalescer",
     "QueryEngine",
     "QueryError",
     "QueryHistoryEntry",
     "QueryHistoryFilter",
+    "QueryHistoryPage",
     "QueryHistoryStore",
     "QueryHistorySummary",
+    "QueryJobInfo",
+    "QueryJobManager",
     "InMemoryQueryHistoryStore",
     "QueryRequest",
     "QueryResult",
+    "QueryResultCache",
     "QueryResultColumn",
+    "QueryResultPage",
+    "QueryResultStream",
     "QueryStatistics",
     "QueryService",
+    "ResultCacheKey",
+    "RollupQueryHistoryStore",
+    "ResultCacheStats",
+    "ScanEstimate",
+    "SQLiteQueryHistoryStore",
+    "SchedulerStats",
+    "SqlAnalysis",
+    "analyze_sql",
+    "append_entries",
+    "catalog_table_loader",
+    "daily_rollups",
+    "decode_history_cursor",
+    "encode_history_cursor",
+    "extract_tables",
+    "iceberg_catalog_snapshots",
+    "iceberg_table_locations",
+    "iceberg_warehouse_prefixes",
+    "page_history",
     "serialize_history_entry",
     "summarise_history",
+    "summarise_range",
+    "summarise_search",
+    "table_lookup_keys",
 ]
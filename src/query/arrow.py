@@ -0,0 +1,74 @@
+"""Apache Arrow IPC serialisation for query results."""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import itertools
+from typing import Any, Iterable, Iterator
+
+from .models import QueryResult
+
+ARROW_STREAM_MIME_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def arrow_available() -> bool:
+    """Return ``True`` when :mod:`pyarrow` can be imported."""
+
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # type: ignore
+    except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "The 'pyarrow' package is required for Arrow result streams. Install it via 'pip install pyarrow'."
+        ) from exc
+    return pyarrow
+
+
+def result_to_record_batches(result: QueryResult) -> tuple[Any, Iterable[Any]]:
+    """Return ``(schema, batches)`` for ``result``, converting row results if needed."""
+
+    pa = _require_pyarrow()
+    if result.batches is not None:
+        if result.arrow_schema is not None:
+            return result.arrow_schema, result.batches
+        batches = iter(result.batches)
+        first = next(batches, None)
+        if first is None:
+            return pa.schema([]), ()
+        return first.schema, itertools.chain((first,), batches)
+
+    names = [column.name for column in result.columns]
+    rows = list(result.iter_rows())
+    if rows:
+        arrays = [pa.array(values) for values in zip(*rows)]
+    else:
+        arrays = [pa.array([], type=pa.null()) for _ in names]
+    batch = pa.RecordBatch.from_arrays(arrays, names=names)
+    return batch.schema, (batch,)
+
+
+def iter_arrow_ipc_stream(result: QueryResult) -> Iterator[bytes]:
+    """Yield ``result`` encoded as an Arrow IPC stream, one chunk per record batch."""
+
+    pa = _require_pyarrow()
+    schema, batches = result_to_record_batches(result)
+    sink = io.BytesIO()
+
+    def _drain() -> bytes:
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield _drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield _drain()
+    tail = _drain()
+    if tail:
+        yield tail
@@ -0,0 +1,225 @@
+"""Snapshot-aware in-process cache for query results."""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Mapping, Sequence, Set
+
+from .models import QueryResult
+
+SnapshotResolver = Callable[[str, Sequence[str]], Mapping[str, str]]
+"""Callable returning the current snapshot id of each table read by a client."""
+
+
+@dataclass(frozen=True)
+class ResultCacheKey:
+    """Identity of a cacheable query execution."""
+
+    client_id: str
+    statement: str
+    limit: int | None
+    snapshot_id: str | None
+    as_of_timestamp: datetime | None
+    result_format: str
+    parameters: tuple[Any, ...] | None = None
+
+
+@dataclass(frozen=True)
+class ResultCacheStats:
+    """Counters describing cache effectiveness."""
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+
+
+@dataclass(frozen=True)
+class _CacheEntry:
+    result: QueryResult
+    snapshots: Mapping[str, str]
+    tables: Sequence[str]
+    size_bytes: int
+    expires_at: float
+
+
+class QueryResultCache:
+    """LRU cache of query results bounded by an approximate memory budget.
+
+    Entries remember the snapshot of every table they read. A lookup made with a
+    different snapshot map drops the entry, so results are invalidated as soon as
+    any of their tables receives a new snapshot. Every entry also expires
+    ``ttl_s`` seconds after it was stored, which bounds how stale a result can
+    get when a snapshot change is missed.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: int | None = None,
+        ttl_s: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        if ttl_s <= 0:
+            raise ValueError("ttl_s must be positive")
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self._ttl_s = ttl_s
+        self._clock = clock
+        self._entries: "OrderedDict[ResultCacheKey, _CacheEntry]" = OrderedDict()
+        self._by_table: Dict[tuple[str, str], Set[ResultCacheKey]] = {}
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: ResultCacheKey, snapshots: Mapping[str, str]) -> QueryResult | None:
+        """Return the cached result for ``key`` if it was produced from ``snapshots``."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at <= self._clock() or dict(entry.snapshots) != dict(snapshots):
+                self._remove(key)
+                self._invalidations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.result
+
+    def put(
+        self,
+        key: ResultCacheKey,
+        result: QueryResult,
+        *,
+        snapshots: Mapping[str, str],
+        tables: Sequence[str] = (),
+    ) -> bool:
+        """Store ``result``; returns ``False`` when it exceeds the per-entry budget."""
+
+        size = estimate_result_size(result, self._max_entry_bytes)
+        if size > self._max_entry_bytes:
+            return False
+        entry = _CacheEntry(
+            result=result,
+            snapshots=dict(snapshots),
+            tables=tuple(tables),
+            size_bytes=size,
+            expires_at=self._clock() + self._ttl_s,
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size_bytes += size
+            for table in entry.tables:
+                self._by_table.setdefault((key.client_id, table.lower()), set()).add(key)
+            while self._size_bytes > self._max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+        return True
+
+    def invalidate_table(self, client_id: str, table: str) -> int:
+        """Drop every entry of ``client_id`` that read ``table``; returns the count."""
+
+        with self._lock:
+            keys = self._by_table.pop((client_id, table.lower()), set())
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_client(self, client_id: str) -> int:
+        """Drop every entry belonging to ``client_id``; returns the count."""
+
+        with self._lock:
+            keys = [key for key in self._entries if key.client_id == client_id]
+            for key in keys:
+                self._remove(key)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> ResultCacheStats:
+        with self._lock:
+            return ResultCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                invalidations=self._invalidations,
+                entries=len(self._entries),
+                size_bytes=self._size_bytes,
+            )
+
+    def _remove(self, key: ResultCacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._size_bytes -= entry.size_bytes
+        for table in entry.tables:
+            keys = self._by_table.get((key.client_id, table.lower()))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key.client_id, table.lower())]
+
+
+def freeze_parameters(parameters: Sequence[Any] | Mapping[str, Any] | None) -> tuple[Any, ...] | None:
+    """Return a hashable form of bound query parameters for use in a cache key.
+
+    Raises :class:`TypeError` when a parameter value is not hashable.
+    """
+
+    if parameters is None:
+        return None
+    if isinstance(parameters, Mapping):
+        frozen: tuple[Any, ...] = ("named", tuple(sorted(parameters.items())))
+    else:
+        frozen = ("positional", tuple(parameters))
+    hash(frozen)
+    return frozen
+
+
+def estimate_result_size(result: QueryResult, limit: int | None = None) -> int:
+    """Approximate the memory held by ``result`` in bytes.
+
+    With ``limit``, counting stops as soon as the estimate exceeds it, so the
+    returned size is only exact up to the limit.
+    """
+
+    if result.batches is not None:
+        size = 0
+        for batch in result.batches:
+            size += int(getattr(batch, "nbytes", 0))
+            if limit is not None and size > limit:
+                break
+        return size
+    rows: Any = result.rows
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        if isinstance(row, (tuple, list)):
+            size += sum(sys.getsizeof(value) for value in row)
+        if limit is not None and size > limit:
+            break
+    return size
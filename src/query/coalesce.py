@@ -0,0 +1,148 @@
+"""Single-flight coalescing of identical concurrent queries."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import replace
+from typing import Any, Dict, Hashable, List
+
+from .engine import QueryError
+from .models import QueryResult, QueryStatistics
+
+BILL_LEADER = "leader"
+"""Only the query that ran on the engine is billed; followers are free."""
+
+BILL_SPLIT = "split"
+"""Scanned data is divided evenly between every participant."""
+
+BILL_ALL = "all"
+"""Every participant is billed as if it had run the query itself."""
+
+_BILLING_POLICIES = frozenset({BILL_LEADER, BILL_SPLIT, BILL_ALL})
+
+
+class FlightAbandoned(Exception):
+    """The leader was cancelled or timed out; followers run the query again instead of sharing that error."""
+
+
+class InFlightQuery:
+    """A query running on the engine on behalf of one or more identical requests."""
+
+    def __init__(self, leader_query_id: str) -> None:
+        self.leader_query_id = leader_query_id
+        self.participants = 1
+        self.entitlements: Any = None
+        self._sealed = False
+        self._done = threading.Event()
+        self._waiters: List[threading.Event] = []
+        self._lock = threading.Lock()
+        self._result: QueryResult | None = None
+        self._error: BaseException | None = None
+        self._abandoned = False
+
+    @property
+    def sealed(self) -> bool:
+        return self._sealed
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout_s: float | None = None, *, interrupted: threading.Event | None = None) -> QueryResult:
+        """Block until the leader finishes and return its result or raise its error.
+
+        Setting ``interrupted`` (when the waiting query is cancelled) ends the wait
+        early with a ``query_cancelled`` error. Raises :class:`FlightAbandoned` when
+        the leader itself was interrupted.
+        """
+
+        if interrupted is None:
+            self._done.wait(timeout_s)
+        else:
+            with self._lock:
+                if not self._done.is_set():
+                    self._waiters.append(interrupted)
+            interrupted.wait(timeout_s)
+        if not self._done.is_set():
+            if interrupted is not None and interrupted.is_set():
+                raise QueryError("query_cancelled", "Query was cancelled")
+            raise QueryError("query_timeout", "Query exceeded its time limit")
+        if self._abandoned:
+            raise FlightAbandoned(self.leader_query_id)
+        if self._error is not None:
+            raise self._error
+        assert self._result is not None
+        return self._result
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._done.set()
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.set()
+
+
+class QueryCoalescer:
+    """Track in-flight queries so identical concurrent requests run on the engine once.
+
+    The first request for a key becomes the leader and executes normally; requests
+    with the same key that arrive before the leader records its usage wait for its
+    result instead of taking their own concurrency slot and scan.
+    """
+
+    def __init__(self, *, billing: str = BILL_LEADER) -> None:
+        if billing not in _BILLING_POLICIES:
+            raise ValueError(f"Unknown billing policy {billing!r}")
+        self._billing = billing
+        self._flights: Dict[Hashable, InFlightQuery] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def billing(self) -> str:
+        return self._billing
+
+    def join(self, key: Hashable, query_id: str) -> tuple[InFlightQuery, bool]:
+        """Return the flight for ``key`` and whether the caller is its leader."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.participants += 1
+                return flight, False
+            flight = InFlightQuery(query_id)
+            self._flights[key] = flight
+            return flight, True
+
+    def seal(self, key: Hashable, flight: InFlightQuery, *, entitlements: Any = None) -> int:
+        """Stop ``flight`` accepting followers and return its final participant count."""
+
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight._sealed = True
+            flight.entitlements = entitlements
+            return flight.participants
+
+    def resolve(self, key: Hashable, flight: InFlightQuery, result: QueryResult) -> None:
+        self.seal(key, flight, entitlements=flight.entitlements)
+        flight._result = result
+        flight._finish()
+
+    def reject(self, key: Hashable, flight: InFlightQuery, error: BaseException, *, abandoned: bool = False) -> None:
+        """Fail ``flight`` with ``error``, or with ``abandoned`` make its followers run the query again."""
+
+        self.seal(key, flight, entitlements=flight.entitlements)
+        flight._error = error
+        flight._abandoned = abandoned
+        flight._finish()
+
+    def billed_stats(self, stats: QueryStatistics | None, participants: int, *, leader: bool) -> QueryStatistics | None:
+        """Return the statistics a participant is billed for, or ``None`` when it is free."""
+
+        if stats is None or self._billing == BILL_ALL:
+            return stats
+        if self._billing == BILL_LEADER:
+            return stats if leader else None
+        if stats.data_scanned_mb is None or participants <= 1:
+            return stats
+        return replace(stats, data_scanned_mb=stats.data_scanned_mb / participants)
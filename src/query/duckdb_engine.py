@@ -0,0 +1,777 @@
+"""DuckDB implementation of the :class:`query.engine.QueryEngine` protocol."""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Generator, Iterator, Mapping, Sequence, TYPE_CHECKING
+
+from iceberg.bootstrap import IcebergCatalogBootstrapper
+from iceberg.config import IcebergCatalogConfig
+from iceberg.tables import DEFAULT_TABLES, IcebergTableSpec
+
+from .engine import QueryEngine, QueryError
+from .models import (
+    RESULT_FORMAT_ARROW,
+    QueryRequest,
+    QueryResult,
+    QueryResultColumn,
+    QueryResultStream,
+    QueryStatistics,
+)
+from .sql import analyze_sql, leading_keyword, tokenize
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    import duckdb
+
+LOGGER = logging.getLogger(__name__)
+
+TableResolver = Callable[[str], Mapping[str, str]]
+"""Callable returning ``{view name: table location}`` for a client identifier."""
+
+PathResolver = Callable[[str], Sequence[str]]
+"""Callable returning the storage prefixes a client's statements may read from."""
+
+SnapshotReader = Callable[[str, str, "datetime | None"], "tuple[str, datetime | None] | None"]
+"""Callable returning ``(snapshot id, committed at)`` of a client's table, optionally as of a time."""
+
+_BYTES_PER_MB = 1024 * 1024
+_PROFILING_METRICS = {
+    "TOTAL_BYTES_READ": "true",
+    "CUMULATIVE_ROWS_SCANNED": "true",
+    "LATENCY": "true",
+}
+_INVALID_SQL_ERRORS = ("ParserException", "BinderException", "CatalogException", "SyntaxException")
+_PREPARABLE_KEYWORDS = frozenset({"select", "with", "from", "values", "table"})
+_PARAMETER_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Statements that touch files, extensions or session state outside the client's tables.
+_DENIED_KEYWORDS = frozenset(
+    {"copy", "attach", "detach", "install", "load", "set", "reset", "pragma", "export", "import", "use", "call"}
+)
+
+
+def iceberg_table_locations(
+    config: IcebergCatalogConfig,
+    tables: Sequence[IcebergTableSpec] | None = None,
+) -> TableResolver:
+    """Return a :data:`TableResolver` exposing ``tables`` under their spec names."""
+
+    specs = tuple(tables or DEFAULT_TABLES)
+
+    def _resolve(client_id: str) -> Mapping[str, str]:
+        return {spec.name: spec.location(config, client_id) for spec in specs}
+
+    return _resolve
+
+
+def iceberg_catalog_snapshots(
+    bootstrapper: IcebergCatalogBootstrapper,
+    config: IcebergCatalogConfig,
+    tables: Sequence[IcebergTableSpec] | None = None,
+) -> SnapshotReader:
+    """Return a :data:`SnapshotReader` reading snapshots from the client's catalog metadata."""
+
+    specs = {spec.name: spec for spec in tables or DEFAULT_TABLES}
+
+    def _read(client_id: str, name: str, as_of: datetime | None) -> tuple[str, datetime | None] | None:
+        spec = specs.get(name)
+        table = bootstrapper.load_table(client_id, config, spec) if spec is not None else None
+        if table is None:
+            return None
+        if as_of is None:
+            snapshot = table.current_snapshot()
+        else:
+            as_of_ms = int(_naive_utc(as_of).replace(tzinfo=timezone.utc).timestamp() * 1000)
+            snapshot = table.snapshot_as_of_timestamp(as_of_ms)
+        if snapshot is None:
+            return None
+        return str(snapshot.snapshot_id), datetime.fromtimestamp(snapshot.timestamp_ms / 1000, tz=timezone.utc)
+
+    return _read
+
+
+def iceberg_warehouse_prefixes(config: IcebergCatalogConfig) -> PathResolver:
+    """Return a :data:`PathResolver` limiting each client to its own warehouse and metadata prefixes."""
+
+    def _resolve(client_id: str) -> Sequence[str]:
+        uris = (config.warehouse_uri(client_id), config.metadata_uri(client_id))
+        return [uri.rstrip("/") + "/" for uri in uris if uri]
+
+    return _resolve
+
+
+@dataclass
+class PooledConnection:
+    """A warm DuckDB connection bound to a single client for its whole life."""
+
+    connection: "duckdb.DuckDBPyConnection"
+    client_id: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    binding: tuple[str | None, datetime | None] | None = None
+    views: dict[str, str] = field(default_factory=dict)
+    resolved_at: float | None = None
+    locked: bool = False
+    prepared: "OrderedDict[str, str]" = field(default_factory=OrderedDict)
+    prepared_serial: int = 0
+
+
+class DuckDBConnectionPool:
+    """Bounded, per-process pool of warm DuckDB connections.
+
+    Connections never move between clients: views and any session state created by
+    a tenant stay private to that tenant. When the pool is full, the least recently
+    used idle connection belonging to another client is closed to make room.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = 4,
+        database: str = ":memory:",
+        config: Mapping[str, Any] | None = None,
+        extensions: Sequence[str] = ("httpfs", "iceberg"),
+        setup_statements: Sequence[str] = (),
+        acquire_timeout_s: float = 30.0,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        try:
+            import duckdb  # type: ignore
+        except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError(
+                "The 'duckdb' package is required to use DuckDBQueryEngine. Install it via 'pip install duckdb'."
+            ) from exc
+
+        self._duckdb = duckdb
+        self._max_size = max_size
+        self._database = database
+        self._config = dict(config or {})
+        self._extensions = tuple(extensions)
+        self._setup_statements = tuple(setup_statements)
+        self._acquire_timeout_s = acquire_timeout_s
+        self._condition = threading.Condition()
+        self._idle: list[PooledConnection] = []
+        self._total = 0
+        self._closed = False
+
+    @property
+    def duckdb(self) -> Any:
+        """The imported :mod:`duckdb` module, exposed for error handling."""
+
+        return self._duckdb
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        """Number of open connections, idle or in use."""
+
+        with self._condition:
+            return self._total
+
+    @property
+    def idle_count(self) -> int:
+        with self._condition:
+            return len(self._idle)
+
+    @contextmanager
+    def connection(self, client_id: str) -> Generator[PooledConnection, None, None]:
+        """Borrow a connection for ``client_id`` and return it to the pool afterwards."""
+
+        pooled = self.acquire(client_id)
+        discard = False
+        try:
+            yield pooled
+        except self._duckdb.FatalException:  # pragma: no cover - database invalidated
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def acquire(self, client_id: str) -> PooledConnection:
+        """Return an idle connection for ``client_id``, opening one if capacity allows."""
+
+        deadline = time.monotonic() + self._acquire_timeout_s
+        evicted: PooledConnection | None = None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise QueryError("engine_unavailable", "The DuckDB connection pool has been closed")
+                pooled = self._take_idle(client_id)
+                if pooled is not None:
+                    return pooled
+                if self._total < self._max_size:
+                    self._total += 1
+                    break
+                if self._idle:
+                    # Recycle the least recently used connection of another client.
+                    evicted = self._idle.pop(0)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueryError(
+                        "engine_busy",
+                        f"No DuckDB connection became available within {self._acquire_timeout_s:.0f}s",
+                    )
+                self._condition.wait(remaining)
+
+        if evicted is not None:
+            LOGGER.debug("Evicting idle DuckDB connection of client %s", evicted.client_id)
+            self._close_quietly(evicted)
+        try:
+            return PooledConnection(connection=self._connect(), client_id=client_id)
+        except Exception:
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, pooled: PooledConnection, *, discard: bool = False) -> None:
+        """Return ``pooled`` to the idle set, or close it when ``discard`` is set."""
+
+        with self._condition:
+            if discard or self._closed:
+                self._total -= 1
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            self._condition.notify()
+        if discard or self._closed:
+            self._close_quietly(pooled)
+
+    def close(self) -> None:
+        """Close every idle connection and refuse further acquisitions."""
+
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    # Internal helpers -------------------------------------------------
+
+    def _take_idle(self, client_id: str) -> PooledConnection | None:
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index].client_id == client_id:
+                return self._idle.pop(index)
+        return None
+
+    def _connect(self) -> "duckdb.DuckDBPyConnection":
+        connection = self._duckdb.connect(self._database, config=dict(self._config))
+        try:
+            for extension in self._extensions:
+                try:
+                    connection.load_extension(extension)
+                except self._duckdb.Error:
+                    connection.install_extension(extension)
+                    connection.load_extension(extension)
+            connection.execute("SET enable_profiling = 'no_output'")
+            connection.execute("SET custom_profiling_settings = ?", [json.dumps(_PROFILING_METRICS)])
+            for statement in self._setup_statements:
+                connection.execute(statement)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def _close_quietly(pooled: PooledConnection) -> None:
+        try:
+            pooled.connection.close()
+        except Exception:  # pragma: no cover - best effort cleanup
+            LOGGER.debug("Failed to close DuckDB connection", exc_info=True)
+
+
+class DuckDBQueryEngine(QueryEngine):
+    """Execute queries on pooled DuckDB connections with the client's tables attached.
+
+    Each client's tables are exposed as views over ``scan_function`` (``iceberg_scan``
+    by default). Views are rebuilt when a request pins a different snapshot or
+    point in time, and table locations are resolved again once they are older
+    than ``table_refresh_s`` so tables created later become visible.
+
+    Before a connection runs any client SQL it is locked down: external access is
+    limited to the prefixes returned by ``allowed_prefixes`` (by default the
+    directories holding the client's table locations) and the configuration is
+    locked. Multiple statements and statements such as ``COPY``, ``ATTACH`` or
+    ``SET`` are rejected.
+
+    Parameterised requests are prepared once per connection and re-run with
+    ``EXECUTE``; the ``prepared_cache_size`` most recently used statements are kept
+    per connection.
+
+    Snapshot ids of the tables a statement references come from ``snapshot_reader``
+    (see :func:`iceberg_catalog_snapshots`) when it is set; otherwise queries read
+    them through ``iceberg_snapshots`` on their own connection and
+    :meth:`current_snapshots` reports none.
+    """
+
+    def __init__(
+        self,
+        *,
+        table_resolver: TableResolver | None = None,
+        pool: DuckDBConnectionPool | None = None,
+        pool_size: int = 4,
+        scan_function: str = "iceberg_scan",
+        arrow_batch_size: int = 122_880,
+        stream_chunk_rows: int = 10_000,
+        prepared_cache_size: int = 64,
+        table_refresh_s: float = 60.0,
+        allowed_prefixes: PathResolver | None = None,
+        snapshot_reader: SnapshotReader | None = None,
+    ) -> None:
+        self._table_resolver = table_resolver
+        self._snapshot_reader = snapshot_reader
+        self._table_refresh_s = table_refresh_s
+        self._allowed_prefixes = allowed_prefixes
+        self._pool = pool or DuckDBConnectionPool(max_size=pool_size)
+        self._scan_function = scan_function
+        self._arrow_batch_size = arrow_batch_size
+        self._stream_chunk_rows = stream_chunk_rows
+        self._prepared_cache_size = prepared_cache_size
+        self._active: dict[str, PooledConnection] = {}
+        self._cancelled: set[str] = set()
+        self._active_lock = threading.Lock()
+
+    @property
+    def pool(self) -> DuckDBConnectionPool:
+        return self._pool
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def cancel(self, query_id: str) -> bool:
+        """Interrupt the statement running for ``query_id`` on its connection."""
+
+        with self._active_lock:
+            pooled = self._active.get(query_id)
+            if pooled is None:
+                return False
+            self._cancelled.add(query_id)
+        pooled.connection.interrupt()
+        # DuckDB clears a pending interrupt when a statement starts, so a cancel that
+        # lands between the last cancellation check and the start is re-sent.
+        threading.Thread(target=self._reinterrupt, args=(query_id, pooled), daemon=True).start()
+        return True
+
+    def current_snapshots(self, client_id: str, tables: Sequence[str]) -> Mapping[str, str]:
+        """Return the latest snapshot id of each attached table referenced by ``tables``.
+
+        Suitable as the ``snapshot_resolver`` of :class:`~query.service.QueryService`.
+        Snapshots are read from the catalog, so no pooled connection is taken.
+        """
+
+        reader = self._snapshot_reader
+        if self._scan_function != "iceberg_scan" or self._table_resolver is None or reader is None:
+            return {}
+        snapshots: dict[str, str] = {}
+        for name in _referenced_views(self._table_resolver(client_id), tables):
+            resolved = reader(client_id, name, None)
+            if resolved is not None:
+                snapshots[name] = resolved[0]
+        return snapshots
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        self._check_statement(request.sql)
+        pooled = self._pool.acquire(request.client_id)
+        query_id = request.query_id
+        if query_id is not None:
+            with self._active_lock:
+                self._active[query_id] = pooled
+        try:
+            self._bind_tables(pooled, request)
+            # Metadata lookups run first: executing them later would invalidate the
+            # pending result and the profile of the main statement.
+            snapshot = self._resolve_snapshot(pooled, request)
+            started = time.perf_counter()
+            self._raise_if_cancelled(query_id)
+            try:
+                cursor = self._run_statement(
+                    pooled, self._apply_limit(request.sql, request.limit), request.parameters
+                )
+            except self._pool.duckdb.Error as exc:
+                raise self._translate_error(exc) from exc
+            columns = tuple(
+                QueryResultColumn(name=column[0], type=str(column[1]) if column[1] is not None else None)
+                for column in cursor.description or ()
+            )
+            arrow = cursor.description is not None and request.result_format == RESULT_FORMAT_ARROW
+            reader = None
+            if arrow:
+                to_reader = getattr(cursor, "to_arrow_reader", None) or cursor.fetch_record_batch
+                reader = to_reader(self._arrow_batch_size)
+            chunks = self._iter_chunks(cursor, reader)
+        except self._pool.duckdb.Error as exc:
+            # A re-sent interrupt can land in the metadata lookups that precede the statement.
+            cancelled = self._is_cancelled(query_id)
+            self._release(query_id, pooled)
+            if cancelled:
+                raise QueryError("query_cancelled", "Query was cancelled", details=str(exc)) from exc
+            raise
+        except BaseException:
+            self._release(query_id, pooled)
+            raise
+
+        if request.stream:
+            outcome: dict[str, Any] = {}
+
+            def _chunks() -> Iterator[Any]:
+                yield from chunks
+                outcome.update(self._finish(pooled, started))
+
+            def _close(_stream: QueryResultStream, _error: BaseException | None) -> None:
+                try:
+                    if not outcome:
+                        # Closed early: the profile of an unfinished statement does not
+                        # report what was read, so the scan is left unknown.
+                        outcome.update(self._finish(pooled, started, complete=False))
+                finally:
+                    self._release(query_id, pooled)
+
+            stream = QueryResultStream(
+                _chunks(),
+                stats=lambda: self._build_stats(outcome, stream.row_count, snapshot) if outcome else None,
+            )
+            stream.add_close_callback(_close)
+            return QueryResult(
+                statement=request.sql,
+                columns=columns,
+                rows=() if arrow else stream,
+                batches=stream if arrow else None,
+                arrow_schema=reader.schema if reader is not None else None,
+            )
+
+        try:
+            materialised = list(chunks)
+            outcome = self._finish(pooled, started)
+        finally:
+            self._release(query_id, pooled)
+        if arrow:
+            row_count = sum(batch.num_rows for batch in materialised)
+            rows: list[Any] = []
+            batches: list[Any] | None = materialised
+        else:
+            rows = [row for chunk in materialised for row in chunk]
+            row_count = len(rows)
+            batches = None
+        return QueryResult(
+            statement=request.sql,
+            columns=columns,
+            rows=rows,
+            stats=self._build_stats(outcome, row_count, snapshot),
+            batches=batches,
+            arrow_schema=reader.schema if reader is not None else None,
+        )
+
+    # Internal helpers -------------------------------------------------
+
+    def _reinterrupt(self, query_id: str, pooled: PooledConnection, interval_s: float = 0.05) -> None:
+        while True:
+            time.sleep(interval_s)
+            with self._active_lock:
+                if self._active.get(query_id) is not pooled or query_id not in self._cancelled:
+                    return
+            pooled.connection.interrupt()
+
+    def _is_cancelled(self, query_id: str | None) -> bool:
+        with self._active_lock:
+            return query_id is not None and query_id in self._cancelled
+
+    def _raise_if_cancelled(self, query_id: str | None) -> None:
+        if self._is_cancelled(query_id):
+            raise QueryError("query_cancelled", "Query was cancelled")
+
+    def _release(self, query_id: str | None, pooled: PooledConnection) -> None:
+        interrupted = False
+        if query_id is not None:
+            with self._active_lock:
+                self._active.pop(query_id, None)
+                interrupted = query_id in self._cancelled
+                self._cancelled.discard(query_id)
+        # An interrupted connection may still carry the aborted statement's state.
+        self._pool.release(pooled, discard=interrupted)
+
+    def _run_statement(self, pooled: PooledConnection, statement: str, parameters: Any) -> Any:
+        if not parameters:
+            return pooled.connection.execute(statement)
+        arguments = _render_arguments(parameters)
+        if arguments is None or self._prepared_cache_size <= 0 or leading_keyword(statement) not in _PREPARABLE_KEYWORDS:
+            return pooled.connection.execute(statement, parameters)
+        name = self._prepare(pooled, statement)
+        return pooled.connection.execute(f"EXECUTE {name}({arguments})")
+
+    def _prepare(self, pooled: PooledConnection, statement: str) -> str:
+        name = pooled.prepared.get(statement)
+        if name is not None:
+            pooled.prepared.move_to_end(statement)
+            return name
+        pooled.prepared_serial += 1
+        name = f"_prepared_{pooled.prepared_serial}"
+        pooled.connection.execute(f"PREPARE {name} AS {statement}")
+        pooled.prepared[statement] = name
+        while len(pooled.prepared) > self._prepared_cache_size:
+            _, evicted = pooled.prepared.popitem(last=False)
+            try:
+                pooled.connection.execute(f"DEALLOCATE {evicted}")
+            except self._pool.duckdb.Error:  # pragma: no cover - the plan is unreachable either way
+                LOGGER.debug("Failed to deallocate prepared statement %s", evicted, exc_info=True)
+        return name
+
+    def _iter_chunks(self, cursor: Any, reader: Any) -> Iterator[Any]:
+        if cursor.description is None:
+            return
+        try:
+            if reader is not None:
+                yield from reader
+                return
+            while True:
+                chunk = cursor.fetchmany(self._stream_chunk_rows)
+                if not chunk:
+                    return
+                yield chunk
+        except self._pool.duckdb.Error as exc:
+            raise self._translate_error(exc) from exc
+
+    def _finish(self, pooled: PooledConnection, started: float, *, complete: bool = True) -> dict[str, Any]:
+        return {
+            "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+            "profile": self._read_profile(pooled.connection) if complete else {},
+        }
+
+    @staticmethod
+    def _build_stats(
+        outcome: Mapping[str, Any],
+        row_count: int,
+        snapshot: tuple[str | None, datetime | None, dict[str, str]],
+    ) -> QueryStatistics:
+        profile = outcome["profile"]
+        snapshot_id, snapshot_timestamp, snapshots = snapshot
+        bytes_read = profile.get("total_bytes_read")
+        engine_details: dict[str, Any] = {"engine": "duckdb"}
+        if profile.get("cumulative_rows_scanned") is not None:
+            engine_details["rows_scanned"] = profile["cumulative_rows_scanned"]
+        if bytes_read is not None:
+            engine_details["bytes_scanned"] = bytes_read
+        if snapshots:
+            engine_details["snapshots"] = snapshots
+        return QueryStatistics(
+            elapsed_ms=outcome["elapsed_ms"],
+            data_scanned_mb=float(bytes_read) / _BYTES_PER_MB if bytes_read is not None else None,
+            row_count=row_count,
+            snapshot_id=snapshot_id,
+            snapshot_timestamp=snapshot_timestamp,
+            engine_details=engine_details,
+        )
+
+    @staticmethod
+    def _check_statement(sql: str) -> None:
+        tokens = tokenize(sql)
+        while tokens and tokens[-1].text == ";":
+            tokens.pop()
+        if any(token.text == ";" for token in tokens):
+            raise QueryError("statement_not_allowed", "Only a single SQL statement can be executed per query")
+        keyword = leading_keyword(sql)
+        if keyword in _DENIED_KEYWORDS:
+            raise QueryError("statement_not_allowed", f"{keyword.upper()} statements are not allowed")
+
+    def _bind_tables(self, pooled: PooledConnection, request: QueryRequest) -> None:
+        now = time.monotonic()
+        stale = pooled.resolved_at is None or now - pooled.resolved_at >= self._table_refresh_s
+        locations = pooled.views
+        if self._table_resolver is not None and stale:
+            locations = dict(self._table_resolver(request.client_id))
+            pooled.resolved_at = now
+        if not pooled.locked:
+            self._lock_down(pooled, request.client_id, locations)
+        binding = (request.snapshot_id, request.as_of_timestamp)
+        if self._table_resolver is None or (pooled.binding == binding and locations == pooled.views):
+            return
+        connection = pooled.connection
+        for name in pooled.views.keys() - locations.keys():
+            connection.execute(f"DROP VIEW IF EXISTS {_view_target(name)}")
+        for name, location in locations.items():
+            schema, _, _ = name.rpartition(".")
+            if schema:
+                connection.execute(f"CREATE SCHEMA IF NOT EXISTS {_quote_identifier(schema)}")
+            target = _view_target(name)
+            connection.execute(f"CREATE OR REPLACE VIEW {target} AS SELECT * FROM {self._scan_sql(location, request)}")
+        pooled.views = locations
+        pooled.binding = binding
+
+    def _lock_down(self, pooled: PooledConnection, client_id: str, locations: Mapping[str, str]) -> None:
+        if self._allowed_prefixes is not None:
+            prefixes = list(self._allowed_prefixes(client_id))
+        else:
+            prefixes = sorted({location.rstrip("/").rpartition("/")[0] + "/" for location in locations.values()})
+        connection = pooled.connection
+        connection.execute("SET allowed_directories = ?", [prefixes])
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+        pooled.locked = True
+
+    def _scan_sql(self, location: str, request: QueryRequest) -> str:
+        arguments = [_quote_literal(location)]
+        if self._scan_function == "iceberg_scan":
+            if request.snapshot_id:
+                arguments.append(f"snapshot_from_id = {int(request.snapshot_id)}")
+            elif request.as_of_timestamp:
+                as_of = _naive_utc(request.as_of_timestamp).isoformat()
+                arguments.append(f"snapshot_from_timestamp = {_quote_literal(as_of)}::TIMESTAMP")
+        return f"{self._scan_function}({', '.join(arguments)})"
+
+    def _resolve_snapshot(
+        self,
+        pooled: PooledConnection,
+        request: QueryRequest,
+    ) -> tuple[str | None, datetime | None, dict[str, str]]:
+        if request.snapshot_id:
+            return request.snapshot_id, None, {}
+        if self._scan_function != "iceberg_scan" or not pooled.views:
+            return None, None, {}
+
+        snapshots: dict[str, str] = {}
+        latest: tuple[str, datetime] | None = None
+        for name in _referenced_views(pooled.views, analyze_sql(request.sql).tables):
+            if self._snapshot_reader is not None:
+                resolved = self._snapshot_reader(request.client_id, name, request.as_of_timestamp)
+            else:
+                resolved = self._latest_snapshot(pooled, pooled.views[name], request.as_of_timestamp)
+            if resolved is None:
+                continue
+            snapshot_id, timestamp = resolved
+            snapshots[name] = snapshot_id
+            if latest is None or (isinstance(timestamp, datetime) and timestamp > latest[1]):
+                latest = (snapshot_id, timestamp)
+        if latest is None:
+            return None, None, snapshots
+        return latest[0], latest[1], snapshots
+
+    def _latest_snapshot(
+        self,
+        pooled: PooledConnection,
+        location: str,
+        as_of: datetime | None = None,
+    ) -> tuple[str, datetime | None] | None:
+        try:
+            row = pooled.connection.execute(
+                "SELECT snapshot_id, timestamp_ms FROM iceberg_snapshots(?)"
+                + (" WHERE timestamp_ms <= ?" if as_of else "")
+                + " ORDER BY sequence_number DESC LIMIT 1",
+                [location, _naive_utc(as_of)] if as_of else [location],
+            ).fetchone()
+        except self._pool.duckdb.Error:  # pragma: no cover - metadata lookups are best effort
+            LOGGER.debug("Unable to resolve snapshot for %s", location, exc_info=True)
+            return None
+        if row is None:
+            return None
+        timestamp = row[1]
+        if isinstance(timestamp, datetime) and timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return str(row[0]), timestamp
+
+    @staticmethod
+    def _apply_limit(sql: str, limit: int | None) -> str:
+        statement = sql.strip().rstrip(";").strip()
+        if limit is None:
+            return statement
+        if leading_keyword(statement) not in ("select", "with", "from", "values", "table"):
+            return statement
+        return f"SELECT * FROM ({statement}) AS _limited LIMIT {int(limit)}"
+
+    @staticmethod
+    def _read_profile(connection: "duckdb.DuckDBPyConnection") -> Mapping[str, Any]:
+        try:
+            return json.loads(connection.get_profiling_information())
+        except Exception:  # pragma: no cover - profiling is unavailable for some statements
+            return {}
+
+    @staticmethod
+    def _translate_error(exc: Exception) -> QueryError:
+        message = str(exc).split("\n", 1)[0]
+        if type(exc).__name__ == "InterruptException":
+            return QueryError("query_cancelled", "Query was cancelled", details=str(exc))
+        if type(exc).__name__ in _INVALID_SQL_ERRORS:
+            return QueryError("invalid_sql", message, details=str(exc))
+        return QueryError("execution_error", message, details=str(exc))
+
+
+def _referenced_views(views: Mapping[str, str], tables: Sequence[str]) -> list[str]:
+    """Names of ``views`` read by a statement referencing ``tables``, qualified or not."""
+
+    wanted = {table.lower() for table in tables}
+    return [
+        name
+        for name in views
+        if any(table == name.lower() or table.endswith("." + name.lower()) for table in wanted)
+    ]
+
+
+def _render_arguments(parameters: Any) -> str | None:
+    """Render ``parameters`` as an ``EXECUTE`` argument list, or ``None`` if unsupported."""
+
+    if isinstance(parameters, Mapping):
+        rendered = []
+        for name, value in parameters.items():
+            literal = _sql_literal(value)
+            if literal is None or not isinstance(name, str) or not _PARAMETER_NAME.match(name):
+                return None
+            rendered.append(f"{name} := {literal}")
+        return ", ".join(rendered)
+    literals = [_sql_literal(value) for value in parameters]
+    if any(literal is None for literal in literals):
+        return None
+    return ", ".join(literals)  # type: ignore[arg-type]
+
+
+def _sql_literal(value: Any) -> str | None:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        text = repr(value) if math.isfinite(value) else str(value)
+        return f"CAST({_quote_literal(text)} AS DOUBLE)"
+    if isinstance(value, str):
+        return _quote_literal(value)
+    if isinstance(value, datetime):
+        kind = "TIMESTAMPTZ" if value.tzinfo is not None else "TIMESTAMP"
+        return f"{kind} {_quote_literal(value.isoformat(sep=' '))}"
+    if isinstance(value, date):
+        return f"DATE {_quote_literal(value.isoformat())}"
+    return None
+
+
+def _view_target(name: str) -> str:
+    schema, _, table = name.rpartition(".")
+    if not schema:
+        return _quote_identifier(table)
+    return f"{_quote_identifier(schema)}.{_quote_identifier(table)}"
+
+
+def _quote_identifier(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -24,3 +24,11 @@ class QueryEngine(Protocol):
     def execute(self, request: QueryRequest) -> QueryResult:
         """Execute ``request`` and return the materialised result set."""
 
+    def cancel(self, query_id: str) -> bool:
+        """Interrupt the execution registered under ``query_id``.
+
+        Returns ``False`` when no such execution is running. Engines that cannot
+        interrupt work may omit this method; cancellation then takes effect when
+        the engine call returns.
+        """
+
@@ -2,11 +2,21 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Iterable, List, Protocol, Sequence
+import base64
+import binascii
+import json
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Protocol, Sequence
 
-@dataclass(frozen=True)
+# Latencies at or below this many milliseconds are counted as zero.
+_MIN_SKETCH_VALUE = 1e-3
+
+
+@dataclass(frozen=True, slots=True)
 class QueryHistoryEntry:
     """Represents a single query execution or attempt."""
 
@@ -24,6 +34,7 @@ class QueryHistoryEntry:
     tables: Sequence[str] = ()
     snapshot_id: str | None = None
     as_of_timestamp: datetime | None = None
+    cache_hit: bool = False
 
 
 @dataclass(frozen=True)
@@ -37,6 +48,14 @@ class QueryHistoryFilter:
     limit: int | None = None
 
 
+@dataclass(frozen=True)
+class QueryHistoryPage:
+    """One page of history entries and the cursor of the page after it."""
+
+    entries: Sequence[QueryHistoryEntry]
+    next_cursor: str | None = None
+
+
 @dataclass(frozen=True)
 class QueryHistorySummary:
     """Aggregated statistics for a set of history entries."""
@@ -46,6 +65,131 @@ class QueryHistorySummary:
     total_cost_usd: float
     range_start: datetime | None
     range_end: datetime | None
+    total_scanned_mb: float = 0.0
+    p50_elapsed_ms: float | None = None
+    p95_elapsed_ms: float | None = None
+
+
+@dataclass(frozen=True)
+class LatencySketch:
+    """Mergeable latency histogram with logarithmic buckets.
+
+    Quantiles are estimated within ``relative_accuracy`` of the true value, the
+    bucket count grows with the logarithm of the latency range rather than with
+    the number of samples, and two sketches merge by adding bucket counts.
+    """
+
+    buckets: Mapping[int, int] = field(default_factory=dict)
+    zero_count: int = 0
+    relative_accuracy: float = 0.02
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, *values: float) -> "LatencySketch":
+        buckets = dict(self.buckets)
+        zero_count = self.zero_count
+        log_gamma = math.log(self._gamma)
+        for value in values:
+            if value <= _MIN_SKETCH_VALUE:
+                zero_count += 1
+                continue
+            index = math.ceil(math.log(value) / log_gamma)
+            buckets[index] = buckets.get(index, 0) + 1
+        return replace(self, buckets=buckets, zero_count=zero_count)
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        buckets = dict(self.buckets)
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        return replace(self, buckets=buckets, zero_count=self.zero_count + other.zero_count)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate the nearest-rank ``q`` quantile, or ``None`` when empty."""
+
+        total = self.count
+        if total == 0:
+            return None
+        rank = max(math.ceil(q * total), 1)
+        seen = self.zero_count
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return 2 * self._gamma**index / (self._gamma + 1)
+        return None  # pragma: no cover - ranks never exceed the count
+
+    def to_document(self) -> dict[str, object]:
+        return {"buckets": {str(index): count for index, count in self.buckets.items()}, "zero_count": self.zero_count}
+
+    @classmethod
+    def from_document(cls, data: Mapping[str, Any] | None) -> "LatencySketch":
+        data = data or {}
+        buckets = {int(index): int(count) for index, count in (data.get("buckets") or {}).items() if count}
+        return cls(buckets=buckets, zero_count=int(data.get("zero_count", 0) or 0))
+
+    @property
+    def _gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+
+@dataclass(frozen=True)
+class HistoryRollup:
+    """Summary statistics of history entries that merge by addition.
+
+    Stores keep one rollup per client and UTC day so summaries over long ranges
+    merge a handful of records instead of scanning every entry.
+    """
+
+    total_queries: int = 0
+    failed_queries: int = 0
+    total_cost_usd: float = 0.0
+    total_scanned_mb: float = 0.0
+    first_submitted_at: datetime | None = None
+    last_submitted_at: datetime | None = None
+    latency: LatencySketch = field(default_factory=LatencySketch)
+
+    def __add__(self, other: "HistoryRollup") -> "HistoryRollup":
+        return HistoryRollup(
+            total_queries=self.total_queries + other.total_queries,
+            failed_queries=self.failed_queries + other.failed_queries,
+            total_cost_usd=self.total_cost_usd + other.total_cost_usd,
+            total_scanned_mb=self.total_scanned_mb + other.total_scanned_mb,
+            first_submitted_at=_earliest(self.first_submitted_at, other.first_submitted_at),
+            last_submitted_at=_latest(self.last_submitted_at, other.last_submitted_at),
+            latency=self.latency.merge(other.latency),
+        )
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[QueryHistoryEntry]) -> "HistoryRollup":
+        entries_list = list(entries)
+        if not entries_list:
+            return cls()
+        return cls(
+            total_queries=len(entries_list),
+            failed_queries=sum(1 for entry in entries_list if entry.status.upper() != "SUCCEEDED"),
+            total_cost_usd=sum(entry.cost_usd or 0.0 for entry in entries_list),
+            total_scanned_mb=sum(entry.data_scanned_mb or 0.0 for entry in entries_list),
+            first_submitted_at=min(entry.submitted_at for entry in entries_list),
+            last_submitted_at=max(entry.submitted_at for entry in entries_list),
+            latency=LatencySketch().add(*(entry.elapsed_ms for entry in entries_list if entry.elapsed_ms is not None)),
+        )
+
+    def summary(self) -> QueryHistorySummary:
+        return QueryHistorySummary(
+            total_queries=self.total_queries,
+            failed_queries=self.failed_queries,
+            total_cost_usd=self.total_cost_usd,
+            range_start=self.first_submitted_at,
+            range_end=self.last_submitted_at,
+            total_scanned_mb=self.total_scanned_mb,
+            p50_elapsed_ms=self.latency.quantile(0.5),
+            p95_elapsed_ms=self.latency.quantile(0.95),
+        )
 
 
 class QueryHistoryStore(Protocol):
@@ -54,58 +198,224 @@ class QueryHistoryStore(Protocol):
     def append(self, entry: QueryHistoryEntry) -> None:
         """Persist ``entry`` into the underlying storage."""
 
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        """Persist ``entries`` in as few backend writes as possible."""
+
     def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
         """Return entries matching ``query`` sorted by submission time descending."""
 
 
 class InMemoryQueryHistoryStore(QueryHistoryStore):
-    """Simple store used for testing that keeps entries in memory."""
+    """Store that keeps entries in memory, indexed for hot-tier lookups.
 
-    def __init__(self) -> None:
-        self._entries: List[QueryHistoryEntry] = []
+    Entries are kept per client in submission order, so ``start``/``end`` bounds
+    are bisected rather than scanned and results are read newest first until
+    ``limit`` is reached. Each client also keeps a time-ordered list per
+    :func:`table_lookup_keys` key, so ``table`` filters match a full or
+    unqualified name (``analytics.events`` or ``events``) like the persistent
+    stores do. When ``retention`` is set, entries
+    submitted that long before a client's newest entry are no longer returned
+    and are evicted in bulk as new entries arrive.
+    """
+
+    def __init__(self, *, retention: timedelta | None = None) -> None:
+        self._retention = retention
+        self._clients: Dict[str, _ClientHistory] = {}
+        self._lock = threading.Lock()
 
     def append(self, entry: QueryHistoryEntry) -> None:
-        self._entries.append(entry)
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        with self._lock:
+            touched: Dict[str, _ClientHistory] = {}
+            for entry in entries:
+                history = self._clients.get(entry.client_id)
+                if history is None:
+                    history = self._clients[entry.client_id] = _ClientHistory()
+                history.add(entry)
+                touched[entry.client_id] = history
+            if self._retention is not None:
+                for history in touched.values():
+                    history.evict_before(history.newest - self._retention)
 
     def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
-        results: List[QueryHistoryEntry] = []
-        table = query.table.lower() if query.table else None
-        for entry in self._entries:
-            if entry.client_id != query.client_id:
-                continue
-            if query.start and entry.submitted_at < query.start:
-                continue
-            if query.end and entry.submitted_at > query.end:
-                continue
-            if table and not any(t.lower() == table or table in t.lower() for t in entry.tables):
-                continue
-            results.append(entry)
-        results.sort(key=lambda entry: entry.submitted_at, reverse=True)
-        if query.limit is not None:
-            return results[: query.limit]
-        return results
+        if query.limit is not None and query.limit <= 0:
+            return []
+        with self._lock:
+            history = self._clients.get(query.client_id)
+            if history is None:
+                return []
+            start = query.start
+            if self._retention is not None:
+                cutoff = history.newest - self._retention
+                start = cutoff if start is None or start < cutoff else start
+            series = history.tables.get(query.table.lower()) if query.table else history.series
+            if series is None:
+                return []
+            results: List[QueryHistoryEntry] = []
+            for entry in series.newest_first(start, query.end):
+                results.append(entry)
+                if query.limit is not None and len(results) >= query.limit:
+                    break
+            return results
+
+
+class _Series:
+    """Entries ordered by ``submitted_at``, with their timestamps for bisecting."""
+
+    __slots__ = ("times", "entries")
+
+    def __init__(self) -> None:
+        self.times: List[datetime] = []
+        self.entries: List[QueryHistoryEntry] = []
+
+    def add(self, entry: QueryHistoryEntry) -> None:
+        if not self.times or entry.submitted_at >= self.times[-1]:
+            self.times.append(entry.submitted_at)
+            self.entries.append(entry)
+            return
+        index = bisect_right(self.times, entry.submitted_at)
+        self.times.insert(index, entry.submitted_at)
+        self.entries.insert(index, entry)
+
+    def evict_before(self, cutoff: datetime) -> None:
+        count = bisect_left(self.times, cutoff)
+        if count:
+            del self.times[:count]
+            del self.entries[:count]
+
+    def newest_first(self, start: datetime | None, end: datetime | None) -> Iterator[QueryHistoryEntry]:
+        low = bisect_left(self.times, start) if start is not None else 0
+        high = bisect_right(self.times, end) if end is not None else len(self.times)
+        for index in range(high - 1, low - 1, -1):
+            yield self.entries[index]
+
+
+class _ClientHistory:
+    __slots__ = ("series", "tables", "newest")
+
+    # Expired entries are dropped once they make up this share of the series, so
+    # eviction stays amortised O(1) per append instead of shifting the lists each time.
+    _EVICT_FRACTION = 8
+
+    def __init__(self) -> None:
+        self.series = _Series()
+        self.tables: Dict[str, _Series] = {}
+        self.newest: datetime | None = None
+
+    def add(self, entry: QueryHistoryEntry) -> None:
+        self.series.add(entry)
+        for table in table_lookup_keys(entry.tables):
+            series = self.tables.get(table)
+            if series is None:
+                series = self.tables[table] = _Series()
+            series.add(entry)
+        if self.newest is None or entry.submitted_at > self.newest:
+            self.newest = entry.submitted_at
+
+    def evict_before(self, cutoff: datetime) -> None:
+        expired = bisect_left(self.series.times, cutoff)
+        if expired * self._EVICT_FRACTION < len(self.series.times):
+            return
+        self.series.evict_before(cutoff)
+        for table, series in list(self.tables.items()):
+            series.evict_before(cutoff)
+            if not series.times:
+                del self.tables[table]
+
+
+def append_entries(store: QueryHistoryStore, entries: Sequence[QueryHistoryEntry]) -> None:
+    """Write ``entries`` through ``append_many``, or one by one for stores without it."""
+
+    append_many = getattr(store, "append_many", None)
+    if append_many is not None:
+        append_many(entries)
+        return
+    for entry in entries:
+        store.append(entry)
+
+
+def table_lookup_keys(tables: Sequence[str]) -> List[str]:
+    """Lowercased full and unqualified names under which indexed stores file ``tables``."""
+
+    keys: Dict[str, None] = {}
+    for table in tables:
+        lowered = table.lower()
+        keys[lowered] = None
+        keys[lowered.rsplit(".", 1)[-1]] = None
+    return list(keys)
+
+
+def encode_history_cursor(entry: QueryHistoryEntry) -> str:
+    """Return an opaque cursor positioned after ``entry``."""
+
+    payload = json.dumps([entry.submitted_at.isoformat(), entry.query_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    """Return the ``(submitted_at, query_id)`` position encoded in ``cursor``."""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        submitted_at, query_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        position = datetime.fromisoformat(submitted_at)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as exc:
+        raise ValueError("Invalid history cursor") from exc
+    # Entries carry aware timestamps; a naive position could not be compared with them.
+    if position.tzinfo is None:
+        raise ValueError("Invalid history cursor")
+    return position, str(query_id)
+
+
+def page_history(
+    store: QueryHistoryStore,
+    query: QueryHistoryFilter,
+    *,
+    page_size: int,
+    cursor: str | None = None,
+) -> QueryHistoryPage:
+    """Return the page of ``query`` results following ``cursor``.
+
+    Stores with a ``search_page`` method serve the page themselves; for others
+    the entries up to the cursor are searched and the page is cut from them.
+    Pages are ordered by submission time and then query id, both descending.
+    """
+
+    search_page = getattr(store, "search_page", None)
+    if search_page is not None:
+        return search_page(query, page_size=page_size, cursor=cursor)
+    position = decode_history_cursor(cursor) if cursor else None
+    if position is not None:
+        end = position[0] if query.end is None or position[0] < query.end else query.end
+        query = replace(query, end=end, limit=None)
+    else:
+        query = replace(query, limit=page_size + 1)
+    entries = sorted(store.search(query), key=lambda entry: (entry.submitted_at, entry.query_id), reverse=True)
+    if position is not None:
+        entries = [entry for entry in entries if (entry.submitted_at, entry.query_id) < position]
+    page = entries[:page_size]
+    next_cursor = encode_history_cursor(page[-1]) if len(entries) > page_size else None
+    return QueryHistoryPage(entries=page, next_cursor=next_cursor)
 
 
 def summarise_history(entries: Iterable[QueryHistoryEntry]) -> QueryHistorySummary:
     """Produce aggregated metrics for ``entries``."""
 
-    entries_list = list(entries)
-    if entries_list:
-        range_start = min(entry.submitted_at for entry in entries_list)
-        range_end = max(entry.submitted_at for entry in entries_list)
-    else:
-        range_start = None
-        range_end = None
+    return HistoryRollup.from_entries(entries).summary()
+
+
+def _earliest(first: datetime | None, second: datetime | None) -> datetime | None:
+    if first is None or second is None:
+        return first or second
+    return min(first, second)
+
 
-    total_cost = sum(entry.cost_usd or 0.0 for entry in entries_list)
-    failed = sum(1 for entry in entries_list if entry.status.upper() != "SUCCEEDED")
-    return QueryHistorySummary(
-        total_queries=len(entries_list),
-        failed_queries=failed,
-        total_cost_usd=total_cost,
-        range_start=range_start,
-        range_end=range_end,
-    )
+def _latest(first: datetime | None, second: datetime | None) -> datetime | None:
+    if first is None or second is None:
+        return first or second
+    return max(first, second)
 
 
 def serialize_history_entry(entry: QueryHistoryEntry) -> dict[str, object]:
@@ -133,5 +443,6 @@ def serialize_history_entry(entry: QueryHistoryEntry) -> dict[str, object]:
         "tables": list(entry.tables),
         "snapshotId": entry.snapshot_id,
         "asOfTimestamp": _iso(entry.as_of_timestamp),
+        "cacheHit": entry.cache_hit,
     }
 
@@ -0,0 +1,241 @@
+"""Query history persisted to Firestore with cursor pagination."""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Sequence
+
+from .history import (
+    HistoryRollup,
+    LatencySketch,
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    QueryHistoryPage,
+    QueryHistoryStore,
+    QueryHistorySummary,
+    decode_history_cursor,
+    encode_history_cursor,
+    table_lookup_keys,
+)
+from .history_rollup import daily_rollups, summarise_range
+
+if TYPE_CHECKING:  # pragma: no cover - imported for type checking only
+    from google.cloud import firestore
+
+LOGGER = logging.getLogger(__name__)
+
+_MAX_BATCH_WRITES = 500
+
+
+def _require_firestore():
+    try:
+        from google.cloud import firestore  # type: ignore
+    except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "The 'google-cloud-firestore' package is required for the Firestore history store. "
+            "Install it via 'pip install google-cloud-firestore'."
+        ) from exc
+    return firestore
+
+
+class FirestoreQueryHistoryStore(QueryHistoryStore):
+    """Keep history entries under ``clients/{client_id}/query_history/{query_id}``.
+
+    Searches are ordered ``submitted_at`` then document id, both descending,
+    so every page is a single indexed read bounded by the page size.
+    :meth:`search_page` resumes from an opaque cursor rather than an offset.
+    Table filters match a table's full or unqualified name
+    (``analytics.events`` or ``events``) through the ``table_keys`` array; they
+    need the composite index on ``table_keys`` (array-contains) and
+    ``submitted_at`` (descending) defined in ``firestore.indexes.json``.
+
+    Appends also increment a rollup document per client and UTC day under
+    ``query_history_rollups/{YYYY-MM-DD}`` in the same batch, which
+    :meth:`summarise` merges instead of reading entries. Each entry is
+    expected to be appended once.
+    """
+
+    def __init__(
+        self,
+        client: "firestore.Client | None" = None,
+        *,
+        collection: str = "clients",
+        subcollection: str = "query_history",
+        rollup_subcollection: str = "query_history_rollups",
+    ) -> None:
+        self._db = client or _require_firestore().Client()
+        self._collection = collection
+        self._subcollection = subcollection
+        self._rollup_subcollection = rollup_subcollection
+
+    def append(self, entry: QueryHistoryEntry) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        # Each entry may add a rollup write of its own, so chunks stay at half the batch limit.
+        chunk = _MAX_BATCH_WRITES // 2
+        for offset in range(0, len(entries), chunk):
+            batch = self._db.batch()
+            chunk_entries = entries[offset : offset + chunk]
+            for entry in chunk_entries:
+                batch.set(self._history(entry.client_id).document(entry.query_id), _entry_document(entry))
+            for (client_id, day), rollup in daily_rollups(chunk_entries).items():
+                ref = self._client(client_id).collection(self._rollup_subcollection).document(day.isoformat())
+                batch.set(ref, _rollup_increments(day, rollup), merge=True)
+            batch.commit()
+
+    def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
+        if query.limit is not None and query.limit <= 0:
+            return []
+        statement = self._query(query)
+        if query.limit is not None:
+            statement = statement.limit(query.limit)
+        return [_entry_from_document(query.client_id, snapshot.id, snapshot.to_dict()) for snapshot in statement.stream()]
+
+    def search_page(
+        self,
+        query: QueryHistoryFilter,
+        *,
+        page_size: int,
+        cursor: str | None = None,
+    ) -> QueryHistoryPage:
+        """Return up to ``page_size`` entries after ``cursor`` and the cursor that follows them."""
+
+        statement = self._query(query)
+        if cursor:
+            submitted_at, query_id = decode_history_cursor(cursor)
+            statement = statement.start_after(
+                {"submitted_at": submitted_at, "__name__": self._history(query.client_id).document(query_id)}
+            )
+        # One extra document tells whether another page exists.
+        snapshots = list(statement.limit(page_size + 1).stream())
+        entries = [
+            _entry_from_document(query.client_id, snapshot.id, snapshot.to_dict()) for snapshot in snapshots[:page_size]
+        ]
+        next_cursor = encode_history_cursor(entries[-1]) if len(snapshots) > page_size else None
+        return QueryHistoryPage(entries=entries, next_cursor=next_cursor)
+
+    def summarise(self, query: QueryHistoryFilter) -> QueryHistorySummary:
+        """Summarise the time range of ``query`` from daily rollups, ignoring ``limit``."""
+
+        return summarise_range(query, self._load_rollups, self.search)
+
+    # Internal helpers -------------------------------------------------
+
+    def _client(self, client_id: str) -> Any:
+        return self._db.collection(self._collection).document(client_id)
+
+    def _history(self, client_id: str) -> Any:
+        return self._client(client_id).collection(self._subcollection)
+
+    def _load_rollups(self, client_id: str, first: date | None, last: date | None) -> List[HistoryRollup]:
+        from google.cloud.firestore_v1.base_query import FieldFilter  # type: ignore
+
+        statement: Any = self._client(client_id).collection(self._rollup_subcollection)
+        if first is not None:
+            statement = statement.where(filter=FieldFilter("date", ">=", first.isoformat()))
+        if last is not None:
+            statement = statement.where(filter=FieldFilter("date", "<=", last.isoformat()))
+        return [_rollup_from_document(snapshot.to_dict()) for snapshot in statement.stream()]
+
+    def _query(self, query: QueryHistoryFilter) -> Any:
+        firestore = _require_firestore()
+        from google.cloud.firestore_v1.base_query import FieldFilter  # type: ignore
+
+        statement: Any = self._history(query.client_id)
+        if query.table:
+            statement = statement.where(filter=FieldFilter("table_keys", "array_contains", query.table.lower()))
+        if query.start is not None:
+            statement = statement.where(filter=FieldFilter("submitted_at", ">=", query.start))
+        if query.end is not None:
+            statement = statement.where(filter=FieldFilter("submitted_at", "<=", query.end))
+        return statement.order_by("submitted_at", direction=firestore.Query.DESCENDING).order_by(
+            "__name__", direction=firestore.Query.DESCENDING
+        )
+
+
+def _rollup_increments(day: date, rollup: HistoryRollup) -> Dict[str, Any]:
+    firestore = _require_firestore()
+    # Timestamps are kept as epoch microseconds: Minimum/Maximum only compare numbers.
+    return {
+        "date": day.isoformat(),
+        "total_queries": firestore.Increment(rollup.total_queries),
+        "failed_queries": firestore.Increment(rollup.failed_queries),
+        "total_cost_usd": firestore.Increment(rollup.total_cost_usd),
+        "total_scanned_mb": firestore.Increment(rollup.total_scanned_mb),
+        "first_submitted_us": firestore.Minimum(_epoch_us(rollup.first_submitted_at)),
+        "last_submitted_us": firestore.Maximum(_epoch_us(rollup.last_submitted_at)),
+        "latency": {
+            "buckets": {str(index): firestore.Increment(count) for index, count in rollup.latency.buckets.items()},
+            "zero_count": firestore.Increment(rollup.latency.zero_count),
+        },
+    }
+
+
+def _rollup_from_document(data: Mapping[str, Any] | None) -> HistoryRollup:
+    data = data or {}
+    return HistoryRollup(
+        total_queries=int(data.get("total_queries", 0) or 0),
+        failed_queries=int(data.get("failed_queries", 0) or 0),
+        total_cost_usd=float(data.get("total_cost_usd", 0.0) or 0.0),
+        total_scanned_mb=float(data.get("total_scanned_mb", 0.0) or 0.0),
+        first_submitted_at=_from_epoch_us(data.get("first_submitted_us")),
+        last_submitted_at=_from_epoch_us(data.get("last_submitted_us")),
+        latency=LatencySketch.from_document(data.get("latency")),
+    )
+
+
+def _epoch_us(value: datetime | None) -> int | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return round(value.timestamp() * 1_000_000)
+
+
+def _from_epoch_us(value: Any) -> datetime | None:  # noqa: ANN401
+    if value is None:
+        return None
+    return datetime.fromtimestamp(int(value) / 1_000_000, tz=timezone.utc)
+
+
+def _entry_document(entry: QueryHistoryEntry) -> Dict[str, Any]:
+    return {
+        "client_id": entry.client_id,
+        "statement": entry.statement,
+        "status": entry.status,
+        "submitted_at": entry.submitted_at,
+        "completed_at": entry.completed_at,
+        "elapsed_ms": entry.elapsed_ms,
+        "data_scanned_mb": entry.data_scanned_mb,
+        "row_count": entry.row_count,
+        "cost_usd": entry.cost_usd,
+        "error_message": entry.error_message,
+        "tables": list(entry.tables),
+        "table_keys": table_lookup_keys(entry.tables),
+        "snapshot_id": entry.snapshot_id,
+        "as_of_timestamp": entry.as_of_timestamp,
+        "cache_hit": entry.cache_hit,
+    }
+
+
+def _entry_from_document(client_id: str, query_id: str, data: Mapping[str, Any] | None) -> QueryHistoryEntry:
+    data = data or {}
+    return QueryHistoryEntry(
+        query_id=query_id,
+        client_id=client_id,
+        statement=data.get("statement", ""),
+        status=data.get("status", ""),
+        submitted_at=data["submitted_at"],
+        completed_at=data.get("completed_at"),
+        elapsed_ms=data.get("elapsed_ms"),
+        data_scanned_mb=data.get("data_scanned_mb"),
+        row_count=data.get("row_count"),
+        cost_usd=data.get("cost_usd"),
+        error_message=data.get("error_message"),
+        tables=tuple(data.get("tables") or ()),
+        snapshot_id=data.get("snapshot_id"),
+        as_of_timestamp=data.get("as_of_timestamp"),
+        cache_hit=bool(data.get("cache_hit", False)),
+    )
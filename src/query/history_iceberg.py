@@ -0,0 +1,240 @@
+"""Query history persisted to a per-client Iceberg table."""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+from iceberg.bootstrap import IcebergCatalogBootstrapper
+from iceberg.config import IcebergCatalogConfig
+from iceberg.tables import QUERY_HISTORY_TABLE, IcebergTableSpec
+
+from .history import QueryHistoryEntry, QueryHistoryFilter, QueryHistoryStore, table_lookup_keys
+
+if TYPE_CHECKING:  # pragma: no cover - imported for type checking only
+    from pyiceberg.table import Table
+
+LOGGER = logging.getLogger(__name__)
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # type: ignore
+        import pyarrow.compute  # type: ignore  # noqa: F401
+    except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "The 'pyarrow' package is required for the Iceberg history store. Install it via 'pip install pyarrow'."
+        ) from exc
+    return pyarrow
+
+
+class IcebergQueryHistoryStore(QueryHistoryStore):
+    """Append history entries to each client's ``query_history`` Iceberg table.
+
+    The table lives in the client's namespace, is created by the first append from
+    :data:`~iceberg.tables.QUERY_HISTORY_TABLE` and is partitioned by
+    ``day(submitted_at)``. Searches push the time range down as a row filter, so
+    partition and column-bound pruning skip files outside it. With a ``limit``
+    the matching days are read newest first and reading stops once enough rows
+    were found. Table filters are applied to the Arrow batches before any row
+    is converted.
+
+    Every :meth:`append_many` call commits one snapshot per client, so writes
+    should go through :class:`~query.history_writer.BufferedHistoryWriter`.
+    """
+
+    def __init__(
+        self,
+        config: IcebergCatalogConfig,
+        bootstrapper: IcebergCatalogBootstrapper | None = None,
+        *,
+        table: IcebergTableSpec = QUERY_HISTORY_TABLE,
+        commit_retries: int = 3,
+    ) -> None:
+        self._config = config
+        self._bootstrapper = bootstrapper or IcebergCatalogBootstrapper()
+        self._spec = table
+        self._commit_retries = commit_retries
+        self._tables: Dict[str, "Table"] = {}
+        self._lock = threading.Lock()
+
+    def append(self, entry: QueryHistoryEntry) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        by_client: Dict[str, List[QueryHistoryEntry]] = {}
+        for entry in entries:
+            by_client.setdefault(entry.client_id, []).append(entry)
+        for client_id, client_entries in by_client.items():
+            self._append(client_id, _to_arrow(client_entries))
+
+    def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
+        if query.limit is not None and query.limit <= 0:
+            return []
+        table = self._table(query.client_id, create=False)
+        if table is None:
+            return []  # reading history never creates the table
+        table.refresh()
+        start = _as_utc(query.start) if query.start else None
+        end = _as_utc(query.end) if query.end else None
+        needle = query.table.lower() if query.table else None
+        if query.limit is None:
+            return self._read(table, start, end, needle)
+        days = _partition_days(table, _time_filter(start, end))
+        if days is None:
+            return self._read(table, start, end, needle)[: query.limit]
+        results: List[QueryHistoryEntry] = []
+        for day in days:
+            day_start = datetime.combine(_EPOCH + timedelta(days=day), datetime.min.time(), tzinfo=timezone.utc)
+            day_end = day_start + timedelta(days=1, microseconds=-1)
+            low = max(start, day_start) if start else day_start
+            high = min(end, day_end) if end else day_end
+            results.extend(self._read(table, low, high, needle))
+            if len(results) >= query.limit:
+                break
+        return results[: query.limit]
+
+    # Internal helpers -------------------------------------------------
+
+    def _table(self, client_id: str, *, create: bool = True) -> "Table | None":
+        with self._lock:
+            table = self._tables.get(client_id)
+        if table is None:
+            if create:
+                table = self._bootstrapper.ensure_table(client_id, self._config, self._spec)
+            else:
+                table = self._bootstrapper.load_table(client_id, self._config, self._spec)
+                if table is None:
+                    return None
+            with self._lock:
+                table = self._tables.setdefault(client_id, table)
+        return table
+
+    def _append(self, client_id: str, batch: Any) -> None:
+        table = self._table(client_id)
+        assert table is not None
+        for attempt in range(self._commit_retries + 1):
+            try:
+                table.append(batch)
+                return
+            except Exception as exc:
+                if type(exc).__name__ != "CommitFailedException" or attempt == self._commit_retries:
+                    raise
+                LOGGER.debug("History commit for %s conflicted, retrying", client_id)
+                table.refresh()
+
+    def _read(
+        self, table: "Table", start: datetime | None, end: datetime | None, needle: str | None
+    ) -> List[QueryHistoryEntry]:
+        pa = _require_pyarrow()
+        arrow = _scan(table, _time_filter(start, end)).to_arrow()
+        if needle is not None and arrow.num_rows:
+            tables = pa.compute.utf8_lower(arrow.column("tables"))
+            arrow = arrow.filter(pa.compute.fill_null(pa.compute.match_substring(tables, needle), False))
+        if arrow.num_rows:
+            arrow = arrow.take(pa.compute.sort_indices(arrow, sort_keys=[("submitted_at", "descending")]))
+        entries = [_from_row(row) for row in arrow.to_pylist()]
+        if needle is None:
+            return entries
+        # The substring prefilter ran on the JSON text; confirm against the table names.
+        return [entry for entry in entries if needle in table_lookup_keys(entry.tables)]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive timestamps are treated as UTC, as they are when written.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _time_filter(start: datetime | None, end: datetime | None) -> str | None:
+    clauses = []
+    if start is not None:
+        clauses.append(f"submitted_at >= '{start.isoformat()}'")
+    if end is not None:
+        clauses.append(f"submitted_at <= '{end.isoformat()}'")
+    return " AND ".join(clauses) if clauses else None
+
+
+def _scan(table: "Table", row_filter: str | None) -> Any:
+    return table.scan(row_filter=row_filter) if row_filter is not None else table.scan()
+
+
+def _partition_days(table: "Table", row_filter: str | None) -> List[int] | None:
+    """Days holding matching data files, newest first, or ``None`` if not day-partitioned."""
+
+    fields = list(getattr(table.spec(), "fields", ()))
+    if len(fields) != 1 or fields[0].name != "submitted_at_day" or str(fields[0].transform) != "day":
+        return None
+    days = {task.file.partition[0] for task in _scan(table, row_filter).plan_files()}
+    return sorted((day for day in days if day is not None), reverse=True)
+
+
+def _to_arrow(entries: Sequence[QueryHistoryEntry]) -> Any:
+    pa = _require_pyarrow()
+    timestamp = pa.timestamp("us", tz="UTC")
+    schema = pa.schema(
+        [
+            pa.field("query_id", pa.string(), nullable=False),
+            pa.field("client_id", pa.string(), nullable=False),
+            pa.field("statement", pa.string()),
+            pa.field("status", pa.string()),
+            pa.field("submitted_at", timestamp, nullable=False),
+            pa.field("completed_at", timestamp),
+            pa.field("elapsed_ms", pa.float64()),
+            pa.field("data_scanned_mb", pa.float64()),
+            pa.field("row_count", pa.int64()),
+            pa.field("cost_usd", pa.float64()),
+            pa.field("error_message", pa.string()),
+            pa.field("tables", pa.string()),
+            pa.field("snapshot_id", pa.string()),
+            pa.field("as_of_timestamp", timestamp),
+            pa.field("cache_hit", pa.bool_()),
+        ]
+    )
+    rows = [
+        {
+            "query_id": entry.query_id,
+            "client_id": entry.client_id,
+            "statement": entry.statement,
+            "status": entry.status,
+            "submitted_at": _as_utc(entry.submitted_at),
+            "completed_at": _as_utc(entry.completed_at) if entry.completed_at else None,
+            "elapsed_ms": entry.elapsed_ms,
+            "data_scanned_mb": entry.data_scanned_mb,
+            "row_count": entry.row_count,
+            "cost_usd": entry.cost_usd,
+            "error_message": entry.error_message,
+            "tables": json.dumps(list(entry.tables)),
+            "snapshot_id": entry.snapshot_id,
+            "as_of_timestamp": _as_utc(entry.as_of_timestamp) if entry.as_of_timestamp else None,
+            "cache_hit": entry.cache_hit,
+        }
+        for entry in entries
+    ]
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+def _from_row(row: Dict[str, Any]) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=row["query_id"],
+        client_id=row["client_id"],
+        statement=row["statement"],
+        status=row["status"],
+        submitted_at=row["submitted_at"],
+        completed_at=row["completed_at"],
+        elapsed_ms=row["elapsed_ms"],
+        data_scanned_mb=row["data_scanned_mb"],
+        row_count=row["row_count"],
+        cost_usd=row["cost_usd"],
+        error_message=row["error_message"],
+        tables=tuple(json.loads(row["tables"])) if row["tables"] else (),
+        snapshot_id=row["snapshot_id"],
+        as_of_timestamp=row["as_of_timestamp"],
+        cache_hit=bool(row["cache_hit"]),
+    )
@@ -0,0 +1,164 @@
+"""Per-client daily rollups that answer history summaries without scanning entries."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+from .history import (
+    HistoryRollup,
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    QueryHistoryPage,
+    QueryHistoryStore,
+    QueryHistorySummary,
+    append_entries,
+    page_history,
+    summarise_history,
+)
+
+RollupLoader = Callable[[str, "date | None", "date | None"], Iterable[HistoryRollup]]
+"""Return the rollups of a client for the UTC days between two dates, both inclusive and optional."""
+
+_TICK = timedelta(microseconds=1)
+
+
+def rollup_day(entry: QueryHistoryEntry) -> date:
+    """UTC day whose rollup ``entry`` counts towards."""
+
+    return _as_utc(entry.submitted_at).date()
+
+
+def daily_rollups(entries: Iterable[QueryHistoryEntry]) -> Dict[Tuple[str, date], HistoryRollup]:
+    """Group ``entries`` into one rollup per client and UTC day."""
+
+    grouped: Dict[Tuple[str, date], list[QueryHistoryEntry]] = {}
+    for entry in entries:
+        grouped.setdefault((entry.client_id, rollup_day(entry)), []).append(entry)
+    return {key: HistoryRollup.from_entries(group) for key, group in grouped.items()}
+
+
+def summarise_range(
+    query: QueryHistoryFilter,
+    load_rollups: RollupLoader,
+    search: Callable[[QueryHistoryFilter], Sequence[QueryHistoryEntry]],
+) -> QueryHistorySummary:
+    """Summarise every entry in the time range of ``query``, ignoring its ``limit``.
+
+    Days the range covers completely are read from their rollups; only the
+    partially covered days at either end are searched entry by entry. Table
+    filters cannot be answered from rollups, so those ranges are searched.
+    """
+
+    query = replace(query, limit=None)
+    if query.table:
+        return summarise_history(search(query))
+    start = _as_utc(query.start) if query.start else None
+    end = _as_utc(query.end) if query.end else None
+    first_day = None if start is None else _first_full_day(start)
+    last_day = None if end is None else (end + _TICK).date() - timedelta(days=1)
+    if first_day is not None and last_day is not None and first_day > last_day:
+        return summarise_history(search(query))
+
+    rollup = sum(load_rollups(query.client_id, first_day, last_day), HistoryRollup())
+    edges = []
+    if start is not None and first_day is not None:
+        edges.append((query.start, _like(query.start, _midnight(first_day) - _TICK)))
+    if end is not None and last_day is not None:
+        edges.append((_like(query.end, _midnight(last_day + timedelta(days=1))), query.end))
+    for low, high in edges:
+        if low is not None and high is not None and low <= high:
+            rollup = rollup + HistoryRollup.from_entries(search(replace(query, start=low, end=high)))
+    return rollup.summary()
+
+
+def summarise_search(
+    store: QueryHistoryStore, query: QueryHistoryFilter, entries: Sequence[QueryHistoryEntry]
+) -> QueryHistorySummary:
+    """Summarise the range of ``query`` from the store's rollups, or ``entries`` without them.
+
+    Stores without rollups either lack a ``summarise`` method or return ``None`` from it.
+    """
+
+    summarise = getattr(store, "summarise", None)
+    summary = summarise(query) if summarise is not None else None
+    if summary is None:
+        return summarise_history(entries)
+    return summary
+
+
+class RollupQueryHistoryStore(QueryHistoryStore):
+    """Wrap a store and maintain per-client daily rollups of what is appended to it.
+
+    Rollups live in memory, so summaries only cover entries appended through
+    this instance. Each entry is expected to be appended once.
+    """
+
+    def __init__(self, store: QueryHistoryStore) -> None:
+        self._store = store
+        self._rollups: Dict[str, Dict[date, HistoryRollup]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> QueryHistoryStore:
+        return self._store
+
+    def append(self, entry: QueryHistoryEntry) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        append_entries(self._store, entries)
+        with self._lock:
+            for (client_id, day), rollup in daily_rollups(entries).items():
+                days = self._rollups.setdefault(client_id, {})
+                days[day] = days[day] + rollup if day in days else rollup
+
+    def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
+        return self._store.search(query)
+
+    def search_page(self, query: QueryHistoryFilter, *, page_size: int, cursor: str | None = None) -> QueryHistoryPage:
+        return page_history(self._store, query, page_size=page_size, cursor=cursor)
+
+    def summarise(self, query: QueryHistoryFilter) -> QueryHistorySummary:
+        return summarise_range(query, self._load_rollups, self._store.search)
+
+    def rollup(self, client_id: str, day: date) -> HistoryRollup | None:
+        with self._lock:
+            return self._rollups.get(client_id, {}).get(day)
+
+    # Internal helpers -------------------------------------------------
+
+    def _load_rollups(self, client_id: str, first: date | None, last: date | None) -> list[HistoryRollup]:
+        with self._lock:
+            days = self._rollups.get(client_id, {})
+            return [
+                rollup
+                for day, rollup in days.items()
+                if (first is None or day >= first) and (last is None or day <= last)
+            ]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive timestamps are treated as UTC.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _like(reference: datetime | None, value: datetime) -> datetime:
+    """Return ``value`` naive when ``reference`` is, so it compares with the same entries."""
+
+    if reference is not None and reference.tzinfo is None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _first_full_day(start: datetime) -> date:
+    day = start.date()
+    return day if start == _midnight(day) else day + timedelta(days=1)
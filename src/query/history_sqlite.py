@@ -0,0 +1,278 @@
+"""Durable query history on embedded SQLite for single-node deployments."""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Sequence, Tuple
+
+from .history import (
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    QueryHistoryPage,
+    QueryHistoryStore,
+    decode_history_cursor,
+    encode_history_cursor,
+    table_lookup_keys,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS query_history (
+        client_id TEXT NOT NULL,
+        submitted_us INTEGER NOT NULL,
+        query_id TEXT NOT NULL,
+        submitted_at TEXT NOT NULL,
+        statement TEXT NOT NULL,
+        status TEXT NOT NULL,
+        completed_at TEXT,
+        elapsed_ms REAL,
+        data_scanned_mb REAL,
+        row_count INTEGER,
+        cost_usd REAL,
+        error_message TEXT,
+        tables TEXT NOT NULL,
+        snapshot_id TEXT,
+        as_of_timestamp TEXT,
+        cache_hit INTEGER NOT NULL,
+        PRIMARY KEY (client_id, submitted_us, query_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS query_history_tables (
+        client_id TEXT NOT NULL,
+        table_key TEXT NOT NULL,
+        submitted_us INTEGER NOT NULL,
+        query_id TEXT NOT NULL,
+        PRIMARY KEY (client_id, table_key, submitted_us, query_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS query_history_by_time ON query_history (submitted_us)",
+    "CREATE INDEX IF NOT EXISTS query_history_tables_by_time ON query_history_tables (submitted_us)",
+)
+
+_COLUMNS = (
+    "h.query_id, h.client_id, h.statement, h.status, h.submitted_at, h.completed_at, h.elapsed_ms, "
+    "h.data_scanned_mb, h.row_count, h.cost_usd, h.error_message, h.tables, h.snapshot_id, "
+    "h.as_of_timestamp, h.cache_hit"
+)
+
+
+class SQLiteQueryHistoryStore(QueryHistoryStore):
+    """Persist history entries in a SQLite database in WAL mode.
+
+    Entries are clustered on ``(client_id, submitted_us, query_id)`` and table
+    names are kept in a second clustered table keyed by
+    ``(client_id, table_key, submitted_us, query_id)``. Every search is
+    therefore an index range scan read newest first that stops at ``limit``.
+    Table filters match a table's full or unqualified name (``analytics.events``
+    or ``events``). Appends insert a whole batch in one transaction and replace
+    entries with the same key, so retried batches do not duplicate rows. With
+    ``retention`` set, older entries are deleted at most every
+    ``prune_interval_s`` seconds as entries are appended.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        retention: timedelta | None = None,
+        prune_interval_s: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._path = str(path)
+        self._retention = retention
+        self._prune_interval_s = prune_interval_s
+        self._clock = clock
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as cursor:
+            for statement in _SCHEMA:
+                cursor.execute(statement)
+
+    def append(self, entry: QueryHistoryEntry) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        if not entries:
+            return
+        rows = [_entry_row(entry) for entry in entries]
+        table_rows = [
+            (entry.client_id, key, row[1], entry.query_id)
+            for entry, row in zip(entries, rows)
+            for key in table_lookup_keys(entry.tables)
+        ]
+        with self._lock, self._transaction() as cursor:
+            cursor.executemany(f"INSERT OR REPLACE INTO query_history VALUES ({', '.join('?' * 16)})", rows)
+            # A replaced entry may reference different tables, so its old keys go first.
+            cursor.executemany(
+                "DELETE FROM query_history_tables WHERE client_id = ? AND submitted_us = ? AND query_id = ?",
+                [(entry.client_id, row[1], entry.query_id) for entry, row in zip(entries, rows)],
+            )
+            cursor.executemany("INSERT OR IGNORE INTO query_history_tables VALUES (?, ?, ?, ?)", table_rows)
+        if self._retention is not None and self._clock() >= self._next_prune:
+            self.prune()
+
+    def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
+        if query.limit is not None and query.limit <= 0:
+            return []
+        return self._select(query, query.limit, None)
+
+    def search_page(
+        self,
+        query: QueryHistoryFilter,
+        *,
+        page_size: int,
+        cursor: str | None = None,
+    ) -> QueryHistoryPage:
+        """Return up to ``page_size`` entries after ``cursor`` and the cursor that follows them."""
+
+        position = None
+        if cursor:
+            submitted_at, query_id = decode_history_cursor(cursor)
+            position = (_epoch_us(submitted_at), query_id)
+        entries = self._select(query, page_size + 1, position)
+        page = entries[:page_size]
+        next_cursor = encode_history_cursor(page[-1]) if len(entries) > page_size else None
+        return QueryHistoryPage(entries=page, next_cursor=next_cursor)
+
+    def prune(self) -> int:
+        """Delete entries older than the retention window and return how many were removed."""
+
+        if self._retention is None:
+            return 0
+        now = self._clock()
+        self._next_prune = now + self._prune_interval_s
+        cutoff = _epoch_us(datetime.fromtimestamp(now, tz=timezone.utc) - self._retention)
+        with self._lock, self._transaction() as cursor:
+            cursor.execute("DELETE FROM query_history_tables WHERE submitted_us < ?", (cutoff,))
+            removed = cursor.execute("DELETE FROM query_history WHERE submitted_us < ?", (cutoff,)).rowcount
+        if removed:
+            LOGGER.debug("Pruned %d query history entries", removed)
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    # Internal helpers -------------------------------------------------
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        cursor = self._connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        else:
+            cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+
+    def _select(
+        self, query: QueryHistoryFilter, limit: int | None, position: Tuple[int, str] | None
+    ) -> List[QueryHistoryEntry]:
+        # Both branches pin a prefix of the clustered key, so SQLite walks the
+        # key backwards between the time bounds without a separate sort.
+        if query.table:
+            source = (
+                "query_history_tables AS t JOIN query_history AS h "
+                "ON h.client_id = t.client_id AND h.submitted_us = t.submitted_us AND h.query_id = t.query_id"
+            )
+            key = "t"
+            clauses = ["t.client_id = ?", "t.table_key = ?"]
+            parameters: List[Any] = [query.client_id, query.table.lower()]
+        else:
+            source = "query_history AS h"
+            key = "h"
+            clauses = ["h.client_id = ?"]
+            parameters = [query.client_id]
+        if query.start is not None:
+            clauses.append(f"{key}.submitted_us >= ?")
+            parameters.append(_epoch_us(query.start))
+        if query.end is not None:
+            clauses.append(f"{key}.submitted_us <= ?")
+            parameters.append(_epoch_us(query.end))
+        if position is not None:
+            clauses.append(f"({key}.submitted_us, {key}.query_id) < (?, ?)")
+            parameters.extend(position)
+        statement = (
+            f"SELECT {_COLUMNS} FROM {source} WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {key}.submitted_us DESC, {key}.query_id DESC"
+        )
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        with self._lock:
+            rows = self._connection.execute(statement, parameters).fetchall()
+        return [_entry_from_row(row) for row in rows]
+
+
+def _epoch_us(value: datetime) -> int:
+    # Naive timestamps are treated as UTC.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _from_iso(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _entry_row(entry: QueryHistoryEntry) -> Tuple[Any, ...]:
+    return (
+        entry.client_id,
+        _epoch_us(entry.submitted_at),
+        entry.query_id,
+        entry.submitted_at.isoformat(),
+        entry.statement,
+        entry.status,
+        _iso(entry.completed_at),
+        entry.elapsed_ms,
+        entry.data_scanned_mb,
+        entry.row_count,
+        entry.cost_usd,
+        entry.error_message,
+        json.dumps(list(entry.tables)),
+        entry.snapshot_id,
+        _iso(entry.as_of_timestamp),
+        int(entry.cache_hit),
+    )
+
+
+def _entry_from_row(row: Sequence[Any]) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=row[0],
+        client_id=row[1],
+        statement=row[2],
+        status=row[3],
+        submitted_at=datetime.fromisoformat(row[4]),
+        completed_at=_from_iso(row[5]),
+        elapsed_ms=row[6],
+        data_scanned_mb=row[7],
+        row_count=row[8],
+        cost_usd=row[9],
+        error_message=row[10],
+        tables=tuple(json.loads(row[11])),
+        snapshot_id=row[12],
+        as_of_timestamp=_from_iso(row[13]),
+        cache_hit=bool(row[14]),
+    )
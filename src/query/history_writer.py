@@ -0,0 +1,220 @@
+"""Background, batched writes of query history entries."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, List, Sequence
+
+from .history import (
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    QueryHistoryPage,
+    QueryHistoryStore,
+    QueryHistorySummary,
+    append_entries,
+    page_history,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HistoryWriterStats:
+    """Counters describing the writer's queue and its backend writes."""
+
+    queued: int
+    written: int
+    dropped: int
+    overflows: int
+    failed_batches: int
+
+
+class BufferedHistoryWriter:
+    """Wrap a :class:`~query.history.QueryHistoryStore` so appends never wait on it.
+
+    :meth:`append` only enqueues the entry; a background thread writes batches of
+    up to ``max_batch`` entries through ``append_many`` whenever a batch fills up
+    or ``flush_interval_s`` passes. When ``max_queue`` entries are pending, callers
+    wait up to ``block_timeout_s`` for room (counted in ``overflows``) before the
+    entry is discarded (counted in ``dropped``). Failed batches are retried while
+    there is room for them; after a failure the thread waits ``flush_interval_s``,
+    doubling up to ``max_backoff_s`` while writes keep failing. Call :meth:`close`
+    on shutdown to write what is left.
+
+    Searches, pages and summaries flush pending entries and are then served by
+    the wrapped store.
+    """
+
+    def __init__(
+        self,
+        store: QueryHistoryStore,
+        *,
+        max_batch: int = 100,
+        flush_interval_s: float = 1.0,
+        max_queue: int = 10_000,
+        block_timeout_s: float = 0.0,
+        max_backoff_s: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_queue < max_batch:
+            raise ValueError("max_queue must be at least max_batch")
+        self._store = store
+        self._max_batch = max_batch
+        self._flush_interval_s = flush_interval_s
+        self._max_queue = max_queue
+        self._block_timeout_s = block_timeout_s
+        self._max_backoff_s = max_backoff_s
+        self._clock = clock
+        self._queue: Deque[QueryHistoryEntry] = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._written = 0
+        self._dropped = 0
+        self._overflows = 0
+        self._failed_batches = 0
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def store(self) -> QueryHistoryStore:
+        return self._store
+
+    @property
+    def stats(self) -> HistoryWriterStats:
+        with self._condition:
+            return HistoryWriterStats(
+                queued=len(self._queue),
+                written=self._written,
+                dropped=self._dropped,
+                overflows=self._overflows,
+                failed_batches=self._failed_batches,
+            )
+
+    def append(self, entry: QueryHistoryEntry) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The history writer has been closed")
+            for entry in entries:
+                if len(self._queue) >= self._max_queue:
+                    self._overflows += 1
+                    deadline = self._clock() + self._block_timeout_s
+                    while len(self._queue) >= self._max_queue and not self._closed:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    if len(self._queue) >= self._max_queue:
+                        self._dropped += 1
+                        continue
+                self._queue.append(entry)
+            if len(self._queue) >= self._max_batch:
+                self._condition.notify_all()
+
+    def search(self, query: QueryHistoryFilter) -> Sequence[QueryHistoryEntry]:
+        """Flush pending entries, then search the wrapped store."""
+
+        self.flush()
+        return self._store.search(query)
+
+    def search_page(
+        self,
+        query: QueryHistoryFilter,
+        *,
+        page_size: int,
+        cursor: str | None = None,
+    ) -> QueryHistoryPage:
+        """Flush pending entries, then page through the wrapped store."""
+
+        self.flush()
+        return page_history(self._store, query, page_size=page_size, cursor=cursor)
+
+    def summarise(self, query: QueryHistoryFilter) -> QueryHistorySummary | None:
+        """Flush pending entries, then summarise from the wrapped store's rollups, if it has any."""
+
+        summarise = getattr(self._store, "summarise", None)
+        if summarise is None:
+            return None
+        self.flush()
+        return summarise(query)
+
+    def flush(self) -> int:
+        """Write every pending entry now and return how many were written."""
+
+        written = 0
+        while True:
+            count = self._write_batch()
+            if count <= 0:
+                return written
+            written += count
+
+    def close(self) -> None:
+        """Stop the background thread and write the remaining entries."""
+
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+
+    # Internal helpers -------------------------------------------------
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while True:
+            with self._condition:
+                # After a failure a full queue must not cut the wait short.
+                deadline = self._clock() + (backoff or self._flush_interval_s)
+                while not self._closed and (backoff or len(self._queue) < self._max_batch):
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+                failed_batches = self._failed_batches
+            try:
+                self.flush()
+                with self._condition:
+                    failed = self._failed_batches != failed_batches
+            except Exception:  # pragma: no cover - retried after the backoff
+                LOGGER.exception("Failed to write query history")
+                failed = True
+            backoff = min(max(backoff * 2, self._flush_interval_s), self._max_backoff_s) if failed else 0.0
+
+    def _write_batch(self) -> int:
+        """Write one batch; returns its size, 0 when idle and -1 when the write failed."""
+
+        with self._flush_lock:
+            with self._condition:
+                batch: List[QueryHistoryEntry] = [
+                    self._queue.popleft() for _ in range(min(self._max_batch, len(self._queue)))
+                ]
+                if batch:
+                    self._condition.notify_all()  # room for callers waiting on a full queue
+            if not batch:
+                return 0
+            try:
+                append_entries(self._store, batch)
+            except Exception:
+                LOGGER.warning("Failed to write %d query history entries", len(batch), exc_info=True)
+                with self._condition:
+                    self._failed_batches += 1
+                    room = max(self._max_queue - len(self._queue), 0)
+                    self._dropped += max(len(batch) - room, 0)
+                    self._queue.extendleft(reversed(batch[:room]))
+                return -1
+            with self._condition:
+                self._written += len(batch)
+            return len(batch)
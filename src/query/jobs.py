@@ -0,0 +1,313 @@
+"""Background execution of submitted queries with spooled, paged results."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence
+
+from api.entitlements import EntitlementError
+
+from .engine import QueryError
+from .models import QueryRequest, QueryResultColumn, QueryStatistics, chunk_rows
+from .service import STATUS_CANCELLED, STATUS_TIMED_OUT, QueryService
+
+LOGGER = logging.getLogger(__name__)
+
+JOB_QUEUED = "QUEUED"
+JOB_RUNNING = "RUNNING"
+JOB_SUCCEEDED = "SUCCEEDED"
+JOB_FAILED = "FAILED"
+JOB_CANCELLED = STATUS_CANCELLED
+JOB_TIMED_OUT = STATUS_TIMED_OUT
+_TERMINAL_STATUSES = frozenset({JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED, JOB_TIMED_OUT})
+_INTERRUPTED_STATUSES = {"query_cancelled": JOB_CANCELLED, "query_timeout": JOB_TIMED_OUT}
+
+
+@dataclass(frozen=True)
+class QueryJobInfo:
+    """Snapshot of a submitted query's state and progress."""
+
+    query_id: str
+    client_id: str
+    statement: str
+    status: str
+    submitted_at: datetime
+    started_at: datetime | None
+    completed_at: datetime | None
+    rows_spooled: int
+    pages_available: int
+    page_size: int
+    truncated: bool
+    columns: Sequence[QueryResultColumn] = ()
+    stats: QueryStatistics | None = None
+    error_code: str | None = None
+    error_message: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in _TERMINAL_STATUSES
+
+
+@dataclass(frozen=True)
+class QueryResultPage:
+    """A page of spooled rows for a submitted query."""
+
+    query_id: str
+    page: int
+    rows: Sequence[Sequence[Any]]
+    columns: Sequence[QueryResultColumn]
+    ready: bool
+    next_page: int | None
+
+
+@dataclass
+class _Job:
+    info: QueryJobInfo
+    pages: List[List[Sequence[Any]]] = field(default_factory=list)
+    finished_monotonic: float | None = None
+    cancel_requested: bool = False
+
+
+class QueryJobManager:
+    """Run queries on a background executor and spool their results into pages.
+
+    Jobs go through :meth:`QueryService.execute` in streaming mode, so entitlement
+    checks, history and usage accounting are identical to interactive queries and
+    the history entry shares the job's query id. Query ids are unique among the
+    retained jobs; lookups and cancellation can be scoped to the submitting client.
+
+    Each client may hold at most ``max_active_jobs_per_client`` unfinished and
+    ``max_retained_jobs_per_client`` retained jobs, and submissions are refused
+    while the rows spooled across all jobs have reached ``max_total_spooled_rows``.
+    """
+
+    def __init__(
+        self,
+        service: QueryService,
+        *,
+        max_workers: int = 4,
+        page_size: int = 1_000,
+        max_spooled_rows: int = 1_000_000,
+        max_total_spooled_rows: int = 10_000_000,
+        max_active_jobs_per_client: int = 4,
+        max_retained_jobs_per_client: int = 100,
+        retention_s: float = 3_600.0,
+        clock: Callable[[], datetime] | None = None,
+    ) -> None:
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        self._service = service
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-job")
+        self._page_size = page_size
+        self._max_spooled_rows = max_spooled_rows
+        self._max_total_spooled_rows = max_total_spooled_rows
+        self._max_active_jobs_per_client = max_active_jobs_per_client
+        self._max_retained_jobs_per_client = max_retained_jobs_per_client
+        self._total_spooled_rows = 0
+        self._retention_s = retention_s
+        self._clock = clock or (lambda: datetime.now(timezone.utc))
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, request: QueryRequest) -> QueryJobInfo:
+        """Queue ``request`` for background execution and return its initial state."""
+
+        if not request.sql.strip():
+            raise QueryError("empty_statement", "A SQL statement must be provided")
+        query_id = request.query_id or uuid.uuid4().hex
+        info = QueryJobInfo(
+            query_id=query_id,
+            client_id=request.client_id,
+            statement=request.sql,
+            status=JOB_QUEUED,
+            submitted_at=self._clock(),
+            started_at=None,
+            completed_at=None,
+            rows_spooled=0,
+            pages_available=0,
+            page_size=self._page_size,
+            truncated=False,
+        )
+        with self._lock:
+            self._purge_expired()
+            if query_id in self._jobs:
+                raise QueryError("duplicate_query_id", f"Query {query_id} already exists")
+            self._check_capacity(request.client_id)
+            self._jobs[query_id] = _Job(info=info)
+        self._executor.submit(self._run, query_id, request)
+        return info
+
+    def get(self, query_id: str, *, client_id: str | None = None) -> QueryJobInfo | None:
+        with self._lock:
+            self._purge_expired()
+            job = self._find(query_id, client_id)
+            return job.info if job else None
+
+    def fetch_page(self, query_id: str, page: int, *, client_id: str | None = None) -> QueryResultPage | None:
+        """Return ``page`` (0-based) of the spooled result, or ``None`` for unknown jobs."""
+
+        if page < 0:
+            raise ValueError("page must be non-negative")
+        with self._lock:
+            job = self._find(query_id, client_id)
+            if job is None:
+                return None
+            info = job.info
+            if info.finished:
+                ready = True
+                next_page = page + 1 if page + 1 < len(job.pages) else None
+            else:
+                # The newest page may still be filling up while the job runs.
+                ready = page < len(job.pages) - 1
+                next_page = page + 1 if ready else None
+            rows = list(job.pages[page]) if ready and page < len(job.pages) else []
+            return QueryResultPage(
+                query_id=query_id,
+                page=page,
+                rows=rows,
+                columns=info.columns,
+                ready=ready,
+                next_page=next_page,
+            )
+
+    def cancel(self, query_id: str, *, client_id: str | None = None) -> bool:
+        """Cancel a queued or running job; returns ``False`` if it already finished."""
+
+        with self._lock:
+            job = self._find(query_id, client_id)
+            if job is None or job.info.finished:
+                return False
+            if job.info.status == JOB_QUEUED:
+                job.info = replace(
+                    job.info,
+                    status=JOB_CANCELLED,
+                    completed_at=self._clock(),
+                    error_code="query_cancelled",
+                    error_message="Query was cancelled",
+                )
+                job.finished_monotonic = time.monotonic()
+                return True
+            # A running job may not have reached the service yet; ``_run`` honours the flag.
+            job.cancel_requested = True
+        self._service.cancel(query_id, client_id=job.info.client_id)
+        return True
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    # Internal helpers -------------------------------------------------
+
+    def _find(self, query_id: str, client_id: str | None) -> _Job | None:
+        job = self._jobs.get(query_id)
+        if job is None or (client_id is not None and job.info.client_id != client_id):
+            return None
+        return job
+
+    def _check_capacity(self, client_id: str) -> None:
+        client_jobs = [job for job in self._jobs.values() if job.info.client_id == client_id]
+        active = sum(1 for job in client_jobs if not job.info.finished)
+        if active >= self._max_active_jobs_per_client:
+            raise QueryError(
+                "too_many_jobs",
+                f"Client {client_id} already has {active} queries running; wait for one to finish",
+            )
+        if len(client_jobs) >= self._max_retained_jobs_per_client:
+            raise QueryError(
+                "too_many_jobs",
+                f"Client {client_id} has {len(client_jobs)} retained queries; retry once older results expire",
+            )
+        if self._total_spooled_rows >= self._max_total_spooled_rows:
+            raise QueryError("spool_full", "Result spool is full; retry once older results expire")
+
+    def _cancel_requested(self, query_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(query_id)
+            return job is not None and job.cancel_requested
+
+    def _run(self, query_id: str, request: QueryRequest) -> None:
+        with self._lock:
+            job = self._jobs.get(query_id)
+            if job is None or job.info.finished:
+                return
+            job.info = replace(job.info, status=JOB_RUNNING, started_at=self._clock())
+        try:
+            if self._cancel_requested(query_id):
+                raise QueryError("query_cancelled", "Query was cancelled")
+            result = self._service.execute(replace(request, stream=True), query_id=query_id)
+            if self._cancel_requested(query_id):
+                # Cancelled before the service registered the query: interrupt it now.
+                self._service.cancel(query_id, client_id=request.client_id)
+            self._update(query_id, columns=tuple(result.columns))
+            stream = result.stream
+            chunks = stream if stream is not None else [result.iter_rows()]
+            spooling = True
+            try:
+                for chunk in chunks:
+                    # Past the row budget the rest of the stream is still read, so the
+                    # statement completes and history and billing match the job.
+                    if spooling and not self._spool(query_id, chunk_rows(chunk)):
+                        spooling = False
+            finally:
+                if stream is not None:
+                    stream.close()
+            stats = stream.stats if stream is not None else result.stats
+            self._update(query_id, status=JOB_SUCCEEDED, completed_at=self._clock(), stats=stats)
+        except EntitlementError as exc:
+            self._fail(query_id, "entitlement_denied", str(exc))
+        except QueryError as exc:
+            self._fail(query_id, exc.code, exc.message)
+        except Exception as exc:  # pragma: no cover - defensive catch
+            LOGGER.exception("Background query %s failed unexpectedly", query_id)
+            self._fail(query_id, "internal_error", str(exc))
+
+    def _spool(self, query_id: str, rows: Any) -> bool:
+        with self._lock:
+            job = self._jobs.get(query_id)
+            if job is None:
+                return False
+            spooled = job.info.rows_spooled
+            for row in rows:
+                if spooled >= self._max_spooled_rows or self._total_spooled_rows >= self._max_total_spooled_rows:
+                    job.info = replace(job.info, rows_spooled=spooled, pages_available=len(job.pages), truncated=True)
+                    return False
+                if not job.pages or len(job.pages[-1]) >= self._page_size:
+                    job.pages.append([])
+                job.pages[-1].append(tuple(row))
+                spooled += 1
+                self._total_spooled_rows += 1
+            job.info = replace(job.info, rows_spooled=spooled, pages_available=len(job.pages))
+            return True
+
+    def _fail(self, query_id: str, code: str, message: str) -> None:
+        self._update(
+            query_id,
+            status=_INTERRUPTED_STATUSES.get(code, JOB_FAILED),
+            completed_at=self._clock(),
+            error_code=code,
+            error_message=message,
+        )
+
+    def _update(self, query_id: str, **changes: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(query_id)
+            if job is None:
+                return
+            job.info = replace(job.info, **changes)
+            if job.info.finished:
+                job.finished_monotonic = time.monotonic()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.monotonic() - self._retention_s
+        expired = [
+            query_id
+            for query_id, job in self._jobs.items()
+            if job.finished_monotonic is not None and job.finished_monotonic < cutoff
+        ]
+        for query_id in expired:
+            self._total_spooled_rows -= self._jobs.pop(query_id).info.rows_spooled
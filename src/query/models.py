@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from typing import Any, Mapping, Sequence
+from typing import Any, Callable, Iterable, Iterator, List, Mapping, Sequence
+
+RESULT_FORMAT_ROWS = "rows"
+RESULT_FORMAT_ARROW = "arrow"
 
 
 @dataclass(frozen=True)
@@ -17,6 +20,11 @@ class QueryRequest:
     snapshot_id: str | None = None
     as_of_timestamp: datetime | None = None
     estimated_scan_mb: float | None = None
+    result_format: str = RESULT_FORMAT_ROWS
+    stream: bool = False
+    timeout_ms: int | None = None
+    query_id: str | None = None
+    parameters: Sequence[Any] | Mapping[str, Any] | None = None
 
 
 @dataclass(frozen=True)
@@ -37,14 +45,167 @@ class QueryStatistics:
     snapshot_id: str | None = None
     snapshot_timestamp: datetime | None = None
     engine_details: Mapping[str, Any] | None = None
+    queue_ms: float | None = None
+
+
+StreamCloseCallback = Callable[["QueryResultStream", "BaseException | None"], None]
+
+
+class QueryResultStream(Iterator[Any]):
+    """Lazy iterator over result chunks produced while a query is still running.
+
+    Chunks are either sequences of rows or Arrow record batches. Close callbacks run
+    exactly once, when the stream is exhausted, fails, or is closed early by the
+    consumer; :attr:`stats` becomes available once the stream has finished.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[Any],
+        *,
+        stats: Callable[[], "QueryStatistics | None"] | None = None,
+    ) -> None:
+        self._chunks = iter(chunks)
+        self._stats_provider = stats
+        self._stats_overrides: dict[str, Any] = {}
+        self._callbacks: List[StreamCloseCallback] = []
+        self._finished = False
+        self._closing = False
+        self._interrupt: BaseException | None = None
+        self.completed = False
+        self.row_count = 0
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @property
+    def stats(self) -> "QueryStatistics | None":
+        """Engine statistics, available once the stream has finished."""
+
+        if not self._finished:
+            return None
+        stats = self._stats_provider() if self._stats_provider is not None else None
+        if self._stats_overrides:
+            stats = replace(stats or QueryStatistics(), **self._stats_overrides)
+        return stats
+
+    def update_stats(self, **values: Any) -> None:
+        """Override fields of the final :class:`QueryStatistics` reported by :attr:`stats`."""
+
+        self._stats_overrides.update(values)
+
+    def add_close_callback(self, callback: StreamCloseCallback) -> None:
+        self._callbacks.append(callback)
+
+    def interrupt(self, error: BaseException) -> None:
+        """Make the next read fail with ``error``; safe to call from another thread."""
+
+        self._interrupt = error
+
+    def __iter__(self) -> "QueryResultStream":
+        return self
+
+    def __next__(self) -> Any:
+        if self._finished:
+            raise StopIteration
+        if self._interrupt is not None:
+            self._finish(self._interrupt)
+            raise self._interrupt
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.completed = True
+            self._finish(None)
+            raise
+        except BaseException as exc:
+            self._finish(exc)
+            raise
+        num_rows = getattr(chunk, "num_rows", None)
+        self.row_count += num_rows if num_rows is not None else len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        """Stop consuming the stream and release the resources backing it; later calls do nothing."""
+
+        if self._finished or self._closing:
+            return
+        self._closing = True
+        close = getattr(self._chunks, "close", None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._finish(None)
+
+    def _finish(self, error: BaseException | None) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        failure: BaseException | None = None
+        for callback in self._callbacks:
+            try:
+                callback(self, error)
+            except BaseException as exc:  # run every callback before surfacing failures
+                failure = failure or exc
+        if failure is not None:
+            raise failure
 
 
 @dataclass(frozen=True)
 class QueryResult:
-    """Materialised result returned by a query execution."""
+    """Materialised result returned by a query execution.
+
+    Engines return either Python ``rows`` or, when the request asked for
+    :data:`RESULT_FORMAT_ARROW`, Arrow record ``batches`` sharing ``arrow_schema``.
+    Streaming requests receive a :class:`QueryResultStream` of row chunks or
+    batches in place of the materialised sequence.
+    """
 
     statement: str
     columns: Sequence[QueryResultColumn] = field(default_factory=tuple)
     rows: Sequence[Any] = field(default_factory=tuple)
     stats: QueryStatistics | None = None
+    batches: Sequence[Any] | None = None
+    arrow_schema: Any | None = None
+
+    @property
+    def stream(self) -> QueryResultStream | None:
+        """The lazy chunk stream backing this result, if any."""
+
+        for candidate in (self.batches, self.rows):
+            if isinstance(candidate, QueryResultStream):
+                return candidate
+        return None
+
+    @property
+    def row_count(self) -> int | None:
+        """Number of rows carried by the result, if it can be determined cheaply."""
+
+        stream = self.stream
+        if stream is not None:
+            return stream.row_count if stream.finished else None
+        if self.batches is not None:
+            return sum(batch.num_rows for batch in self.batches)
+        try:
+            return len(self.rows)
+        except TypeError:
+            return None
+
+    def iter_rows(self) -> Iterator[Sequence[Any]]:
+        """Yield the result as row sequences regardless of its representation."""
+
+        if self.batches is None and self.stream is None:
+            yield from self.rows
+            return
+        for chunk in self.batches if self.batches is not None else self.rows:
+            yield from chunk_rows(chunk)
+
+
+def chunk_rows(chunk: Any) -> Iterable[Sequence[Any]]:
+    """Return the rows of a stream chunk, converting Arrow record batches."""
+
+    if hasattr(chunk, "num_rows") and hasattr(chunk, "columns"):
+        return zip(*(column.to_pylist() for column in chunk.columns))
+    return chunk
 
@@ -0,0 +1,305 @@
+"""Server-side scan estimation from Iceberg snapshot and manifest metadata."""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Mapping, Sequence, Tuple
+
+from iceberg.bootstrap import ClientCatalogHandle, IcebergCatalogBootstrapper
+from iceberg.config import IcebergCatalogConfig
+
+from .sql import TOKEN_WORD, analyze_sql, tokenize
+
+if TYPE_CHECKING:  # pragma: no cover - imported for type checking only
+    from pyiceberg.table import Table
+
+    from .models import QueryRequest
+
+LOGGER = logging.getLogger(__name__)
+
+_BYTES_PER_MB = 1024 * 1024
+
+TableLoader = Callable[[str, str], "Table | None"]
+"""Callable returning the Iceberg table a client's SQL refers to by ``name``, or ``None``."""
+
+_LITERAL = r"(?:(?:date|timestamp)\s+)?(?:'(?:[^']|'')*'|-?\d+(?:\.\d+)?|true|false)"
+_COLUMN = r'(?:\w+\.)?(\w+|"[^"]+")'
+_COMPARISON = re.compile(rf"^{_COLUMN}\s*(=|==|!=|<>|<=|>=|<|>)\s*({_LITERAL})$", re.IGNORECASE)
+_BETWEEN = re.compile(rf"^{_COLUMN}\s+between\s+({_LITERAL})\s+and\s+({_LITERAL})$", re.IGNORECASE)
+_IN_LIST = re.compile(rf"^{_COLUMN}\s+(not\s+)?in\s*\(\s*({_LITERAL}(?:\s*,\s*{_LITERAL})*)\s*\)$", re.IGNORECASE)
+_TYPED_LITERAL = re.compile(r"^(?:date|timestamp)\s+", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ScanEstimate:
+    """Bytes a statement is expected to read, per resolved table."""
+
+    table_bytes: Mapping[str, int]
+    unresolved: tuple[str, ...] = ()
+    row_filter: str | None = None
+    limited: bool = False
+    """Whether a ``LIMIT`` lets the statement stop early, making the estimate only an upper bound."""
+
+    @property
+    def total_mb(self) -> float:
+        return sum(self.table_bytes.values()) / _BYTES_PER_MB
+
+
+class IcebergScanPlanner:
+    """Estimate the data a query will scan before it runs.
+
+    Tables are resolved through ``load_table``. When the statement names its
+    columns, the scan is planned and the manifest ``column_sizes`` of the
+    projected columns are summed; ``SELECT *`` falls back to whole files. Without
+    a projection or usable predicates the estimate is the snapshot's
+    ``total-files-size`` summary, which costs no manifest reads. For single-table
+    statements, simple column comparisons are turned into an Iceberg row filter,
+    so manifest partition summaries and column bounds prune files first.
+
+    Instances are callable with a :class:`~query.models.QueryRequest` and return
+    the estimate in megabytes, or ``None`` when no table could be resolved or a
+    ``LIMIT`` makes the estimate unreliable.
+    """
+
+    def __init__(self, load_table: TableLoader, *, cache_size: int = 1_024) -> None:
+        self._load_table = load_table
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[tuple[Any, ...], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, request: "QueryRequest") -> float | None:
+        estimate = self.plan(request.client_id, request.sql, snapshot_id=request.snapshot_id)
+        if not estimate.table_bytes or estimate.limited:
+            return None
+        return estimate.total_mb
+
+    def plan(self, client_id: str, statement: str, *, snapshot_id: str | None = None) -> ScanEstimate:
+        """Resolve the tables of ``statement`` and estimate the bytes read from each."""
+
+        analysis = analyze_sql(statement)
+        prunable = len(analysis.tables) == 1 and _is_simple_select(statement)
+        projection = _projection(statement, analysis.columns)
+        table_bytes: Dict[str, int] = {}
+        unresolved: list[str] = []
+        row_filter: str | None = None
+        for name in analysis.tables:
+            try:
+                table = self._load_table(client_id, name)
+            except Exception:  # pragma: no cover - a catalog outage must not fail the query
+                LOGGER.warning("Could not load table %s for scan estimation", name, exc_info=True)
+                table = None
+            if table is None:
+                unresolved.append(name)
+                continue
+            if prunable:
+                row_filter = _row_filter(table, analysis.predicates)
+            field_ids = _field_ids(table, projection) if projection else None
+            table_bytes[name] = self._table_bytes(client_id, name, table, snapshot_id, row_filter, field_ids)
+        return ScanEstimate(
+            table_bytes=table_bytes,
+            unresolved=tuple(unresolved),
+            row_filter=row_filter,
+            limited=_stops_early(statement),
+        )
+
+    # Internal helpers -------------------------------------------------
+
+    def _table_bytes(
+        self,
+        client_id: str,
+        name: str,
+        table: "Table",
+        snapshot_id: str | None,
+        row_filter: str | None,
+        field_ids: Tuple[int, ...] | None,
+    ) -> int:
+        snapshot = table.snapshot_by_id(int(snapshot_id)) if snapshot_id else table.current_snapshot()
+        if snapshot is None:
+            return 0
+        key = (client_id, name, snapshot.snapshot_id, row_filter, field_ids)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        size = None
+        if field_ids is not None:
+            size = _planned_bytes(table, snapshot.snapshot_id, row_filter, field_ids)
+        if size is None and row_filter is not None:
+            size = _planned_bytes(table, snapshot.snapshot_id, row_filter)
+        if size is None:
+            size = _summary_bytes(snapshot)
+        if size is None:
+            size = _planned_bytes(table, snapshot.snapshot_id, None) or 0
+        with self._lock:
+            self._cache[key] = size
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return size
+
+
+def catalog_table_loader(
+    config: IcebergCatalogConfig,
+    bootstrapper: IcebergCatalogBootstrapper | None = None,
+    *,
+    ttl_s: float = 60.0,
+    cache_size: int = 1_024,
+    clock: Callable[[], float] = time.monotonic,
+) -> TableLoader:
+    """Return a :data:`TableLoader` reading tables from each client's namespace.
+
+    Loaded tables (and misses) are cached for ``ttl_s`` seconds, so estimates
+    see new snapshots with that delay but repeated queries skip the catalog.
+    """
+
+    bootstrapper = bootstrapper or IcebergCatalogBootstrapper()
+    handles: Dict[str, ClientCatalogHandle] = {}
+    tables: "OrderedDict[tuple[str, str], tuple[float, Table | None]]" = OrderedDict()
+    lock = threading.Lock()
+
+    def _load(client_id: str, name: str) -> "Table | None":
+        key = (client_id, name)
+        with lock:
+            cached = tables.get(key)
+            if cached is not None and cached[0] > clock():
+                tables.move_to_end(key)
+                return cached[1]
+            handle = handles.get(client_id)
+            if handle is None:
+                handle = handles[client_id] = bootstrapper.open_catalog(client_id, config)
+        identifier = (*handle.namespace, *name.split("."))
+        table = handle.catalog.load_table(identifier) if handle.catalog.table_exists(identifier) else None
+        with lock:
+            tables[key] = (clock() + ttl_s, table)
+            tables.move_to_end(key)
+            while len(tables) > cache_size:
+                tables.popitem(last=False)
+        return table
+
+    return _load
+
+
+def _is_simple_select(statement: str) -> bool:
+    """Whether predicates of ``statement`` all filter the rows of its only scan."""
+
+    keywords = [token.value for token in tokenize(statement) if token.kind == TOKEN_WORD]
+    return keywords.count("select") == 1 and not {"with", "having", "qualify", "join", "union"} & set(keywords)
+
+
+def _projection(statement: str, columns: Sequence[str]) -> tuple[str, ...] | None:
+    """The column names a statement reads, or ``None`` when it selects ``*``."""
+
+    tokens = tokenize(statement)
+    for index, token in enumerate(tokens):
+        if token.text != "*" or index == 0:
+            continue
+        previous = tokens[index - 1]
+        if previous.text in (",", ".") or (previous.kind == TOKEN_WORD and previous.value in ("select", "distinct", "all")):
+            return None
+    names = {_unquote(column.rsplit(".", 1)[-1]) for column in columns}
+    return tuple(sorted(names)) or None
+
+
+def _field_ids(table: "Table", projection: Sequence[str]) -> tuple[int, ...] | None:
+    """Field ids of the projected columns in ``table``, or ``None`` when sizes cannot be attributed."""
+
+    schema = table.schema()
+    ids: set[int] = set()
+    for column in projection:
+        try:
+            field = schema.find_field(column, case_sensitive=False)
+        except ValueError:
+            continue  # an alias or a column of another table
+        if not getattr(getattr(field, "field_type", None), "is_primitive", True):
+            return None  # sizes are recorded per leaf column of nested types
+        ids.add(field.field_id)
+    return tuple(sorted(ids)) or None
+
+
+def _stops_early(statement: str) -> bool:
+    """Whether a ``LIMIT`` may end the scan before every file is read."""
+
+    keywords = {token.value for token in tokenize(statement) if token.kind == TOKEN_WORD}
+    return "limit" in keywords and not {"order", "group", "over"} & keywords
+
+
+def _row_filter(table: "Table", predicates: Sequence[str]) -> str | None:
+    """Translate the predicates on ``table``'s columns into an Iceberg filter expression."""
+
+    schema = table.schema()
+    clauses: list[str] = []
+    for predicate in predicates:
+        clause = _translate(predicate)
+        if clause is None:
+            continue
+        column, text = clause
+        try:
+            schema.find_field(column, case_sensitive=False)
+        except ValueError:
+            continue
+        clauses.append(text)
+    return " AND ".join(clauses) if clauses else None
+
+
+def _translate(predicate: str) -> tuple[str, str] | None:
+    match = _COMPARISON.match(predicate)
+    if match:
+        column, operator, literal = match.groups()
+        operator = {"==": "=", "<>": "!="}.get(operator, operator)
+        return _unquote(column), f"{column} {operator} {_literal(literal)}"
+    match = _BETWEEN.match(predicate)
+    if match:
+        column, low, high = match.groups()
+        return _unquote(column), f"{column} >= {_literal(low)} AND {column} <= {_literal(high)}"
+    match = _IN_LIST.match(predicate)
+    if match:
+        column, negated, values = match.groups()
+        literals = ", ".join(_literal(value) for value in re.findall(_LITERAL, values, re.IGNORECASE))
+        return _unquote(column), f"{column} {'NOT IN' if negated else 'IN'} ({literals})"
+    return None
+
+
+def _literal(text: str) -> str:
+    return _TYPED_LITERAL.sub("", text.strip())
+
+
+def _unquote(column: str) -> str:
+    return column[1:-1] if column.startswith('"') else column
+
+
+def _summary_bytes(snapshot: Any) -> int | None:
+    summary = getattr(snapshot, "summary", None)
+    value = summary.get("total-files-size") if summary is not None else None
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _planned_bytes(
+    table: "Table",
+    snapshot_id: int,
+    row_filter: str | None,
+    field_ids: Sequence[int] | None = None,
+) -> int | None:
+    try:
+        if row_filter is None:
+            scan = table.scan(snapshot_id=snapshot_id)
+        else:
+            scan = table.scan(row_filter=row_filter, snapshot_id=snapshot_id)
+        total = 0
+        for task in scan.plan_files():
+            column_sizes = getattr(task.file, "column_sizes", None) if field_ids else None
+            if column_sizes:
+                total += sum(column_sizes.get(field_id, 0) for field_id in field_ids)
+            else:
+                total += task.file.file_size_in_bytes
+            total += sum(delete.file_size_in_bytes for delete in getattr(task, "delete_files", ()) or ())
+        return total
+    except Exception:  # pragma: no cover - fall back to the unfiltered summary
+        LOGGER.debug("Could not plan filtered scan with %r", row_filter, exc_info=True)
+        return None
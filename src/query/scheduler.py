@@ -0,0 +1,198 @@
+"""Local fair-share admission control in front of the query engine."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Generator, Mapping
+
+from .engine import QueryError
+
+DEFAULT_PLAN_WEIGHTS: Mapping[str, float] = {
+    "starter": 1.0,
+    "pro": 2.0,
+    "enterprise": 4.0,
+}
+
+
+@dataclass(frozen=True)
+class AdmissionTicket:
+    """Proof that a query was admitted, with the time it spent queued."""
+
+    client_id: str
+    weight: float
+    queued_at: float
+    admitted_at: float
+
+    @property
+    def queue_ms(self) -> float:
+        return (self.admitted_at - self.queued_at) * 1000.0
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    """Point-in-time view of the scheduler's state."""
+
+    running: int
+    queued: int
+    queued_by_client: Mapping[str, int]
+
+
+@dataclass(eq=False)
+class _Waiter:
+    client_id: str
+    weight: float
+    tag: float
+    queued_at: float
+    admitted_at: float | None = None
+
+
+@dataclass
+class _ClientQueue:
+    waiters: Deque[_Waiter] = field(default_factory=deque)
+    last_tag: float = 0.0
+    running: int = 0
+
+
+class FairShareScheduler:
+    """Admit queries under a global concurrency limit with weighted fair sharing.
+
+    Each client has its own FIFO queue. Queued requests receive a virtual finish tag
+    of ``max(virtual_time, client's last tag) + 1 / weight`` and the request with the
+    smallest tag is admitted whenever a slot frees up, so backlogged clients receive
+    capacity in proportion to their plan weight and idle clients cannot bank credit.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 8,
+        max_queued_per_client: int = 64,
+        queue_timeout_s: float = 30.0,
+        plan_weights: Mapping[str, float] | None = None,
+        default_weight: float = 1.0,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self._max_concurrency = max_concurrency
+        self._max_queued_per_client = max_queued_per_client
+        self._queue_timeout_s = queue_timeout_s
+        self._plan_weights = dict(plan_weights if plan_weights is not None else DEFAULT_PLAN_WEIGHTS)
+        self._default_weight = default_weight
+        self._clock = clock or time.monotonic
+        self._condition = threading.Condition()
+        self._clients: Dict[str, _ClientQueue] = {}
+        self._running = 0
+        self._virtual_time = 0.0
+
+    def weight_for(self, plan_id: str | None) -> float:
+        if plan_id is None:
+            return self._default_weight
+        return self._plan_weights.get(plan_id, self._default_weight)
+
+    @contextmanager
+    def admit(
+        self,
+        client_id: str,
+        *,
+        plan_id: str | None = None,
+        interrupted: threading.Event | None = None,
+    ) -> Generator[AdmissionTicket, None, None]:
+        """Block until the query may run and hold its slot for the ``with`` body."""
+
+        ticket = self.acquire(client_id, plan_id=plan_id, interrupted=interrupted)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def acquire(
+        self,
+        client_id: str,
+        *,
+        plan_id: str | None = None,
+        interrupted: threading.Event | None = None,
+    ) -> AdmissionTicket:
+        """Queue for a slot; setting ``interrupted`` and calling :meth:`wake` abandons the wait."""
+
+        weight = self.weight_for(plan_id)
+        queued_at = self._clock()
+        deadline = time.monotonic() + self._queue_timeout_s
+        with self._condition:
+            client = self._clients.setdefault(client_id, _ClientQueue())
+            if len(client.waiters) >= self._max_queued_per_client:
+                raise QueryError("queue_full", f"Too many queued queries for client {client_id}")
+            client.last_tag = max(self._virtual_time, client.last_tag) + 1.0 / weight
+            waiter = _Waiter(client_id=client_id, weight=weight, tag=client.last_tag, queued_at=queued_at)
+            client.waiters.append(waiter)
+            self._dispatch()
+            while waiter.admitted_at is None:
+                if interrupted is not None and interrupted.is_set():
+                    client.waiters.remove(waiter)
+                    self._forget_if_idle(client_id)
+                    raise QueryError("query_cancelled", "Query was cancelled while queued")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    client.waiters.remove(waiter)
+                    self._forget_if_idle(client_id)
+                    raise QueryError(
+                        "queue_timeout",
+                        f"Query was not admitted within {self._queue_timeout_s:.0f}s",
+                    )
+                self._condition.wait(remaining)
+        return AdmissionTicket(
+            client_id=client_id,
+            weight=weight,
+            queued_at=queued_at,
+            admitted_at=waiter.admitted_at,
+        )
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        with self._condition:
+            self._running -= 1
+            client = self._clients.get(ticket.client_id)
+            if client is not None:
+                client.running -= 1
+                self._forget_if_idle(ticket.client_id)
+            self._dispatch()
+
+    def wake(self) -> None:
+        """Wake queued requests so they re-check their ``interrupted`` event."""
+
+        with self._condition:
+            self._condition.notify_all()
+
+    def stats(self) -> SchedulerStats:
+        with self._condition:
+            queued = {client_id: len(client.waiters) for client_id, client in self._clients.items() if client.waiters}
+            return SchedulerStats(running=self._running, queued=sum(queued.values()), queued_by_client=queued)
+
+    # Internal helpers -------------------------------------------------
+
+    def _dispatch(self) -> None:
+        admitted = False
+        while self._running < self._max_concurrency:
+            head: _Waiter | None = None
+            for client in self._clients.values():
+                if client.waiters and (head is None or client.waiters[0].tag < head.tag):
+                    head = client.waiters[0]
+            if head is None:
+                break
+            client = self._clients[head.client_id]
+            client.waiters.popleft()
+            client.running += 1
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, head.tag - 1.0 / head.weight)
+            head.admitted_at = self._clock()
+            admitted = True
+        if admitted:
+            self._condition.notify_all()
+
+    def _forget_if_idle(self, client_id: str) -> None:
+        client = self._clients.get(client_id)
+        if client is not None and not client.waiters and client.running <= 0 and client.last_tag <= self._virtual_time:
+            del self._clients[client_id]
@@ -3,36 +3,39 @@
 from __future__ import annotations
 
 import logging
+import sys
+import threading
 import uuid
-from dataclasses import dataclass
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
-from typing import Callable, Sequence
+from typing import Callable, Dict, Mapping, Sequence
 
 from api.entitlements import EntitlementError, EntitlementService, QueryExecutionStats
 
+from .cache import QueryResultCache, ResultCacheKey, SnapshotResolver, freeze_parameters
+from .coalesce import FlightAbandoned, InFlightQuery, QueryCoalescer
 from .engine import QueryEngine, QueryError
 from .history import QueryHistoryEntry, QueryHistoryStore
-from .models import QueryRequest, QueryResult, QueryStatistics
+from .models import QueryRequest, QueryResult, QueryResultStream, QueryStatistics, StreamCloseCallback
+from .scheduler import FairShareScheduler
+from .sql import extract_tables, is_cacheable, is_read_only, normalize_sql
 
 LOGGER = logging.getLogger(__name__)
 
+STATUS_CANCELLED = "CANCELLED"
+STATUS_TIMED_OUT = "TIMED_OUT"
 
-@dataclass(frozen=True)
-class _TablesExtractor:
-    """Utility that extracts candidate table identifiers from SQL statements."""
 
-    keywords: Sequence[str] = ("from", "join", "into")
+@dataclass
+class _RunningQuery:
+    """Book-keeping for an in-flight query that may be interrupted."""
 
-    def __call__(self, statement: str) -> Sequence[str]:
-        tokens = statement.split()
-        found: set[str] = set()
-        lowered = [token.strip("`,") for token in tokens]
-        for index, token in enumerate(lowered[:-1]):
-            if token.lower() in self.keywords:
-                candidate = lowered[index + 1]
-                if candidate:
-                    found.add(candidate)
-        return tuple(sorted(found))
+    client_id: str
+    outcome: str | None = None
+    stream: QueryResultStream | None = None
+    timer: threading.Timer | None = None
+    interrupted: threading.Event = field(default_factory=threading.Event)
 
 
 class QueryService:
@@ -47,13 +50,25 @@ class QueryService:
         cost_per_mb: float = 0.00045,
         clock: Callable[[], datetime] | None = None,
         table_extractor: Callable[[str], Sequence[str]] | None = None,
+        result_cache: QueryResultCache | None = None,
+        snapshot_resolver: SnapshotResolver | None = None,
+        scheduler: FairShareScheduler | None = None,
+        coalescer: QueryCoalescer | None = None,
+        scan_estimator: Callable[[QueryRequest], float | None] | None = None,
     ) -> None:
         self._engine = engine
         self._entitlements = entitlement_service
         self._history_store = history_store
         self._cost_per_mb = cost_per_mb
         self._clock = clock or (lambda: datetime.now(timezone.utc))
-        self._extract_tables = table_extractor or _TablesExtractor()
+        self._extract_tables = table_extractor or extract_tables
+        self._result_cache = result_cache
+        self._resolve_snapshots = snapshot_resolver
+        self._scheduler = scheduler
+        self._coalescer = coalescer
+        self._estimate_scan = scan_estimator
+        self._running: Dict[str, _RunningQuery] = {}
+        self._running_lock = threading.Lock()
 
     @property
     def history_store(self) -> QueryHistoryStore:
@@ -61,29 +76,136 @@ class QueryService:
 
         return self._history_store
 
-    def execute(self, request: QueryRequest) -> QueryResult:
-        """Execute ``request`` and record the outcome."""
+    @property
+    def result_cache(self) -> QueryResultCache | None:
+        return self._result_cache
+
+    def cancel(self, query_id: str, *, client_id: str | None = None) -> bool:
+        """Interrupt the running query ``query_id``; returns ``False`` if it is not running.
+
+        With ``client_id`` only a query submitted by that client is interrupted.
+        """
+
+        return self._interrupt(query_id, STATUS_CANCELLED, client_id=client_id)
+
+    def execute(self, request: QueryRequest, *, query_id: str | None = None) -> QueryResult:
+        """Execute ``request`` and record the outcome under ``query_id``.
+
+        Streaming results hold the entitlement context open until the returned
+        :class:`~query.models.QueryResultStream` finishes; usage and history are
+        recorded at that point. Results served from the result cache skip the
+        concurrency slot but still pass the rate limiter and the daily query
+        allotment, and are counted with zero scan cost.
+
+        The query is interrupted once the shorter of ``request.timeout_ms`` and the
+        plan's ``query_timeout_ms`` elapses (time spent queued in the scheduler
+        included), or when :meth:`cancel` is called, and
+        is recorded with a ``TIMED_OUT`` or ``CANCELLED`` status. A ``query_id``
+        that is already running is rejected with ``duplicate_query_id``.
+
+        With a :class:`~query.coalesce.QueryCoalescer`, identical read-only requests
+        arriving while one is running wait for its result instead of executing; each
+        still gets its own history entry, is billed per the coalescer's policy and
+        can be timed out or cancelled like any other query.
+
+        With a ``scan_estimator`` (such as :class:`~query.planning.IcebergScanPlanner`)
+        the daily scan precheck uses the server-side estimate whenever it exceeds
+        the one supplied by the client.
+        """
 
         if not request.sql.strip():
             raise QueryError("empty_statement", "A SQL statement must be provided")
 
         started_at = self._clock()
-        query_id = uuid.uuid4().hex
+        query_id = query_id or request.query_id or uuid.uuid4().hex
+        request = replace(request, query_id=query_id)
         status = "FAILED"
         error_message: str | None = None
         result: QueryResult | None = None
         stats: QueryStatistics | None = None
         tables = self._extract_tables(request.sql)
         entitlements = None
+        scope = ExitStack()
+        running = self._register(query_id, request.client_id)
 
         try:
-            with self._entitlements.query_context(
-                request.client_id,
-                estimated_scan_mb=request.estimated_scan_mb or 0.0,
-            ) as entitlements:
+            cache_key, snapshots = self._cache_lookup(request, tables)
+            if cache_key is not None:
+                cached = self._result_cache.get(cache_key, snapshots)
+                if cached is not None:
+                    self._unregister(query_id)
+                    return self._serve_cached(query_id, request, tables, started_at, cached)
+
+            flight_key, flight, leader = self._join_flight(request, query_id)
+        except BaseException:
+            self._unregister(query_id)
+            raise
+        try:
+            while flight is not None and not leader:
+                shared = self._follow_flight(flight, query_id, request, tables, started_at, running)
+                if shared is not None:
+                    self._unregister(query_id)
+                    return shared
+                # The leader was cancelled or timed out: run the query again, perhaps as the new leader.
+                flight_key, flight, leader = self._join_flight(request, query_id)
+        except BaseException:
+            self._unregister(query_id)
+            raise
+
+        try:
+            with scope:
+                estimated_scan_mb = self._estimated_scan_mb(request)
+                # Queue before taking a concurrency slot, with the timeout already running.
+                plan = self._plan_entitlements(request)
+                self._start_timer(query_id, running, self._timeout_ms(request, plan))
+                ticket = None
+                if self._scheduler is not None:
+                    ticket = scope.enter_context(
+                        self._scheduler.admit(
+                            request.client_id,
+                            plan_id=getattr(plan, "plan_id", None),
+                            interrupted=running.interrupted,
+                        )
+                    )
+                entitlements = scope.enter_context(
+                    self._entitlements.query_context(request.client_id, estimated_scan_mb=estimated_scan_mb)
+                )
+                self._start_timer(query_id, running, self._timeout_ms(request, entitlements))
+                self._raise_if_interrupted(running)
                 result = self._engine.execute(request)
+                stream = result.stream
+                if ticket is not None:
+                    result = self._with_queue_time(result, ticket.queue_ms)
+                if stream is not None:
+                    stream.add_close_callback(
+                        self._stream_finalizer(
+                            query_id,
+                            request,
+                            tables,
+                            started_at,
+                            result,
+                            entitlements,
+                            scope.pop_all(),
+                            running,
+                            estimated_scan_mb,
+                        )
+                    )
+                    with self._running_lock:
+                        running.stream = stream
+                    if running.outcome is not None:
+                        stream.interrupt(self._interruption_error(running.outcome))
+                    status = "STREAMING"
+                    return result
+                self._raise_if_interrupted(running)
                 stats = result.stats
+                if flight is not None:
+                    participants = self._coalescer.seal(flight_key, flight, entitlements=entitlements)
+                    stats = self._coalescer.billed_stats(stats, participants, leader=True)
                 self._record_usage(request.client_id, stats, result, entitlements)
+            if cache_key is not None:
+                self._result_cache.put(cache_key, result, snapshots=snapshots, tables=tables)
+            if flight is not None:
+                self._coalescer.resolve(flight_key, flight, result)
             status = "SUCCEEDED"
             return result
         except EntitlementError as exc:
@@ -91,6 +213,14 @@ class QueryService:
             LOGGER.warning("Entitlement enforcement failed for client %s", request.client_id, exc_info=exc)
             raise
         except QueryError as exc:
+            if running.outcome is not None:
+                status = running.outcome
+                interruption = self._interruption_error(running.outcome)
+                error_message = interruption.message
+                LOGGER.info("Query %s for client %s was interrupted: %s", query_id, request.client_id, status)
+                if exc.code == interruption.code:
+                    raise
+                raise interruption from exc
             error_message = exc.message
             LOGGER.error("Query engine reported failure for client %s", request.client_id, exc_info=exc)
             raise
@@ -99,35 +229,336 @@ class QueryService:
             LOGGER.exception("Unexpected failure while executing query for client %s", request.client_id)
             raise QueryError("internal_error", "Query execution failed") from exc
         finally:
-            finished_at = self._clock()
-            elapsed_ms = self._resolve_elapsed(stats, started_at, finished_at)
-            data_scanned = self._resolve_scan(stats)
-            row_count = self._resolve_rows(stats, result)
-            cost = self._estimate_cost(data_scanned)
-
-            entry = QueryHistoryEntry(
-                query_id=query_id,
-                client_id=request.client_id,
-                statement=request.sql,
-                status=status,
-                submitted_at=started_at,
-                completed_at=finished_at if status == "SUCCEEDED" or error_message else None,
-                elapsed_ms=elapsed_ms,
-                data_scanned_mb=data_scanned,
-                row_count=row_count,
-                cost_usd=cost,
-                error_message=error_message,
-                tables=tables,
-                snapshot_id=request.snapshot_id,
-                as_of_timestamp=request.as_of_timestamp,
+            if flight is not None and not flight.done:
+                failure = sys.exc_info()[1] or QueryError("internal_error", "Query execution failed")
+                # A leader's own cancellation or timeout is not shared with its followers.
+                self._coalescer.reject(flight_key, flight, failure, abandoned=running.outcome is not None)
+            if status != "STREAMING":
+                self._unregister(query_id)
+                self._append_history(query_id, request, tables, started_at, status, error_message, stats, result)
+
+    # Internal helpers -------------------------------------------------
+
+    def _join_flight(
+        self,
+        request: QueryRequest,
+        query_id: str,
+    ) -> tuple[ResultCacheKey | None, InFlightQuery | None, bool]:
+        if self._coalescer is None or request.stream or not is_read_only(request.sql):
+            return None, None, False
+        key = self._request_key(request)
+        if key is None:
+            return None, None, False
+        flight, leader = self._coalescer.join(key, query_id)
+        return key, flight, leader
+
+    def _follow_flight(
+        self,
+        flight: InFlightQuery,
+        query_id: str,
+        request: QueryRequest,
+        tables: Sequence[str],
+        started_at: datetime,
+        running: _RunningQuery,
+    ) -> QueryResult | None:
+        """Wait for the leader's result; ``None`` means the leader was interrupted and the query must run again."""
+
+        status: str | None = "FAILED"
+        error_message: str | None = None
+        stats: QueryStatistics | None = None
+        result: QueryResult | None = None
+        try:
+            # Followers never admit through the entitlement service, so look the plan up for its timeout.
+            self._start_timer(query_id, running, self._timeout_ms(request, self._plan_entitlements(request, flight)))
+            try:
+                shared = flight.wait(interrupted=running.interrupted)
+            except FlightAbandoned as exc:
+                if running.outcome is not None:
+                    raise self._interruption_error(running.outcome) from exc
+                status = None
+                return None
+            except QueryError as exc:
+                if running.outcome is None:
+                    raise
+                raise self._interruption_error(running.outcome) from exc
+            details = {**((shared.stats.engine_details if shared.stats else None) or {})}
+            details["coalesced_with"] = flight.leader_query_id
+            result = replace(shared, stats=replace(shared.stats or QueryStatistics(), engine_details=details))
+            billed = self._coalescer.billed_stats(result.stats, flight.participants, leader=False)
+            if billed is not None:
+                self._record_usage(request.client_id, billed, result, flight.entitlements)
+                stats = billed
+            else:
+                stats = replace(result.stats, data_scanned_mb=0.0)
+            status = "SUCCEEDED"
+            return result
+        except (EntitlementError, QueryError) as exc:
+            if running.outcome is not None:
+                status = running.outcome
+            elif isinstance(exc, QueryError) and exc.code == "query_timeout":
+                status = STATUS_TIMED_OUT
+            error_message = exc.message if isinstance(exc, QueryError) else str(exc)
+            LOGGER.info("Coalesced query %s for client %s failed: %s", query_id, request.client_id, error_message)
+            raise
+        finally:
+            if status is not None:
+                self._append_history(query_id, request, tables, started_at, status, error_message, stats, result)
+
+    def _plan_entitlements(self, request: QueryRequest, flight: InFlightQuery | None = None):
+        """The client's plan before admission (cached by the entitlement service), or ``None``."""
+
+        if flight is not None and flight.entitlements is not None:
+            return flight.entitlements
+        get_entitlements = getattr(self._entitlements, "get_entitlements", None)
+        if get_entitlements is None:
+            return None
+        try:
+            return get_entitlements(request.client_id)
+        except Exception as exc:  # pragma: no cover - the leader still enforces the plan timeout
+            LOGGER.warning("Unable to load entitlements for client %s", request.client_id, exc_info=exc)
+            return None
+
+    def _register(self, query_id: str, client_id: str) -> _RunningQuery:
+        running = _RunningQuery(client_id=client_id)
+        with self._running_lock:
+            if query_id in self._running:
+                raise QueryError("duplicate_query_id", f"Query {query_id} is already running")
+            self._running[query_id] = running
+        return running
+
+    def _unregister(self, query_id: str) -> None:
+        with self._running_lock:
+            running = self._running.pop(query_id, None)
+        if running is not None and running.timer is not None:
+            running.timer.cancel()
+
+    def _estimated_scan_mb(self, request: QueryRequest) -> float:
+        """The larger of the client's and the server's scan estimate."""
+
+        estimate = request.estimated_scan_mb or 0.0
+        if self._estimate_scan is not None:
+            try:
+                estimate = max(estimate, self._estimate_scan(request) or 0.0)
+            except Exception:  # pragma: no cover - estimation is best effort
+                LOGGER.warning("Scan estimation failed for client %s", request.client_id, exc_info=True)
+        return estimate
+
+    @staticmethod
+    def _timeout_ms(request: QueryRequest, entitlements) -> int | None:
+        limits = [
+            value
+            for value in (request.timeout_ms, getattr(entitlements, "query_timeout_ms", None))
+            if isinstance(value, (int, float)) and value > 0
+        ]
+        return int(min(limits)) if limits else None
+
+    def _start_timer(self, query_id: str, running: _RunningQuery, timeout_ms: int | None) -> None:
+        if timeout_ms is None or running.timer is not None:
+            return  # the timer started before queueing (or while following a leader) keeps running
+        timer = threading.Timer(timeout_ms / 1000.0, self._interrupt, args=(query_id, STATUS_TIMED_OUT))
+        timer.daemon = True
+        running.timer = timer
+        timer.start()
+
+    def _interrupt(self, query_id: str, outcome: str, *, client_id: str | None = None) -> bool:
+        with self._running_lock:
+            running = self._running.get(query_id)
+            if running is None or running.outcome is not None:
+                return False
+            if client_id is not None and running.client_id != client_id:
+                return False
+            running.outcome = outcome
+            running.interrupted.set()
+            stream = running.stream
+        if stream is not None:
+            stream.interrupt(self._interruption_error(outcome))
+        if self._scheduler is not None:
+            self._scheduler.wake()
+        cancel = getattr(self._engine, "cancel", None)
+        if cancel is not None:
+            try:
+                cancel(query_id)
+            except Exception as exc:  # pragma: no cover - interruption is best effort
+                LOGGER.warning("Failed to interrupt query %s", query_id, exc_info=exc)
+        return True
+
+    def _raise_if_interrupted(self, running: _RunningQuery) -> None:
+        if running.outcome is not None:
+            raise self._interruption_error(running.outcome)
+
+    @staticmethod
+    def _interruption_error(outcome: str) -> QueryError:
+        if outcome == STATUS_TIMED_OUT:
+            return QueryError("query_timeout", "Query exceeded its time limit")
+        return QueryError("query_cancelled", "Query was cancelled")
+
+    @staticmethod
+    def _with_queue_time(result: QueryResult, queue_ms: float) -> QueryResult:
+        stream = result.stream
+        if stream is not None:
+            stream.update_stats(queue_ms=queue_ms)
+            return result
+        return replace(result, stats=replace(result.stats or QueryStatistics(), queue_ms=queue_ms))
+
+    def _cache_lookup(
+        self,
+        request: QueryRequest,
+        tables: Sequence[str],
+    ) -> tuple[ResultCacheKey | None, Mapping[str, str]]:
+        # Statements without catalog tables, or with table or volatile functions, have
+        # no snapshot that could invalidate their result.
+        if self._result_cache is None or request.stream or not tables or not is_cacheable(request.sql):
+            return None, {}
+        pinned = request.snapshot_id is not None or (
+            request.as_of_timestamp is not None and request.as_of_timestamp <= self._clock()
+        )
+        snapshots: Mapping[str, str] = {}
+        if not pinned:
+            if self._resolve_snapshots is None:
+                return None, {}
+            try:
+                snapshots = dict(self._resolve_snapshots(request.client_id, tables))
+            except Exception as exc:  # pragma: no cover - cache lookups are best effort
+                LOGGER.warning("Unable to resolve table snapshots for client %s", request.client_id, exc_info=exc)
+                return None, {}
+        key = self._request_key(request)
+        if key is None:
+            return None, {}
+        return key, snapshots
+
+    @staticmethod
+    def _request_key(request: QueryRequest) -> ResultCacheKey | None:
+        try:
+            parameters = freeze_parameters(request.parameters)
+        except TypeError:
+            return None
+        return ResultCacheKey(
+            client_id=request.client_id,
+            statement=normalize_sql(request.sql),
+            limit=request.limit,
+            snapshot_id=request.snapshot_id,
+            as_of_timestamp=request.as_of_timestamp,
+            result_format=request.result_format,
+            parameters=parameters,
+        )
+
+    def _serve_cached(
+        self,
+        query_id: str,
+        request: QueryRequest,
+        tables: Sequence[str],
+        started_at: datetime,
+        cached: QueryResult,
+    ) -> QueryResult:
+        base = cached.stats or QueryStatistics(row_count=cached.row_count)
+        stats = replace(
+            base,
+            elapsed_ms=None,
+            data_scanned_mb=0.0,
+            engine_details={**(base.engine_details or {}), "cache": "hit"},
+        )
+        result = replace(cached, stats=stats)
+        try:
+            # Hits skip the concurrency slot but still count against the plan and the rate limit.
+            self._entitlements.admit_cached_query(
+                request.client_id,
+                QueryExecutionStats(data_scanned_mb=0.0, result_rows=int(self._resolve_rows(stats, result) or 0)),
             )
+        except EntitlementError as exc:
+            LOGGER.warning("Entitlement enforcement failed for client %s", request.client_id, exc_info=exc)
+            self._append_history(query_id, request, tables, started_at, "FAILED", str(exc), None, None)
+            raise
+        entry = self._append_history(
+            query_id, request, tables, started_at, "SUCCEEDED", None, stats, result, cache_hit=True
+        )
+        return replace(result, stats=replace(stats, elapsed_ms=entry.elapsed_ms))
 
+    def _stream_finalizer(
+        self,
+        query_id: str,
+        request: QueryRequest,
+        tables: Sequence[str],
+        started_at: datetime,
+        result: QueryResult,
+        entitlements,
+        scope: ExitStack,
+        running: _RunningQuery,
+        estimated_scan_mb: float,
+    ) -> StreamCloseCallback:
+        def _finalize(stream: QueryResultStream, error: BaseException | None) -> None:
+            self._unregister(query_id)
+            status = "SUCCEEDED" if stream.completed else STATUS_CANCELLED
+            error_message: str | None = None
+            if running.outcome is not None and not stream.completed:
+                status = running.outcome
+                error_message = self._interruption_error(running.outcome).message
+            elif error is not None:
+                status = "FAILED"
+                error_message = error.message if isinstance(error, QueryError) else str(error)
+            elif not stream.completed:
+                error_message = "Result stream closed before completion"
+            stats = stream.stats
+            if stats is None or stats.data_scanned_mb is None:
+                # Streams closed early cannot report their scan; bill the precheck estimate instead.
+                base = stats or QueryStatistics(row_count=stream.row_count)
+                stats = replace(
+                    base,
+                    data_scanned_mb=estimated_scan_mb,
+                    engine_details={**(base.engine_details or {}), "data_scanned": "estimated"},
+                )
             try:
-                self._history_store.append(entry)
-            except Exception as exc:  # pragma: no cover - defensive logging
-                LOGGER.error("Failed to persist query history entry", exc_info=exc)
+                with scope:
+                    self._record_usage(request.client_id, stats, result, entitlements)
+            except Exception as exc:
+                status = "FAILED"
+                error_message = error_message or str(exc)
+                LOGGER.warning("Failed to finalise streamed query for client %s", request.client_id, exc_info=exc)
+            self._append_history(query_id, request, tables, started_at, status, error_message, stats, result)
 
-    # Internal helpers -------------------------------------------------
+        return _finalize
+
+    def _append_history(
+        self,
+        query_id: str,
+        request: QueryRequest,
+        tables: Sequence[str],
+        started_at: datetime,
+        status: str,
+        error_message: str | None,
+        stats: QueryStatistics | None,
+        result: QueryResult | None,
+        *,
+        cache_hit: bool = False,
+    ) -> QueryHistoryEntry:
+        finished_at = self._clock()
+        elapsed_ms = self._resolve_elapsed(stats, started_at, finished_at)
+        data_scanned = self._resolve_scan(stats)
+        row_count = self._resolve_rows(stats, result)
+        cost = self._estimate_cost(data_scanned)
+
+        entry = QueryHistoryEntry(
+            query_id=query_id,
+            client_id=request.client_id,
+            statement=request.sql,
+            status=status,
+            submitted_at=started_at,
+            completed_at=finished_at if status == "SUCCEEDED" or error_message else None,
+            elapsed_ms=elapsed_ms,
+            data_scanned_mb=data_scanned,
+            row_count=row_count,
+            cost_usd=cost,
+            error_message=error_message,
+            tables=tables,
+            snapshot_id=request.snapshot_id,
+            as_of_timestamp=request.as_of_timestamp,
+            cache_hit=cache_hit,
+        )
+
+        try:
+            self._history_store.append(entry)
+        except Exception as exc:  # pragma: no cover - defensive logging
+            LOGGER.error("Failed to persist query history entry", exc_info=exc)
+        return entry
 
     def _record_usage(
         self,
@@ -150,11 +581,8 @@ class QueryService:
     def _resolve_rows(self, stats: QueryStatistics | None, result: QueryResult | None) -> int | None:
         if stats and stats.row_count is not None:
             return stats.row_count
-        if result and result.rows is not None:
-            try:
-                return len(result.rows)
-            except TypeError:  # pragma: no cover - best effort for iterables
-                return None
+        if result is not None:
+            return result.row_count
         return None
 
     def _resolve_scan(self, stats: QueryStatistics | None) -> float | None:
@@ -0,0 +1,588 @@
+"""Lightweight SQL text helpers shared by the query service."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+def normalize_sql(statement: str) -> str:
+    """Return ``statement`` with insignificant whitespace and trailing semicolons removed.
+
+    Whitespace runs outside of string literals and quoted identifiers collapse to a
+    single space so that reformatted copies of the same statement compare equal.
+    Letter case is preserved because it is significant inside literals.
+    """
+
+    output: list[str] = []
+    quote: str | None = None
+    pending_space = False
+    for char in statement.strip():
+        if quote is not None:
+            output.append(char)
+            if char == quote:
+                quote = None
+            continue
+        if char.isspace():
+            pending_space = True
+            continue
+        if pending_space and output:
+            output.append(" ")
+        pending_space = False
+        if char in ("'", '"', "`"):
+            quote = char
+        output.append(char)
+    return "".join(output).rstrip("; ")
+
+
+_READ_ONLY_KEYWORDS = frozenset({"select", "with", "from", "values", "table", "show", "describe", "summarize"})
+
+
+def leading_keyword(statement: str) -> str:
+    """Return the lower-cased first keyword of ``statement``, skipping comments and parentheses."""
+
+    text = statement.lstrip()
+    while True:
+        if text.startswith("--"):
+            newline = text.find("\n")
+            text = "" if newline == -1 else text[newline + 1 :].lstrip()
+        elif text.startswith("/*"):
+            end = text.find("*/")
+            text = "" if end == -1 else text[end + 2 :].lstrip()
+        elif text.startswith("("):
+            text = text[1:].lstrip()
+        else:
+            break
+    keyword = []
+    for char in text:
+        if not (char.isalnum() or char == "_"):
+            break
+        keyword.append(char)
+    return "".join(keyword).lower()
+
+
+def is_read_only(statement: str) -> bool:
+    """Return ``True`` when ``statement`` is a single statement that cannot modify data.
+
+    The statement must start with a read-only keyword, and so must the body of
+    every CTE and the statement a ``WITH`` clause feeds into. Statements that
+    mention a write keyword anywhere are rejected as well.
+    """
+
+    tokens = tokenize(statement)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if any(token.text == ";" for token in tokens):
+        return False
+    return _reads_only(tokens, 0, len(tokens))
+
+
+def is_cacheable(statement: str) -> bool:
+    """Return ``True`` when the result of ``statement`` only depends on the catalog tables it reads."""
+
+    if not is_read_only(statement):
+        return False
+    analysis = analyze_sql(statement)
+    return bool(analysis.tables) and analysis.is_deterministic
+
+
+TOKEN_WORD = "word"
+TOKEN_QUOTED = "quoted"
+TOKEN_STRING = "string"
+TOKEN_NUMBER = "number"
+TOKEN_PARAMETER = "parameter"
+TOKEN_SYMBOL = "symbol"
+
+
+@dataclass(frozen=True)
+class SqlToken:
+    """A lexical token of a SQL statement with its offsets in the source text."""
+
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def value(self) -> str:
+        """Identifier text with quoting removed; keywords are lower-cased."""
+
+        if self.kind == TOKEN_QUOTED:
+            return self.text[1:-1].replace(self.text[0] * 2, self.text[0])
+        if self.kind == TOKEN_WORD:
+            return self.text.lower()
+        return self.text
+
+
+_MULTI_CHAR_SYMBOLS = ("<=", ">=", "<>", "!=", "||", "::", "->", ":=", "=>", "**")
+
+
+def tokenize(statement: str) -> list[SqlToken]:
+    """Split ``statement`` into tokens, dropping whitespace and comments."""
+
+    tokens: list[SqlToken] = []
+    index = 0
+    length = len(statement)
+    while index < length:
+        char = statement[index]
+        if char.isspace():
+            index += 1
+        elif statement.startswith("--", index):
+            newline = statement.find("\n", index)
+            index = length if newline == -1 else newline + 1
+        elif statement.startswith("/*", index):
+            end = statement.find("*/", index + 2)
+            index = length if end == -1 else end + 2
+        elif char in ("'", '"', "`"):
+            end = index + 1
+            while end < length:
+                if statement[end] == char:
+                    if end + 1 < length and statement[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            end = min(end + 1, length)
+            kind = TOKEN_STRING if char == "'" else TOKEN_QUOTED
+            tokens.append(SqlToken(kind, statement[index:end], index, end))
+            index = end
+        elif char.isalpha() or char == "_":
+            end = index + 1
+            while end < length and (statement[end].isalnum() or statement[end] in "_$"):
+                end += 1
+            tokens.append(SqlToken(TOKEN_WORD, statement[index:end], index, end))
+            index = end
+        elif char.isdigit() or (char == "." and index + 1 < length and statement[index + 1].isdigit()):
+            end = index + 1
+            while end < length and (statement[end].isalnum() or statement[end] in "._"):
+                end += 1
+            tokens.append(SqlToken(TOKEN_NUMBER, statement[index:end], index, end))
+            index = end
+        elif char in "?$":
+            end = index + 1
+            while end < length and (statement[end].isalnum() or statement[end] == "_"):
+                end += 1
+            tokens.append(SqlToken(TOKEN_PARAMETER, statement[index:end], index, end))
+            index = end
+        else:
+            symbol = next((candidate for candidate in _MULTI_CHAR_SYMBOLS if statement.startswith(candidate, index)), char)
+            tokens.append(SqlToken(TOKEN_SYMBOL, symbol, index, index + len(symbol)))
+            index += len(symbol)
+    return tokens
+
+
+@dataclass(frozen=True)
+class SqlAnalysis:
+    """Tables, columns and predicates referenced by a SQL statement."""
+
+    tables: tuple[str, ...]
+    columns: tuple[str, ...]
+    predicates: tuple[str, ...]
+    ctes: tuple[str, ...] = ()
+    functions: tuple[str, ...] = ()
+    table_functions: tuple[str, ...] = ()
+
+    @property
+    def is_deterministic(self) -> bool:
+        """``False`` when the statement reads table functions or calls volatile functions."""
+
+        return not self.table_functions and not any(_is_volatile(name) for name in self.functions)
+
+
+def analyze_sql(statement: str) -> SqlAnalysis:
+    """Return the tables, columns and predicates referenced by ``statement``.
+
+    Results are memoised in an LRU keyed by the statement text, so repeated
+    dashboard queries are only tokenised once.
+    """
+
+    return _analyze_cached(statement)
+
+
+def extract_tables(statement: str) -> tuple[str, ...]:
+    """Return the tables read or written by ``statement``, excluding CTE names."""
+
+    return analyze_sql(statement).tables
+
+
+# Internal helpers -------------------------------------------------
+
+_TABLE_KEYWORDS = frozenset({"from", "join", "into", "update", "table"})
+_CLAUSE_KEYWORDS = frozenset(
+    {
+        "select", "from", "where", "group", "having", "order", "limit", "offset", "union", "intersect",
+        "except", "window", "qualify", "returning", "join", "on", "using", "inner", "left", "right",
+        "full", "cross", "natural", "outer", "lateral", "positional", "asof", "anti", "semi", "values",
+        "set", "fetch", "for", "into", "pivot", "unpivot", "sample", "tablesample", "as",
+    }
+)
+_FROM_ARGUMENT_FUNCTIONS = frozenset({"extract", "trim", "substring", "overlay", "position"})
+_PREDICATE_KEYWORDS = frozenset({"where", "having", "on", "qualify"})
+# Keywords ending a FROM clause; join conditions, samples and pivots keep it open.
+_FROM_END_KEYWORDS = frozenset(
+    {
+        "where", "group", "having", "order", "limit", "offset", "union", "intersect", "except", "window",
+        "qualify", "returning", "select", "values", "set", "fetch",
+    }
+)
+_SUBQUERY_KEYWORDS = frozenset({"select", "with", "values", "from", "table", "describe", "show", "summarize"})
+_RESERVED_WORDS = _CLAUSE_KEYWORDS | frozenset(
+    {
+        "all", "and", "any", "array", "asc", "between", "both", "by", "case", "cast", "collate", "create",
+        "current_date", "current_time", "current_timestamp", "date", "default", "delete", "desc", "distinct",
+        "do", "else", "end", "escape", "exists", "false", "filter", "first", "following", "glob", "ilike",
+        "in", "insert", "interval", "is", "isnull", "last", "leading", "like", "map", "not", "notnull",
+        "null", "nulls", "or", "over", "partition", "preceding", "range", "recursive", "rows", "similar",
+        "some", "struct", "then", "time", "timestamp", "to", "trailing", "true", "unbounded", "unique",
+        "update", "when", "with", "within", "describe", "show", "summarize", "table", "replace", "exclude",
+        "columns", "materialized", "ignore", "respect", "try_cast", "extract", "year", "month", "day",
+        "hour", "minute", "second", "at", "zone", "if", "by", "rollup", "cube", "grouping", "sets",
+    }
+)
+
+
+_WRITE_KEYWORDS = frozenset(
+    {"insert", "update", "delete", "create", "drop", "alter", "truncate", "attach", "detach", "pragma"}
+)
+_VOLATILE_FUNCTIONS = frozenset(
+    {
+        "now", "today", "random", "setseed", "uuid", "gen_random_uuid", "uuidv4", "uuidv7", "nextval",
+        "currval", "get_current_time", "get_current_timestamp", "transaction_timestamp", "localtime",
+        "localtimestamp", "txid_current", "getenv",
+    }
+)
+# Functions that are called without parentheses.
+_NILADIC_FUNCTIONS = frozenset(
+    {"current_date", "current_time", "current_timestamp", "localtime", "localtimestamp", "current_user"}
+)
+
+
+def _is_volatile(function: str) -> bool:
+    return function in _VOLATILE_FUNCTIONS or function.startswith(("current_", "get_current_"))
+
+
+def _reads_only(tokens: list[SqlToken], start: int, end: int) -> bool:
+    index = start
+    while index < end and tokens[index].text == "(":
+        index += 1
+    if index >= end or tokens[index].kind != TOKEN_WORD:
+        return False
+    if tokens[index].value != "with":
+        if tokens[index].value not in _READ_ONLY_KEYWORDS:
+            return False
+        return not any(
+            token.kind == TOKEN_WORD and token.value in _WRITE_KEYWORDS and tokens[position - 1].text != "."
+            for position, token in enumerate(tokens[index:end], start=index)
+        )
+    index += 1
+    if index < end and tokens[index].value == "recursive":
+        index += 1
+    while index < end:
+        # name [(columns)] AS [[NOT] MATERIALIZED] (body) [, ...] statement
+        index += 1
+        if index < end and tokens[index].text == "(":
+            index = _skip_group(tokens, index, end)
+        if index >= end or tokens[index].value != "as":
+            return False
+        index += 1
+        while index < end and tokens[index].value in ("not", "materialized"):
+            index += 1
+        if index >= end or tokens[index].text != "(":
+            return False
+        close = _skip_group(tokens, index, end)
+        if not _reads_only(tokens, index + 1, close - 1):
+            return False
+        index = close
+        if index < end and tokens[index].text == ",":
+            index += 1
+            continue
+        return _reads_only(tokens, index, end)
+    return False
+
+
+def _skip_group(tokens: list[SqlToken], index: int, end: int) -> int:
+    """Return the position just past the parenthesis group opening at ``index``."""
+
+    depth = 0
+    while index < end:
+        if tokens[index].text == "(":
+            depth += 1
+        elif tokens[index].text == ")":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    return index
+
+
+@lru_cache(maxsize=1024)
+def _analyze_cached(statement: str) -> SqlAnalysis:
+    return _Analyzer(statement).run()
+
+
+class _Analyzer:
+    def __init__(self, statement: str) -> None:
+        self._statement = statement
+        self._tokens = tokenize(statement)
+        self._tables: dict[str, None] = {}
+        self._ctes: dict[str, None] = {}
+        self._aliases: set[str] = set()
+        self._columns: dict[str, None] = {}
+        self._predicates: dict[str, None] = {}
+        self._functions: dict[str, None] = {}
+        self._table_functions: dict[str, None] = {}
+        self._continuations: set[int] = set()
+        self._join_groups: set[int] = set()
+        # Parenthesis depths whose FROM clause is still open, so a comma there starts another source.
+        self._from_depths: set[int] = set()
+
+    def run(self) -> SqlAnalysis:
+        tokens = self._tokens
+        index = 0
+        depth = 0
+        while index < len(tokens):
+            if index in self._continuations:
+                # Back after a parenthesised table source: read its alias.
+                self._continuations.discard(index)
+                index = self._skip_alias(index)
+                continue
+            token = tokens[index]
+            keyword = token.value if token.kind == TOKEN_WORD else None
+            if token.text == "(":
+                depth += 1
+                if index in self._join_groups:
+                    # ``(a JOIN b ON ...)`` is a table list of its own.
+                    self._from_depths.add(depth)
+                    index = self._read_table_source(index + 1)
+                    continue
+            elif token.text == ")":
+                self._from_depths = {level for level in self._from_depths if level < depth}
+                depth -= 1
+            elif token.text == ";":
+                self._from_depths.clear()
+            if keyword == "with" or (keyword is None and token.text == "," and self._in_cte_list(index)):
+                index = self._read_cte(index + 1)
+                continue
+            if token.text == "," and depth in self._from_depths:
+                index = self._read_table_source(index + 1)
+                continue
+            if keyword in _TABLE_KEYWORDS and self._introduces_table(index):
+                if keyword == "from":
+                    self._from_depths.add(depth)
+                index = self._read_table_source(index + 1, column_list=keyword == "into")
+                continue
+            if keyword in ("pivot", "unpivot") and depth in self._from_depths:
+                following = self._skip_parens(index + 1) if index + 1 < len(tokens) and tokens[index + 1].text == "(" else None
+                if following is not None:
+                    self._continuations.add(following)
+            if keyword in _FROM_END_KEYWORDS:
+                self._from_depths.discard(depth)
+            if keyword in _PREDICATE_KEYWORDS:
+                self._read_predicates(index + 1)
+            index += 1
+        self._collect_columns()
+        self._collect_functions()
+        ctes = {name.lower() for name in self._ctes}
+        tables = tuple(sorted(table for table in self._tables if table.lower() not in ctes))
+        return SqlAnalysis(
+            tables=tables,
+            columns=tuple(sorted(self._columns)),
+            predicates=tuple(self._predicates),
+            ctes=tuple(self._ctes),
+            functions=tuple(sorted(self._functions)),
+            table_functions=tuple(sorted(self._table_functions)),
+        )
+
+    def _introduces_table(self, index: int) -> bool:
+        keyword = self._tokens[index].value
+        if keyword == "table":
+            # ``TABLE name`` as a statement, not ``CREATE TABLE`` / ``INSERT INTO ... TABLE``.
+            return index == 0 or self._tokens[index - 1].text == "("
+        if keyword == "update":
+            return index == 0 or self._tokens[index - 1].value not in ("do", "for", "key", "on")
+        if keyword == "from":
+            return self._enclosing_function(index) not in _FROM_ARGUMENT_FUNCTIONS and (
+                index == 0 or self._tokens[index - 1].value != "distinct"
+            )
+        return True
+
+    def _enclosing_function(self, index: int) -> str | None:
+        depth = 0
+        while index > 0:
+            index -= 1
+            text = self._tokens[index].text
+            if text == ")":
+                depth += 1
+            elif text == "(":
+                if depth == 0:
+                    previous = self._tokens[index - 1] if index > 0 else None
+                    return previous.value if previous is not None and previous.kind == TOKEN_WORD else None
+                depth -= 1
+        return None
+
+    def _in_cte_list(self, index: int) -> bool:
+        # A comma directly after the closing parenthesis of a CTE body starts the next CTE.
+        return bool(self._ctes) and index > 0 and self._tokens[index - 1].text == ")" and self._cte_follows(index + 1)
+
+    def _cte_follows(self, index: int) -> bool:
+        tokens = self._tokens
+        _, position = self._read_name(index)
+        if position < len(tokens) and tokens[position].text == "(":
+            position = self._skip_parens(position)
+        return position < len(tokens) and tokens[position].value == "as"
+
+    def _read_cte(self, index: int) -> int:
+        tokens = self._tokens
+        if index < len(tokens) and tokens[index].value == "recursive":
+            index += 1
+        name, position = self._read_name(index)
+        if name is None:
+            return index
+        if position < len(tokens) and tokens[position].text == "(":
+            position = self._skip_parens(position)
+        if position < len(tokens) and tokens[position].value == "as":
+            self._ctes[name] = None
+            position += 1
+            while position < len(tokens) and tokens[position].value in ("not", "materialized"):
+                position += 1
+        return position
+
+    def _read_table_source(self, index: int, *, column_list: bool = False) -> int:
+        """Record the table at ``index`` and return the position after its alias.
+
+        Commas and joins that follow are picked up by the main loop, which knows
+        whether the FROM clause is still open.
+        """
+
+        tokens = self._tokens
+        if index < len(tokens) and tokens[index].kind == TOKEN_WORD and tokens[index].value == "lateral":
+            index += 1
+        if index >= len(tokens):
+            return index
+        if tokens[index].text == "(":
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if following is not None and following.value not in _SUBQUERY_KEYWORDS:
+                self._join_groups.add(index)
+            # Subqueries and join groups are analysed in place by the main loop.
+            self._continuations.add(self._skip_parens(index))
+            return index
+        name, position = self._read_name(index)
+        if name is None:
+            return index
+        if position < len(tokens) and tokens[position].text == "(" and not column_list:
+            # Table functions such as ``read_parquet(...)`` are not catalog tables.
+            self._table_functions[name.lower()] = None
+            self._continuations.add(self._skip_parens(position))
+            return position
+        self._tables[name] = None
+        return self._skip_alias(position)
+
+    def _skip_alias(self, index: int) -> int:
+        tokens = self._tokens
+        if index < len(tokens) and tokens[index].value == "as":
+            index += 1
+        if index < len(tokens) and tokens[index].kind in (TOKEN_WORD, TOKEN_QUOTED):
+            if tokens[index].kind == TOKEN_QUOTED or tokens[index].value not in _RESERVED_WORDS:
+                self._aliases.add(tokens[index].value.lower())
+                index += 1
+                if index < len(tokens) and tokens[index].text == "(":
+                    index = self._skip_parens(index)
+        return index
+
+    def _read_name(self, index: int) -> tuple[str | None, int]:
+        tokens = self._tokens
+        parts: list[str] = []
+        while index < len(tokens):
+            token = tokens[index]
+            if token.kind == TOKEN_QUOTED:
+                parts.append(token.value)
+            elif token.kind == TOKEN_WORD and (parts or token.value not in _RESERVED_WORDS):
+                parts.append(token.text)
+            else:
+                break
+            index += 1
+            if index < len(tokens) and tokens[index].text == ".":
+                index += 1
+                continue
+            break
+        return (".".join(parts) if parts else None), index
+
+    def _skip_parens(self, index: int) -> int:
+        depth = 0
+        tokens = self._tokens
+        while index < len(tokens):
+            if tokens[index].text == "(":
+                depth += 1
+            elif tokens[index].text == ")":
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+        return index
+
+    def _read_predicates(self, index: int) -> None:
+        tokens = self._tokens
+        depth = 0
+        start = index
+        between = False
+        while index < len(tokens):
+            token = tokens[index]
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif token.text in (";", ",") and depth == 0:
+                break
+            elif depth == 0 and token.kind == TOKEN_WORD:
+                keyword = token.value
+                if keyword == "between":
+                    between = True
+                elif keyword == "and" and between:
+                    between = False
+                elif keyword == "and":
+                    self._add_predicate(start, index)
+                    start = index + 1
+                elif keyword in _CLAUSE_KEYWORDS and keyword not in ("as", "set", "for", "values"):
+                    break
+            index += 1
+        self._add_predicate(start, index)
+
+    def _add_predicate(self, start: int, end: int) -> None:
+        if start >= end:
+            return
+        text = self._statement[self._tokens[start].start : self._tokens[end - 1].end]
+        self._predicates[normalize_sql(text)] = None
+
+    def _collect_columns(self) -> None:
+        tokens = self._tokens
+        tables = {name.lower() for name in self._tables} | {name.lower() for name in self._ctes}
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            previous = tokens[index - 1] if index > 0 else None
+            if token.kind not in (TOKEN_WORD, TOKEN_QUOTED) or (previous is not None and previous.text in (".", "::")):
+                index += 1
+                continue
+            if token.kind == TOKEN_WORD and token.value in _RESERVED_WORDS:
+                index += 1
+                continue
+            name, position = self._read_name(index)
+            following = tokens[position] if position < len(tokens) else None
+            preceding = previous.value if previous is not None and previous.kind == TOKEN_WORD else None
+            is_call = following is not None and following.text == "("
+            is_alias = preceding == "as" or (name or "").lower() in tables
+            if name and not is_call and not is_alias and name.lower() not in self._aliases:
+                self._columns[name] = None
+            index = position
+
+    def _collect_functions(self) -> None:
+        tokens = self._tokens
+        for index, token in enumerate(tokens):
+            if token.kind != TOKEN_WORD:
+                continue
+            if token.value in _NILADIC_FUNCTIONS:
+                self._functions[token.value] = None
+            elif token.value not in _RESERVED_WORDS and index + 1 < len(tokens) and tokens[index + 1].text == "(":
+                self._functions[token.value] = None
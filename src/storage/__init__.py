@@ -1,11 +1,13 @@
 """Storage backends for the analytics lakehouse."""
 
 from .gcs import GCSObjectStore
-from .object_store import ObjectMetadata, ObjectStore, ObjectStoreError
+from .object_store import ObjectMetadata, ObjectRangeReader, ObjectStore, ObjectStoreError, open_object
 
 __all__ = [
     "GCSObjectStore",
     "ObjectMetadata",
+    "ObjectRangeReader",
     "ObjectStore",
     "ObjectStoreError",
+    "open_object",
 ]
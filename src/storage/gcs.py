@@ -2,12 +2,12 @@
 
 from __future__ import annotations
 
-from typing import Iterable
+from typing import BinaryIO, Iterable
 
 from google.api_core.exceptions import GoogleAPIError
 from google.cloud import storage
 
-from .object_store import ObjectMetadata, ObjectStore, ObjectStoreError
+from .object_store import DEFAULT_READ_BUFFER_SIZE, ObjectMetadata, ObjectStore, ObjectStoreError, open_object
 
 
 class GCSObjectStore(ObjectStore):
@@ -39,6 +39,33 @@ class GCSObjectStore(ObjectStore):
         except GoogleAPIError as exc:  # pragma: no cover - network failure path
             raise ObjectStoreError(f"Failed to read object '{path}' from bucket '{self._bucket_name}'.", cause=exc) from exc
 
+    def read_range(self, path: str, start: int, length: int, *, generation: int | None = None) -> bytes:
+        if start < 0 or length < 0:
+            raise ValueError("start and length must not be negative")
+        if length == 0:
+            return b""
+        try:
+            # ``end`` is inclusive in the JSON API's Range header.
+            return self._blob(path).download_as_bytes(
+                start=start, end=start + length - 1, if_generation_match=generation
+            )
+        except GoogleAPIError as exc:  # pragma: no cover - network failure path
+            raise ObjectStoreError(
+                f"Failed to read a range of object '{path}' from bucket '{self._bucket_name}'.", cause=exc
+            ) from exc
+
+    def stat(self, path: str) -> ObjectMetadata:
+        try:
+            blob = self._client_instance.bucket(self._bucket_name).get_blob(path)
+        except GoogleAPIError as exc:  # pragma: no cover - network failure path
+            raise ObjectStoreError(f"Failed to stat object '{path}' in bucket '{self._bucket_name}'.", cause=exc) from exc
+        if blob is None:
+            raise ObjectStoreError(f"Object '{path}' does not exist in bucket '{self._bucket_name}'.")
+        return ObjectMetadata(name=blob.name, size=blob.size or 0, generation=blob.generation)
+
+    def open(self, path: str, *, buffer_size: int = DEFAULT_READ_BUFFER_SIZE) -> BinaryIO:
+        return open_object(self, path, buffer_size=buffer_size)
+
     def write(self, path: str, data: bytes, *, content_type: str | None = None) -> None:
         blob = self._blob(path)
         try:
@@ -51,7 +78,7 @@ class GCSObjectStore(ObjectStore):
     def list(self, prefix: str = "") -> Iterable[ObjectMetadata]:
         try:
             for blob in self._client_instance.list_blobs(self._bucket_name, prefix=prefix):
-                yield ObjectMetadata(name=blob.name, size=blob.size or 0)
+                yield ObjectMetadata(name=blob.name, size=blob.size or 0, generation=blob.generation)
         except GoogleAPIError as exc:  # pragma: no cover - network failure path
             raise ObjectStoreError(
                 f"Failed to list objects under '{prefix}' in bucket '{self._bucket_name}'.", cause=exc
@@ -7,16 +7,20 @@ clouds, we rely on a thin interface that captures the operations we need.
 
 from __future__ import annotations
 
+import io
 from dataclasses import dataclass
-from typing import Iterable, Protocol, runtime_checkable
+from typing import BinaryIO, Iterable, Protocol, runtime_checkable
+
+DEFAULT_READ_BUFFER_SIZE = 256 * 1024
 
 
 @dataclass
 class ObjectMetadata:
-    """Metadata returned when listing objects."""
+    """Metadata returned when listing or inspecting objects."""
 
     name: str
     size: int
+    generation: int | None = None
 
 
 @runtime_checkable
@@ -26,6 +30,19 @@ class ObjectStore(Protocol):
     def read(self, path: str) -> bytes:
         """Return the raw contents stored at ``path``."""
 
+    def read_range(self, path: str, start: int, length: int, *, generation: int | None = None) -> bytes:
+        """Return up to ``length`` bytes of ``path`` starting at offset ``start``.
+
+        When ``generation`` is given the read fails if the object has been
+        replaced since, so that several ranges always come from the same version.
+        """
+
+    def stat(self, path: str) -> ObjectMetadata:
+        """Return the size and generation of ``path`` without reading it."""
+
+    def open(self, path: str) -> BinaryIO:
+        """Return a seekable, buffered binary file reading ``path`` in ranges."""
+
     def write(self, path: str, data: bytes, *, content_type: str | None = None) -> None:
         """Persist ``data`` to ``path`` using an optional ``content_type``."""
 
@@ -39,3 +56,75 @@ class ObjectStoreError(RuntimeError):
     def __init__(self, message: str, *, cause: Exception | None = None) -> None:
         super().__init__(message)
         self.__cause__ = cause
+
+
+class ObjectRangeReader(io.RawIOBase):
+    """Seekable raw file over an object that fetches each read as a byte range.
+
+    The reader is pinned to the generation it was opened with. Wrap it in
+    :class:`io.BufferedReader` (see :func:`open_object`) so that small reads are
+    served from one ranged request.
+    """
+
+    def __init__(self, store: ObjectStore, metadata: ObjectMetadata) -> None:
+        super().__init__()
+        self._store = store
+        self._metadata = metadata
+        self._position = 0
+
+    @property
+    def name(self) -> str:
+        return self._metadata.name
+
+    @property
+    def size(self) -> int:
+        return self._metadata.size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._metadata.size + offset
+        else:
+            raise ValueError(f"Invalid whence value: {whence!r}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:  # noqa: ANN001 - any writable buffer
+        data = self._read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        return self._read(self._metadata.size - self._position)
+
+    # Internal helpers -------------------------------------------------
+
+    def _read(self, length: int) -> bytes:
+        length = min(length, self._metadata.size - self._position)
+        if length <= 0:
+            return b""
+        data = self._store.read_range(
+            self._metadata.name, self._position, length, generation=self._metadata.generation
+        )
+        self._position += len(data)
+        return data
+
+
+def open_object(store: ObjectStore, path: str, *, buffer_size: int = DEFAULT_READ_BUFFER_SIZE) -> BinaryIO:
+    """Open ``path`` as a buffered, seekable file backed by ranged reads of ``store``."""
+
+    return io.BufferedReader(ObjectRangeReader(store, store.stat(path)), buffer_size=buffer_size)  # type: ignore[return-value]
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
+import base64
+import json
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from typing import Iterator
 
+import pytest
+
 from api.app import create_app
 from api.entitlements import QueryExecutionStats
 from query import (
     InMemoryQueryHistoryStore,
     QueryHistoryEntry,
     QueryHistoryFilter,
+    QueryJobManager,
     QueryRequest,
     QueryResult,
     QueryResultColumn,
+    QueryResultStream,
     QueryService,
     QueryStatistics,
 )
@@ -115,3 +121,228 @@ def test_query_history_endpoint_filters_results() -> None:
     body = response.get_json()
     assert len(body["entries"]) == 2
     assert body["summary"]["totalQueries"] == 2
+
+
+def test_query_history_endpoint_pages_with_cursors() -> None:
+    store = InMemoryQueryHistoryStore()
+    base = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    for index in range(5):
+        store.append(
+            QueryHistoryEntry(
+                query_id=f"q{index}",
+                client_id="client-x",
+                statement="SELECT 1",
+                status="SUCCEEDED",
+                submitted_at=base + timedelta(hours=index // 2),
+                completed_at=None,
+                elapsed_ms=2.0,
+                data_scanned_mb=1.0,
+                row_count=1,
+                cost_usd=0.01,
+            )
+        )
+    client = create_app(billing_repository=DummyBillingRepository(), query_history_store=store).test_client()
+
+    seen: list[str] = []
+    cursor = None
+    for _ in range(3):
+        query_string = {"pageSize": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/clients/client-x/query-history", query_string=query_string).get_json()
+        seen.extend(entry["queryId"] for entry in body["entries"])
+        cursor = body["nextCursor"]
+    assert seen == ["q4", "q3", "q2", "q1", "q0"]
+    assert cursor is None
+
+    invalid = client.get("/api/clients/client-x/query-history", query_string={"cursor": "not-a-cursor"})
+    assert invalid.status_code == 400
+    assert invalid.get_json()["error"] == "invalid_cursor"
+
+    naive = base64.urlsafe_b64encode(json.dumps(["2024-01-01T00:00:00", "q3"]).encode()).decode()
+    response = client.get("/api/clients/client-x/query-history", query_string={"cursor": naive})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "invalid_cursor"
+
+
+def test_query_endpoint_streams_arrow_when_requested() -> None:
+    pa = pytest.importorskip("pyarrow")
+    store = InMemoryQueryHistoryStore()
+    result = QueryResult(
+        statement="SELECT id FROM demo.main",
+        columns=(QueryResultColumn(name="id"),),
+        batches=(pa.record_batch([pa.array([1, 2, 3])], names=["id"]),),
+        stats=QueryStatistics(elapsed_ms=1.0, data_scanned_mb=2.0, row_count=3),
+    )
+    engine = StubEngine(result)
+    service = QueryService(engine, StubEntitlements(), store)
+    app = create_app(billing_repository=DummyBillingRepository(), query_service=service)
+    client = app.test_client()
+
+    response = client.post(
+        "/query",
+        json={"client_id": "client-x", "sql": "SELECT id FROM demo.main"},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/vnd.apache.arrow.stream"
+    assert engine.requests[0].result_format == "arrow"
+    table = pa.ipc.open_stream(response.data).read_all()
+    assert table.column("id").to_pylist() == [1, 2, 3]
+    assert json.loads(response.headers["X-Query-Stats"])["rowCount"] == 3
+    assert store.search(QueryHistoryFilter(client_id="client-x"))[0].row_count == 3
+
+
+def test_query_endpoint_streams_ndjson_with_trailing_stats() -> None:
+    store = InMemoryQueryHistoryStore()
+    stream = QueryResultStream(
+        iter([[(1,), (2,)], [(3,)]]),
+        stats=lambda: QueryStatistics(elapsed_ms=1.0, data_scanned_mb=2.0, row_count=3),
+    )
+    engine = StubEngine(QueryResult(statement="SELECT id FROM demo.main", columns=(QueryResultColumn(name="id"),), rows=stream))
+    service = QueryService(engine, StubEntitlements(), store)
+    app = create_app(billing_repository=DummyBillingRepository(), query_service=service)
+    client = app.test_client()
+
+    response = client.post(
+        "/query",
+        json={"client_id": "client-x", "sql": "SELECT id FROM demo.main"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert engine.requests[0].stream is True
+    assert [record["type"] for record in records] == ["header", "rows", "rows", "stats"]
+    assert records[1]["rows"] == [[1], [2]]
+    assert records[-1]["stats"]["rowCount"] == 3
+    assert store.search(QueryHistoryFilter(client_id="client-x"))[0].status == "SUCCEEDED"
+
+
+def test_closing_a_streamed_response_before_reading_releases_the_stream() -> None:
+    store = InMemoryQueryHistoryStore()
+    closed: list[bool] = []
+
+    def chunks() -> Iterator[list[tuple[int]]]:
+        try:
+            yield [(1,)]
+        finally:
+            closed.append(True)
+
+    stream = QueryResultStream(chunks())
+    stream.add_close_callback(lambda stream, error: closed.append(stream.completed))
+    engine = StubEngine(QueryResult(statement="SELECT id FROM demo.main", columns=(QueryResultColumn(name="id"),), rows=stream))
+    service = QueryService(engine, StubEntitlements(), store)
+    app = create_app(billing_repository=DummyBillingRepository(), query_service=service)
+
+    response = app.test_client().post(
+        "/query",
+        json={"client_id": "client-x", "sql": "SELECT id FROM demo.main"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    response.close()
+    response.close()
+
+    assert stream.finished
+    assert closed == [False]  # close callbacks ran once although the body was never read
+    assert len(store.search(QueryHistoryFilter(client_id="client-x"))) == 1
+
+
+def test_submitted_query_can_be_polled_and_paged() -> None:
+    store = InMemoryQueryHistoryStore()
+    result = QueryResult(
+        statement="SELECT id FROM demo.events",
+        columns=(QueryResultColumn(name="id"),),
+        rows=((1,), (2,), (3,)),
+        stats=QueryStatistics(elapsed_ms=1.0, data_scanned_mb=0.25, row_count=3),
+    )
+    service = QueryService(StubEngine(result), StubEntitlements(), store)
+    jobs = QueryJobManager(service, page_size=2)
+    app = create_app(
+        billing_repository=DummyBillingRepository(),
+        query_service=service,
+        query_history_store=store,
+        query_jobs=jobs,
+    )
+    client = app.test_client()
+
+    response = client.post("/queries", json={"clientId": "client-1", "sql": "SELECT id FROM demo.events"})
+    assert response.status_code == 202
+    query_id = response.get_json()["queryId"]
+    assert response.headers["Location"] == f"/queries/{query_id}?clientId=client-1"
+    jobs.shutdown()
+
+    status = client.get(f"/queries/{query_id}?clientId=client-1").get_json()
+    assert status["status"] == "SUCCEEDED"
+    assert status["progress"]["rowsSpooled"] == 3
+    assert status["progress"]["pagesAvailable"] == 2
+
+    first = client.get(f"/queries/{query_id}/results?clientId=client-1&page=0").get_json()
+    assert first["rows"] == [[1], [2]]
+    assert first["nextPage"] == 1
+    second = client.get(f"/queries/{query_id}/results?clientId=client-1&page=1").get_json()
+    assert second["rows"] == [[3]]
+    assert second["nextPage"] is None
+
+    assert client.get("/queries/missing?clientId=client-1").status_code == 404
+    assert client.get(f"/queries/{query_id}?clientId=client-2").status_code == 404
+    assert client.get(f"/queries/{query_id}/results?clientId=client-2").status_code == 404
+    assert client.get(f"/queries/{query_id}").status_code == 400
+    assert client.get(f"/queries/{query_id}/results?clientId=client-1&page=abc").status_code == 400
+    assert client.post("/queries", json={"clientId": "client-1"}).status_code == 400
+
+
+def test_delete_cancels_unknown_query_with_not_found() -> None:
+    store = InMemoryQueryHistoryStore()
+    service = QueryService(StubEngine(QueryResult(statement="SELECT 1")), StubEntitlements(), store)
+    app = create_app(billing_repository=DummyBillingRepository(), query_service=service, query_history_store=store)
+    client = app.test_client()
+
+    assert client.delete("/queries/missing?clientId=client-1").status_code == 404
+    assert client.delete("/queries/missing").status_code == 400
+
+    response = client.post("/queries", json={"clientId": "client-1", "sql": "SELECT 1", "timeoutMs": "abc"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "invalid_timeout"
+
+
+def test_query_endpoint_forwards_bound_parameters() -> None:
+    store = InMemoryQueryHistoryStore()
+    engine = StubEngine(QueryResult(statement="SELECT 1", rows=((1,),)))
+    service = QueryService(engine, StubEntitlements(), store)
+    app = create_app(billing_repository=DummyBillingRepository(), query_service=service, query_history_store=store)
+    client = app.test_client()
+
+    response = client.post("/query", json={"clientId": "client-1", "sql": "SELECT ? + 1", "params": [1]})
+    assert response.status_code == 200
+    assert engine.requests[0].parameters == [1]
+
+    response = client.post("/query", json={"clientId": "client-1", "sql": "SELECT ?", "params": "1"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "invalid_params"
+
+
+def test_client_supplied_query_ids_are_validated_and_unique() -> None:
+    store = InMemoryQueryHistoryStore()
+    service = QueryService(StubEngine(QueryResult(statement="SELECT 1", rows=((1,),))), StubEntitlements(), store)
+    jobs = QueryJobManager(service)
+    app = create_app(
+        billing_repository=DummyBillingRepository(),
+        query_service=service,
+        query_history_store=store,
+        query_jobs=jobs,
+    )
+    client = app.test_client()
+
+    for query_id in ("a/b", "x" * 129, 7):
+        response = client.post("/queries", json={"clientId": "client-1", "sql": "SELECT 1", "queryId": query_id})
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "invalid_query_id"
+
+    first = client.post("/queries", json={"clientId": "client-1", "sql": "SELECT 1", "queryId": "report-1"})
+    second = client.post("/queries", json={"clientId": "client-2", "sql": "SELECT 1", "queryId": "report-1"})
+    jobs.shutdown()
+
+    assert first.status_code == 202
+    assert second.status_code == 409
+    assert second.get_json()["error"] == "duplicate_query_id"
+    assert client.delete("/queries/report-1?clientId=client-2").status_code == 404
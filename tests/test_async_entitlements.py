@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+import pytest
+
+from api.async_entitlements import AsyncEntitlementService
+from api.entitlements import EntitlementError, QueryExecutionStats
+from api.usage import UsageBuffer
+from billing.firestore_repository import AsyncBillingRepository
+from billing.stripe_catalog import get_plan_by_id
+from google.cloud import firestore
+
+
+class FakeSnapshot:
+    def __init__(self, data: Optional[Dict[str, Any]], reference: "FakeDocument") -> None:
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store: "FakeAsyncFirestore", path: str) -> None:
+        self._store = store
+        self.path = path
+
+    async def get(self, **kwargs: Any) -> FakeSnapshot:  # noqa: ANN401
+        return FakeSnapshot(self._store.documents.get(self.path), self)
+
+    async def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._store.write(self.path, data, merge)
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+
+class FakeCollection:
+    def __init__(self, store: "FakeAsyncFirestore", name: str) -> None:
+        self._store = store
+        self._name = name
+
+    def document(self, document_id: str) -> FakeDocument:
+        return FakeDocument(self._store, f"{self._name}/{document_id}")
+
+
+class FakeWrites:
+    """Buffered writes shared by the fake transaction and batch."""
+
+    def __init__(self, store: "FakeAsyncFirestore") -> None:
+        self._store = store
+        self._writes: list[tuple[str, Optional[Dict[str, Any]], bool]] = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append((ref.path, data, merge))
+
+    def delete(self, ref: FakeDocument) -> None:
+        self._writes.append((ref.path, None, False))
+
+    async def get_all(self, refs: list[FakeDocument]) -> AsyncIterator[FakeSnapshot]:
+        return self._store.get_all(refs)
+
+    async def commit(self) -> None:
+        self._store.commits += 1
+        for path, data, merge in self._writes:
+            if data is None:
+                self._store.documents.pop(path, None)
+            else:
+                self._store.write(path, data, merge)
+
+
+class FakeAsyncFirestore:
+    def __init__(self) -> None:
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.commits = 0
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def transaction(self) -> FakeWrites:
+        return FakeWrites(self)
+
+    def batch(self) -> FakeWrites:
+        return FakeWrites(self)
+
+    async def get_all(self, refs: list[FakeDocument]) -> AsyncIterator[FakeSnapshot]:
+        for ref in refs:
+            yield FakeSnapshot(self.documents.get(ref.path), ref)
+
+    def write(self, path: str, data: Dict[str, Any], merge: bool) -> None:
+        document = self.documents.setdefault(path, {}) if merge else {}
+        for field, value in data.items():
+            if isinstance(value, firestore.Increment):
+                document[field] = document.get(field, 0) + value.value
+            elif isinstance(value, dict) and isinstance(document.get(field), dict):
+                document[field].update(value)
+            else:
+                document[field] = value
+        self.documents[path] = document
+
+
+@pytest.fixture(autouse=True)
+def commit_transactions_inline(monkeypatch: pytest.MonkeyPatch) -> None:
+    def _transactional(func):  # noqa: ANN001, ANN202
+        async def _run(transaction: FakeWrites) -> Any:  # noqa: ANN401
+            result = await func(transaction)
+            await transaction.commit()
+            return result
+
+        return _run
+
+    monkeypatch.setattr(firestore, "async_transactional", _transactional)
+
+
+def inline_entitlements(max_queries: int, *, max_concurrent: Optional[int] = 1) -> Dict[str, Any]:
+    return {
+        "plan_id": "custom",
+        "entitlements": {
+            "max_queries_per_day": max_queries,
+            "max_scan_mb_per_day": 100,
+            "max_concurrent_queries": max_concurrent,
+        },
+    }
+
+
+def test_async_admission_holds_a_lease_and_commits_usage_on_release() -> None:
+    db = FakeAsyncFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=1)
+    service = AsyncEntitlementService(db)
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+
+    async def scenario() -> None:
+        async with service.query_context("client-1") as entitlements:
+            assert len(db.documents["clients/client-1/runtime/concurrency"]["leases"]) == 1
+            with pytest.raises(EntitlementError):
+                async with service.query_context("client-1"):
+                    pass
+            await service.record_query_usage(
+                "client-1", QueryExecutionStats(data_scanned_mb=4.0, result_rows=2), entitlements=entitlements
+            )
+            assert usage_path not in db.documents
+        await service.close()
+
+    asyncio.run(scenario())
+
+    assert db.documents[usage_path]["queries"] == 1
+    assert db.documents[usage_path]["data_scanned_mb"] == 4.0
+    assert "clients/client-1/runtime/concurrency" not in db.documents
+
+
+def test_async_buffered_usage_is_enforced_locally_and_flushed() -> None:
+    db = FakeAsyncFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(2, max_concurrent=None)
+    service = AsyncEntitlementService(db, usage_buffer=UsageBuffer(flush_interval_s=60.0))
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+    stats = QueryExecutionStats(data_scanned_mb=1.0, result_rows=1)
+
+    async def scenario() -> None:
+        for _ in range(2):
+            await service.record_query_usage("client-1", stats)
+        with pytest.raises(EntitlementError):
+            await service.record_query_usage("client-1", stats)
+        await service.close()
+
+    asyncio.run(scenario())
+
+    assert db.documents[usage_path]["queries"] == 2
+    assert db.commits == 2  # each query is past the 1% tolerance of a two-query plan
+
+
+def test_async_sharded_usage_spreads_writes_and_aggregates() -> None:
+    db = FakeAsyncFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(5, max_concurrent=None)
+    db.documents["clients/client-1"]["entitlements"]["usage_shards"] = 4
+    service = AsyncEntitlementService(db, aggregate_interval_s=3600)
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+    stats = QueryExecutionStats(data_scanned_mb=1.0, result_rows=1)
+
+    async def scenario() -> None:
+        for _ in range(5):
+            async with service.query_context("client-1") as entitlements:
+                await service.record_query_usage("client-1", stats, entitlements=entitlements)
+
+        shards = [data for path, data in db.documents.items() if path.startswith(f"{usage_path}/shards/")]
+        assert sum(shard["queries"] for shard in shards) == 5
+        assert usage_path not in db.documents
+        assert (await service.get_usage("client-1")).queries == 5
+
+        assert await service.aggregate_usage() == 1
+        assert db.documents[usage_path]["shard_totals"]["queries"] == 5
+        assert (await service.get_usage("client-1")).queries == 5  # shards are not double counted
+        with pytest.raises(EntitlementError):
+            async with service.query_context("client-1"):
+                pass
+        await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_billing_repository_round_trips_documents() -> None:
+    db = FakeAsyncFirestore()
+    repository = AsyncBillingRepository(db)
+
+    async def scenario() -> None:
+        await repository.link_customer_to_client(
+            customer_id="cus_1", client_id="client-1", subscription_id="sub_1", price_id="price_1"
+        )
+        await repository.update_client_plan(
+            client_id="client-1",
+            plan=get_plan_by_id("pro"),
+            subscription_status="active",
+            subscription_id="sub_1",
+            current_period_end=123,
+            price_id="price_1",
+        )
+        await repository.record_processed_webhook(event_id="evt_1", event_type="invoice.paid")
+
+        assert await repository.get_client_id_for_customer(customer_id="cus_1") == "client-1"
+        plan = await repository.get_plan_document(client_id="client-1")
+        assert plan is not None and plan["plan_id"] == "pro" and plan["stripe_customer_id"] == "cus_1"
+        assert await repository.has_processed_event(event_id="evt_1")
+        assert not await repository.has_processed_event(event_id="evt_2")
+
+    asyncio.run(scenario())
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from query import DuckDBConnectionPool, DuckDBQueryEngine, QueryError, QueryRequest
+
+
+def write_events(path: Path, rows: int = 50) -> str:
+    target = path / "events.parquet"
+    connection = duckdb.connect()
+    connection.execute(
+        f"COPY (SELECT range AS id, 'type-' || (range % 3) AS event_type FROM range({rows})) TO '{target}'"
+    )
+    connection.close()
+    return str(target)
+
+
+def make_engine(tmp_path: Path, *, max_size: int = 2) -> DuckDBQueryEngine:
+    location = write_events(tmp_path)
+    pool = DuckDBConnectionPool(max_size=max_size, extensions=(), acquire_timeout_s=0.1)
+    return DuckDBQueryEngine(
+        table_resolver=lambda client_id: {"analytics.events": location},
+        pool=pool,
+        scan_function="read_parquet",
+    )
+
+
+def test_execute_returns_rows_columns_and_statistics(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+
+    result = engine.execute(
+        QueryRequest(
+            client_id="client-1",
+            sql="SELECT event_type, count(*) AS total FROM analytics.events GROUP BY 1 ORDER BY 1;",
+        )
+    )
+
+    assert [column.name for column in result.columns] == ["event_type", "total"]
+    assert result.rows == [("type-0", 17), ("type-1", 17), ("type-2", 16)]
+    assert result.stats is not None
+    assert result.stats.row_count == 3
+    assert result.stats.elapsed_ms is not None and result.stats.elapsed_ms > 0
+    assert result.stats.data_scanned_mb is not None
+    assert result.stats.engine_details["rows_scanned"] == 50
+
+
+def test_execute_applies_limit(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+
+    result = engine.execute(QueryRequest(client_id="client-1", sql="SELECT id FROM analytics.events", limit=5))
+
+    assert len(result.rows) == 5
+
+
+def test_connections_are_reused_per_client_and_bounded(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path, max_size=2)
+    request = QueryRequest(client_id="client-1", sql="SELECT 1")
+
+    engine.execute(request)
+    first = engine.pool.acquire("client-1")
+    engine.pool.release(first)
+    engine.execute(request)
+    second = engine.pool.acquire("client-1")
+    engine.pool.release(second)
+    assert first is second
+
+    engine.execute(QueryRequest(client_id="client-2", sql="SELECT 1"))
+    engine.execute(QueryRequest(client_id="client-3", sql="SELECT 1"))
+    assert engine.pool.size == 2
+
+
+def test_pool_reports_busy_when_exhausted(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path, max_size=1)
+    held = engine.pool.acquire("client-1")
+    try:
+        with pytest.raises(QueryError) as excinfo:
+            engine.execute(QueryRequest(client_id="client-2", sql="SELECT 1"))
+        assert excinfo.value.code == "engine_busy"
+    finally:
+        engine.pool.release(held)
+
+
+def test_invalid_sql_is_reported_as_query_error(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+
+    with pytest.raises(QueryError) as excinfo:
+        engine.execute(QueryRequest(client_id="client-1", sql="SELECT FROM WHERE"))
+
+    assert excinfo.value.code == "invalid_sql"
+    assert engine.pool.idle_count == 1
+
+
+def test_execute_returns_arrow_batches_when_requested(tmp_path: Path) -> None:
+    pytest.importorskip("pyarrow")
+    engine = make_engine(tmp_path)
+
+    result = engine.execute(
+        QueryRequest(client_id="client-1", sql="SELECT id FROM analytics.events", result_format="arrow")
+    )
+
+    assert result.rows == []
+    assert result.arrow_schema.names == ["id"]
+    assert sum(batch.num_rows for batch in result.batches) == 50
+    assert result.stats.row_count == 50
+
+
+def test_streaming_holds_connection_until_stream_finishes(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+
+    result = engine.execute(QueryRequest(client_id="client-1", sql="SELECT id FROM analytics.events", stream=True))
+
+    assert engine.pool.idle_count == 0
+    assert result.stream.stats is None
+    assert len(list(result.iter_rows())) == 50
+    assert engine.pool.idle_count == 1
+    assert result.stream.stats.row_count == 50
+
+
+def test_stream_closed_early_reports_stats_without_a_scan(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+
+    result = engine.execute(QueryRequest(client_id="client-1", sql="SELECT id FROM analytics.events", stream=True))
+    next(result.rows)
+    result.rows.close()
+
+    assert engine.pool.idle_count == 1
+    assert result.stream.stats.row_count == 50
+    assert result.stream.stats.data_scanned_mb is None
+
+
+def test_cancel_interrupts_running_statement(tmp_path: Path) -> None:
+    engine = make_engine(tmp_path)
+    errors: list[QueryError] = []
+    slow_sql = "SELECT count(*) FROM range(10000000000) a, range(1000) b WHERE a.range % 7 = b.range"
+
+    def run() -> None:
+        try:
+            engine.execute(QueryRequest(client_id="client-1", sql=slow_sql, query_id="query-1"))
+        except QueryError as exc:
+            errors.append(exc)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not engine.cancel("query-1"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    assert [error.code for error in errors] == ["query_cancelled"]
+    assert engine.pool.size == 0
+    assert not engine.cancel("query-1")
+
+
+def test_parameterised_queries_reuse_prepared_statements(tmp_path: Path) -> None:
+    location = write_events(tmp_path)
+    engine = DuckDBQueryEngine(
+        table_resolver=lambda client_id: {"analytics.events": location},
+        pool=DuckDBConnectionPool(max_size=1, extensions=()),
+        scan_function="read_parquet",
+        prepared_cache_size=1,
+    )
+    sql = "SELECT id FROM analytics.events WHERE id = ?"
+
+    first = engine.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[3]))
+    second = engine.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[7]))
+    named = engine.execute(
+        QueryRequest(
+            client_id="client-1",
+            sql="SELECT id FROM analytics.events WHERE event_type = $kind AND id < $below",
+            parameters={"kind": "type-1", "below": 5},
+        )
+    )
+
+    assert first.rows == [(3,)]
+    assert second.rows == [(7,)]
+    assert named.rows == [(1,), (4,)]
+    with engine.pool.connection("client-1") as pooled:
+        assert list(pooled.prepared) == ["SELECT id FROM analytics.events WHERE event_type = $kind AND id < $below"]
+
+
+def test_connections_cannot_reach_outside_the_client_tables(tmp_path: Path) -> None:
+    tables = tmp_path / "tables"
+    tables.mkdir()
+    engine = make_engine(tables)
+    other = write_events(tmp_path)
+
+    assert engine.execute(QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.events")).rows == [(50,)]
+    for sql in (
+        f"SELECT * FROM read_parquet('{other}')",
+        f"SELECT 1; COPY (SELECT 1) TO '{tmp_path / 'out.csv'}'",
+        f"ATTACH '{tmp_path / 'other.db'}'",
+        "SET enable_external_access = true",
+    ):
+        with pytest.raises(QueryError):
+            engine.execute(QueryRequest(client_id="client-1", sql=sql))
+
+
+def test_table_locations_are_resolved_again_after_refresh_interval(tmp_path: Path) -> None:
+    location = write_events(tmp_path)
+    tables = {"analytics.events": location}
+    engine = DuckDBQueryEngine(
+        table_resolver=lambda client_id: dict(tables),
+        pool=DuckDBConnectionPool(max_size=1, extensions=()),
+        scan_function="read_parquet",
+        table_refresh_s=0.0,
+    )
+    engine.execute(QueryRequest(client_id="client-1", sql="SELECT 1"))
+
+    tables["analytics.users"] = location
+    result = engine.execute(QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.users"))
+
+    assert result.rows == [(50,)]
+
+
+def test_current_snapshots_read_the_catalog_without_a_pooled_connection() -> None:
+    calls: list[tuple[str, str]] = []
+
+    def read_snapshot(client_id: str, name: str, as_of):  # noqa: ANN001
+        calls.append((client_id, name))
+        return ("42", None)
+
+    engine = DuckDBQueryEngine(
+        table_resolver=lambda client_id: {"analytics.events": "/warehouse/events", "analytics.users": "/warehouse/users"},
+        pool=DuckDBConnectionPool(max_size=1, extensions=(), acquire_timeout_s=0.1),
+        snapshot_reader=read_snapshot,
+    )
+    engine.pool.acquire("client-2")  # the only connection is busy
+
+    snapshots = engine.current_snapshots("client-1", ("analytics.events", "analytics.users_archive"))
+
+    assert snapshots == {"analytics.events": "42"}
+    assert calls == [("client-1", "analytics.events")]
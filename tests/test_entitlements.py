@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import pytest
+
+from api.entitlements import EntitlementCache, EntitlementError, EntitlementService, QueryExecutionStats
+from api.rate_limit import RateLimiter, RateLimitExceeded
+from api.usage import UsageBuffer
+from billing.webhook_processor import StripeWebhookProcessor
+from google.cloud import firestore
+
+
+class FakeSnapshot:
+    def __init__(self, data: Optional[Dict[str, Any]], reference: Any = None) -> None:  # noqa: ANN401
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store: "FakeFirestore", path: str) -> None:
+        self._store = store
+        self.path = path
+
+    def get(self, **kwargs: Any) -> FakeSnapshot:  # noqa: ANN401
+        self._store.reads += 1
+        return FakeSnapshot(self._store.documents.get(self.path), self)
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+
+class FakeTransaction:
+    def __init__(self, store: "FakeFirestore") -> None:
+        self._store = store
+
+    def get_all(self, refs: list[FakeDocument]) -> list[FakeSnapshot]:
+        return [FakeSnapshot(self._store.documents.get(ref.path), ref) for ref in refs]
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        if merge:
+            _merge(self._store.documents.setdefault(ref.path, {}), data)
+        else:
+            self._store.documents[ref.path] = dict(data)
+
+    def delete(self, ref: FakeDocument) -> None:
+        self._store.documents.pop(ref.path, None)
+
+
+class FakeBatch:
+    def __init__(self, store: "FakeFirestore") -> None:
+        self._store = store
+        self._writes: list[tuple[FakeDocument, Dict[str, Any]]] = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append((ref, data))
+
+    def commit(self) -> None:
+        self._store.commits += 1
+        for ref, data in self._writes:
+            _merge(self._store.documents.setdefault(ref.path, {}), data)
+
+
+def _merge(document: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for field, value in data.items():
+        if isinstance(value, firestore.Increment):
+            document[field] = document.get(field, 0) + value.value
+        elif isinstance(value, dict) and isinstance(document.get(field), dict):
+            _merge(document[field], value)
+        else:
+            document[field] = value
+
+
+class FakeCollection:
+    def __init__(self, store: "FakeFirestore", name: str) -> None:
+        self._store = store
+        self._name = name
+
+    def document(self, document_id: str) -> FakeDocument:
+        return FakeDocument(self._store, f"{self._name}/{document_id}")
+
+
+class FakeFirestore:
+    def __init__(self) -> None:
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.reads = 0
+        self.commits = 0
+        self.transactions = 0
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def transaction(self) -> FakeTransaction:
+        self.transactions += 1
+        return FakeTransaction(self)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def get_all(self, refs: list[FakeDocument]) -> list[FakeSnapshot]:
+        return [ref.get() for ref in refs]
+
+
+@pytest.fixture(autouse=True)
+def run_transactions_inline(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(firestore, "transactional", lambda func: func)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def inline_entitlements(max_queries: int, *, max_concurrent: Optional[int] = 1) -> Dict[str, Any]:
+    return {
+        "plan_id": "custom",
+        "entitlements": {
+            "max_queries_per_day": max_queries,
+            "max_scan_mb_per_day": 100,
+            "max_concurrent_queries": max_concurrent,
+        },
+    }
+
+
+def test_entitlements_are_cached_until_ttl_expires() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(10)
+    clock = FakeClock()
+    service = EntitlementService(db, cache=EntitlementCache(ttl_s=30, clock=clock))
+
+    assert service.get_entitlements("client-1").max_queries_per_day == 10
+    db.documents["clients/client-1"] = inline_entitlements(20)
+    assert service.get_entitlements("client-1").max_queries_per_day == 10
+    assert db.reads == 1
+
+    clock.now = 31
+    assert service.get_entitlements("client-1").max_queries_per_day == 20
+    assert db.reads == 2
+
+
+def test_cache_is_bounded_and_can_be_invalidated() -> None:
+    db = FakeFirestore()
+    for index in range(3):
+        db.documents[f"clients/client-{index}"] = inline_entitlements(index + 1)
+    service = EntitlementService(db, cache=EntitlementCache(max_entries=2))
+
+    for index in range(3):
+        service.get_entitlements(f"client-{index}")
+    service.get_entitlements("client-0")
+    assert db.reads == 4
+
+    service.invalidate_entitlements("client-2")
+    service.get_entitlements("client-2")
+    assert db.reads == 5
+
+
+class RecordingRepository:
+    def __init__(self) -> None:
+        self.updated: list[str] = []
+
+    def has_processed_event(self, *, event_id: str) -> bool:
+        return False
+
+    def record_processed_webhook(self, *, event_id: str, event_type: str) -> None:
+        return None
+
+    def get_client_id_for_customer(self, *, customer_id: str) -> Optional[str]:
+        return "client-1"
+
+    def update_client_plan(self, **kwargs: Any) -> None:  # noqa: ANN401
+        self.updated.append(kwargs["client_id"])
+
+    def update_subscription_status(self, **kwargs: Any) -> None:  # noqa: ANN401
+        self.updated.append(kwargs["client_id"])
+
+
+def test_webhook_plan_changes_invalidate_cached_entitlements() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(10)
+    service = EntitlementService(db)
+    processor = StripeWebhookProcessor(RecordingRepository(), on_plan_change=service.invalidate_entitlements)
+
+    service.get_entitlements("client-1")
+    db.documents["clients/client-1"] = inline_entitlements(50)
+    processor.handle_test_event(
+        {
+            "id": "evt_1",
+            "type": "customer.subscription.updated",
+            "data": {"object": {"id": "sub_1", "customer": "cus_1", "status": "active", "items": {"data": []}}},
+        }
+    )
+
+    assert service.get_entitlements("client-1").max_queries_per_day == 50
+
+
+def test_buffered_usage_is_flushed_in_batches_and_enforced_locally() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(100, max_concurrent=None)
+    service = EntitlementService(db, usage_buffer=UsageBuffer(flush_interval_s=3600, tolerance=0.5))
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+
+    for _ in range(3):
+        service.record_query_usage("client-1", QueryExecutionStats(data_scanned_mb=10.0, result_rows=5))
+    assert usage_path not in db.documents
+
+    service.flush_usage()
+    assert db.commits == 1
+    assert db.documents[usage_path]["queries"] == 3
+    assert db.documents[usage_path]["data_scanned_mb"] == 30.0
+
+    for _ in range(7):
+        service.record_query_usage("client-1", QueryExecutionStats(data_scanned_mb=10.0, result_rows=5))
+    with pytest.raises(EntitlementError):
+        service.record_query_usage("client-1", QueryExecutionStats(data_scanned_mb=10.0, result_rows=5))
+    with pytest.raises(EntitlementError):
+        with service.query_context("client-1", estimated_scan_mb=1.0):
+            pass
+    service.close()
+    assert db.documents[usage_path]["queries"] == 10
+
+
+def test_buffered_usage_flushes_early_past_tolerance() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(1_000)
+    service = EntitlementService(db, usage_buffer=UsageBuffer(flush_interval_s=3600, tolerance=0.002))
+
+    for _ in range(3):
+        service.record_query_usage("client-1", QueryExecutionStats(data_scanned_mb=0.0, result_rows=1))
+
+    assert db.commits == 1
+    service.close()
+
+
+def test_query_admission_and_release_take_two_transactions() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=1)
+    service = EntitlementService(db)
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+
+    with service.query_context("client-1") as entitlements:
+        assert len(db.documents["clients/client-1/runtime/concurrency"]["leases"]) == 1
+        with pytest.raises(EntitlementError):
+            with service.query_context("client-1"):
+                pass
+        service.record_query_usage(
+            "client-1", QueryExecutionStats(data_scanned_mb=4.0, result_rows=2), entitlements=entitlements
+        )
+        assert usage_path not in db.documents
+
+    assert db.transactions == 3  # two for the query, one for the rejected admission
+    assert db.reads == 0
+    assert db.documents[usage_path]["queries"] == 1
+    assert db.documents[usage_path]["data_scanned_mb"] == 4.0
+    assert "clients/client-1/runtime/concurrency" not in db.documents
+
+
+def test_usage_violation_still_releases_the_slot() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=1)
+    service = EntitlementService(db)
+
+    with pytest.raises(EntitlementError):
+        with service.query_context("client-1") as entitlements:
+            service.record_query_usage(
+                "client-1", QueryExecutionStats(data_scanned_mb=500.0, result_rows=2), entitlements=entitlements
+            )
+
+    assert "clients/client-1/runtime/concurrency" not in db.documents
+
+
+def test_expired_leases_from_lost_instances_are_reclaimed() -> None:
+    db = FakeFirestore()
+    clock = FakeClock()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=1)
+    db.documents["clients/client-1/runtime/concurrency"] = {"leases": {"crashed": 30.0}}
+    service = EntitlementService(db, lease_ttl_s=30.0, clock=clock)
+
+    with pytest.raises(EntitlementError):
+        with service.query_context("client-1"):
+            pass
+
+    clock.now = 31.0
+    with service.query_context("client-1"):
+        leases = db.documents["clients/client-1/runtime/concurrency"]["leases"]
+        assert "crashed" not in leases
+        assert list(leases.values()) == [61.0]
+
+    assert "clients/client-1/runtime/concurrency" not in db.documents
+    service.close()
+
+
+def test_heartbeat_renews_leases_of_running_queries() -> None:
+    db = FakeFirestore()
+    clock = FakeClock()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=2)
+    service = EntitlementService(db, lease_ttl_s=30.0, clock=clock)
+
+    with service.query_context("client-1"):
+        clock.now = 20.0
+        assert service.renew_leases() == 1
+        leases = db.documents["clients/client-1/runtime/concurrency"]["leases"]
+        assert list(leases.values()) == [50.0]
+
+        clock.now = 45.0  # past the original expiry, inside the renewed one
+        with service.query_context("client-1"):
+            assert len(db.documents["clients/client-1/runtime/concurrency"]["leases"]) == 2
+
+    assert service.renew_leases() == 0
+    service.close()
+
+
+def test_heartbeat_does_not_re_add_released_leases() -> None:
+    db = FakeFirestore()
+    clock = FakeClock()
+    db.documents["clients/client-1"] = inline_entitlements(10, max_concurrent=3)
+    service = EntitlementService(db, lease_ttl_s=30.0, clock=clock)
+    concurrency_path = "clients/client-1/runtime/concurrency"
+
+    with service.query_context("client-1"):
+        # Another instance reclaimed the lease (or a release committed) after the admissions snapshot.
+        del db.documents[concurrency_path]
+        assert service.renew_leases() == 0
+        assert concurrency_path not in db.documents
+
+        db.documents[concurrency_path] = {"leases": {"other": 10.0, "expired": 5.0}}
+        assert service.renew_leases() == 0
+        with service.query_context("client-1"):
+            clock.now = 8.0
+            assert service.renew_leases() == 1
+            assert sorted(db.documents[concurrency_path]["leases"].values()) == [10.0, 38.0]
+
+    service.close()
+
+
+def test_cached_queries_are_counted_without_a_concurrency_slot() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(2, max_concurrent=1)
+    service = EntitlementService(db)
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+    stats = QueryExecutionStats(data_scanned_mb=0.0, result_rows=1)
+
+    with service.query_context("client-1"):
+        service.admit_cached_query("client-1", stats)  # the running query's slot is not needed
+    service.admit_cached_query("client-1", stats)
+    with pytest.raises(EntitlementError):
+        service.admit_cached_query("client-1", stats)
+
+    assert db.documents[usage_path]["queries"] == 2
+    assert db.documents[usage_path]["data_scanned_mb"] == 0.0
+    service.close()
+
+
+def test_rate_limiter_rejects_before_any_firestore_call() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(1_000, max_concurrent=1)
+    limiter = RateLimiter(clock=FakeClock())
+    service = EntitlementService(db, rate_limiter=limiter)
+
+    for _ in range(11):  # the first admission loads the plan that sizes the bucket
+        with service.query_context("client-1"):
+            pass
+    transactions = db.transactions
+
+    with pytest.raises(RateLimitExceeded):
+        with service.query_context("client-1"):
+            pass
+    assert db.transactions == transactions
+    service.close()
+
+
+def test_sharded_usage_spreads_writes_and_prechecks_the_aggregate() -> None:
+    db = FakeFirestore()
+    db.documents["clients/client-1"] = inline_entitlements(5, max_concurrent=None)
+    db.documents["clients/client-1"]["entitlements"]["usage_shards"] = 4
+    service = EntitlementService(db, aggregate_interval_s=3600)
+    usage_path = f"clients/client-1/usage/{service._current_usage_key()}"
+
+    for _ in range(5):
+        with service.query_context("client-1") as entitlements:
+            service.record_query_usage(
+                "client-1", QueryExecutionStats(data_scanned_mb=1.0, result_rows=1), entitlements=entitlements
+            )
+
+    shards = [data for path, data in db.documents.items() if path.startswith(f"{usage_path}/shards/")]
+    assert sum(shard["queries"] for shard in shards) == 5
+    assert usage_path not in db.documents
+    assert service.get_usage("client-1").queries == 5
+
+    assert service.aggregate_usage() == 1
+    assert db.documents[usage_path]["shard_totals"]["queries"] == 5
+    assert service.get_usage("client-1").queries == 5  # shards are not double counted
+    with pytest.raises(EntitlementError):
+        with service.query_context("client-1"):
+            pass
+    service.close()
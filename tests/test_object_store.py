@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import io
+from typing import Any, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from storage import GCSObjectStore, ObjectStoreError
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str) -> None:
+        self._bucket = bucket
+        self.name = name
+
+    @property
+    def size(self) -> int:
+        return len(self._bucket.objects[self.name])
+
+    @property
+    def generation(self) -> int:
+        return self._bucket.generations[self.name]
+
+    def download_as_bytes(self, start: Optional[int] = None, end: Optional[int] = None, **kwargs: Any) -> bytes:  # noqa: ANN401
+        expected = kwargs.get("if_generation_match")
+        if expected is not None and expected != self.generation:
+            raise AssertionError("generation mismatch")
+        data = self._bucket.objects[self.name]
+        chunk = data[start or 0 : (end + 1) if end is not None else None]
+        self._bucket.requests.append((start, end))
+        self._bucket.downloaded += len(chunk)
+        return chunk
+
+
+class FakeBucket:
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.generations: dict[str, int] = {}
+        self.requests: list[tuple[Optional[int], Optional[int]]] = []
+        self.downloaded = 0
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        return FakeBlob(self, name) if name in self.objects else None
+
+
+class FakeClient:
+    def __init__(self, bucket: FakeBucket) -> None:
+        self._bucket = bucket
+
+    def bucket(self, name: str) -> FakeBucket:
+        return self._bucket
+
+
+def make_store() -> tuple[GCSObjectStore, FakeBucket]:
+    bucket = FakeBucket()
+    return GCSObjectStore("analytics", client=FakeClient(bucket)), bucket  # type: ignore[arg-type]
+
+
+def test_read_range_and_stat() -> None:
+    store, bucket = make_store()
+    bucket.objects["data/file.bin"] = bytes(range(100))
+    bucket.generations["data/file.bin"] = 7
+
+    assert store.read_range("data/file.bin", 10, 5) == bytes(range(10, 15))
+    assert store.read_range("data/file.bin", 10, 0) == b""
+    assert bucket.requests == [(10, 14)]
+    metadata = store.stat("data/file.bin")
+    assert (metadata.name, metadata.size, metadata.generation) == ("data/file.bin", 100, 7)
+    with pytest.raises(ObjectStoreError):
+        store.stat("data/missing.bin")
+
+
+def test_open_reads_parquet_footer_without_downloading_the_file() -> None:
+    store, bucket = make_store()
+    table = pa.table({"id": list(range(200_000)), "payload": [f"row-{index}" for index in range(200_000)]})
+    sink = io.BytesIO()
+    pq.write_table(table, sink, row_group_size=50_000, compression="none")
+    bucket.objects["warehouse/main/part-0.parquet"] = sink.getvalue()
+    bucket.generations["warehouse/main/part-0.parquet"] = 3
+
+    with store.open("warehouse/main/part-0.parquet", buffer_size=64 * 1024) as handle:
+        metadata = pq.ParquetFile(handle).metadata
+        handle.seek(-4, io.SEEK_END)
+        assert handle.read() == b"PAR1"
+
+    assert metadata.num_rows == 200_000
+    assert metadata.num_row_groups == 4
+    assert bucket.downloaded < 200 * 1024 < len(sink.getvalue())
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from api.entitlements import EntitlementError
+from query import (
+    InMemoryQueryHistoryStore,
+    QueryHistoryFilter,
+    QueryRequest,
+    QueryResult,
+    QueryResultCache,
+    QueryResultColumn,
+    QueryService,
+    QueryStatistics,
+)
+from query.cache import ResultCacheKey
+from query.sql import normalize_sql
+
+
+class StubEntitlements:
+    def __init__(self, *, max_cached: int | None = None) -> None:
+        self.contexts = 0
+        self.cached: list[float] = []
+        self._max_cached = max_cached
+
+    @contextmanager
+    def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):
+        self.contexts += 1
+        yield {"client_id": client_id}
+
+    def record_query_usage(self, client_id: str, stats, *, entitlements=None) -> None:  # noqa: ANN001
+        return None
+
+    def admit_cached_query(self, client_id: str, stats) -> dict:  # noqa: ANN001
+        if self._max_cached is not None and len(self.cached) >= self._max_cached:
+            raise EntitlementError("Daily query allotment exhausted")
+        self.cached.append(stats.data_scanned_mb)
+        return {"client_id": client_id}
+
+
+class CountingEngine:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        self.calls += 1
+        return QueryResult(
+            statement=request.sql,
+            columns=(QueryResultColumn(name="total"),),
+            rows=((self.calls,),),
+            stats=QueryStatistics(elapsed_ms=50.0, data_scanned_mb=100.0, row_count=1),
+        )
+
+
+def make_key(statement: str = "SELECT 1") -> ResultCacheKey:
+    return ResultCacheKey(
+        client_id="client-1",
+        statement=statement,
+        limit=None,
+        snapshot_id=None,
+        as_of_timestamp=None,
+        result_format="rows",
+    )
+
+
+def test_normalize_sql_collapses_whitespace_outside_literals() -> None:
+    assert normalize_sql("  SELECT  *\n FROM t WHERE name = 'a  b' ;") == "SELECT * FROM t WHERE name = 'a  b'"
+
+
+def test_service_serves_repeated_queries_from_cache_until_snapshot_changes() -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements()
+    engine = CountingEngine()
+    snapshots = {"analytics.main": "1"}
+    service = QueryService(
+        engine,
+        entitlements,
+        store,
+        result_cache=QueryResultCache(),
+        snapshot_resolver=lambda client_id, tables: dict(snapshots),
+    )
+
+    first = service.execute(QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main"))
+    second = service.execute(QueryRequest(client_id="client-1", sql="SELECT count(*)\n  FROM analytics.main;"))
+    assert engine.calls == 1
+    assert entitlements.contexts == 1
+    assert entitlements.cached == [0.0]  # the hit is counted with zero scan
+    assert second.rows == first.rows
+    assert second.stats.data_scanned_mb == 0.0
+
+    snapshots["analytics.main"] = "2"
+    third = service.execute(QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main"))
+    assert engine.calls == 2
+    assert third.rows == ((2,),)
+
+    history = store.search(QueryHistoryFilter(client_id="client-1"))
+    assert [entry.cache_hit for entry in history].count(True) == 1
+    hit = next(entry for entry in history if entry.cache_hit)
+    assert hit.cost_usd == 0.0
+    assert hit.data_scanned_mb == 0.0
+
+
+def test_cache_hits_are_admitted_against_the_plan() -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements(max_cached=1)
+    engine = CountingEngine()
+    service = QueryService(
+        engine,
+        entitlements,
+        store,
+        result_cache=QueryResultCache(),
+        snapshot_resolver=lambda client_id, tables: {"analytics.main": "1"},
+    )
+    request = QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main")
+
+    service.execute(request)
+    service.execute(request)
+    with pytest.raises(EntitlementError):
+        service.execute(request)
+
+    assert engine.calls == 1
+    history = store.search(QueryHistoryFilter(client_id="client-1"))
+    assert [entry.status for entry in history].count("FAILED") == 1
+    assert not any(entry.cache_hit for entry in history if entry.status == "FAILED")
+
+
+def test_unpinned_queries_are_not_cached_without_snapshot_resolver() -> None:
+    engine = CountingEngine()
+    service = QueryService(engine, StubEntitlements(), InMemoryQueryHistoryStore(), result_cache=QueryResultCache())
+
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM analytics.main"))
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM analytics.main"))
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM analytics.main", snapshot_id="7"))
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM analytics.main", snapshot_id="7"))
+
+    assert engine.calls == 3
+
+
+def test_cache_evicts_least_recently_used_entries_over_budget() -> None:
+    result = QueryResult(statement="SELECT 1", rows=tuple((index,) for index in range(100)))
+    cache = QueryResultCache(max_bytes=30_000, max_entry_bytes=20_000)
+
+    for index in range(5):
+        assert cache.put(make_key(f"SELECT {index}"), result, snapshots={})
+    cache.get(make_key("SELECT 3"), {})
+
+    stats = cache.stats()
+    assert stats.size_bytes <= 30_000
+    assert stats.evictions > 0
+    assert cache.get(make_key("SELECT 3"), {}) is not None
+    assert cache.get(make_key("SELECT 0"), {}) is None
+
+
+def test_oversized_results_are_rejected_without_sizing_every_row() -> None:
+    seen: list[int] = []
+
+    class CountedRows(tuple):
+        def __iter__(self):
+            for row in tuple.__iter__(self):
+                seen.append(row[0])
+                yield row
+
+    result = QueryResult(statement="SELECT 1", rows=CountedRows((index,) for index in range(10_000)))
+    cache = QueryResultCache(max_entry_bytes=1_000)
+
+    assert not cache.put(make_key(), result, snapshots={})
+    assert 0 < len(seen) < 100
+
+
+def test_cache_invalidates_entries_by_table() -> None:
+    cache = QueryResultCache()
+    result = QueryResult(statement="SELECT 1", rows=((1,),))
+    cache.put(make_key(), result, snapshots={}, tables=("analytics.main",))
+
+    assert cache.invalidate_table("client-1", "ANALYTICS.MAIN") == 1
+    assert cache.get(make_key(), {}) is None
+
+
+def test_bound_parameters_are_part_of_the_cache_key() -> None:
+    engine = CountingEngine()
+    service = QueryService(
+        engine,
+        StubEntitlements(),
+        InMemoryQueryHistoryStore(),
+        result_cache=QueryResultCache(),
+        snapshot_resolver=lambda client_id, tables: {"analytics.main": "1"},
+    )
+    sql = "SELECT total FROM analytics.main WHERE id = ?"
+
+    service.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[1]))
+    service.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[1]))
+    service.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[2]))
+    service.execute(QueryRequest(client_id="client-1", sql=sql, parameters=[[1, 2]]))
+
+    assert engine.calls == 3
+
+
+def test_volatile_and_table_function_queries_are_not_cached() -> None:
+    engine = CountingEngine()
+    service = QueryService(
+        engine,
+        StubEntitlements(),
+        InMemoryQueryHistoryStore(),
+        result_cache=QueryResultCache(),
+        snapshot_resolver=lambda client_id, tables: {},
+    )
+
+    for sql in ("SELECT now()", "SELECT * FROM read_parquet('gs://bucket/a.parquet')", "SELECT random() FROM analytics.main"):
+        service.execute(QueryRequest(client_id="client-1", sql=sql))
+        service.execute(QueryRequest(client_id="client-1", sql=sql))
+
+    assert engine.calls == 6
+
+
+def test_cache_entries_expire_after_ttl() -> None:
+    now = [0.0]
+    cache = QueryResultCache(ttl_s=60.0, clock=lambda: now[0])
+    cache.put(make_key(), QueryResult(statement="SELECT 1", rows=((1,),)), snapshots={})
+
+    now[0] = 59.0
+    assert cache.get(make_key(), {}) is not None
+    now[0] = 60.0
+    assert cache.get(make_key(), {}) is None
+    assert cache.stats().entries == 0
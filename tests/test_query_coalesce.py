@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from query import (
+    BILL_LEADER,
+    BILL_SPLIT,
+    InMemoryQueryHistoryStore,
+    QueryCoalescer,
+    QueryError,
+    QueryHistoryFilter,
+    QueryRequest,
+    QueryResult,
+    QueryResultColumn,
+    QueryService,
+    QueryStatistics,
+)
+
+
+class StubEntitlements:
+    def __init__(self) -> None:
+        self.contexts = 0
+        self.recorded_usage: list[float] = []
+
+    @contextmanager
+    def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):
+        self.contexts += 1
+        yield {"client_id": client_id}
+
+    def record_query_usage(self, client_id: str, stats, *, entitlements=None) -> None:  # noqa: ANN001
+        self.recorded_usage.append(stats.data_scanned_mb)
+
+
+class GatedEngine:
+    def __init__(self, error: QueryError | None = None) -> None:
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._error = error
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(timeout=5)
+        if self._error is not None:
+            raise self._error
+        return QueryResult(
+            statement=request.sql,
+            columns=(QueryResultColumn(name="total"),),
+            rows=((42,),),
+            stats=QueryStatistics(elapsed_ms=10.0, data_scanned_mb=90.0, row_count=1),
+        )
+
+
+def run_concurrently(service: QueryService, engine: GatedEngine, count: int) -> list[QueryResult | Exception]:
+    outcomes: list[QueryResult | Exception] = []
+    lock = threading.Lock()
+
+    def run() -> None:
+        try:
+            outcome: QueryResult | Exception = service.execute(
+                QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main")
+            )
+        except Exception as exc:
+            outcome = exc
+        with lock:
+            outcomes.append(outcome)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    assert engine.started.wait(timeout=5)
+    followers = [threading.Thread(target=run) for _ in range(count - 1)]
+    for thread in followers:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while next(iter(service._coalescer._flights.values())).participants < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    engine.release.set()
+    for thread in [leader, *followers]:
+        thread.join(timeout=5)
+    return outcomes
+
+
+@pytest.mark.parametrize(
+    ("billing", "expected_usage"),
+    [(BILL_LEADER, [90.0]), (BILL_SPLIT, [30.0, 30.0, 30.0])],
+)
+def test_identical_concurrent_queries_run_once(billing: str, expected_usage: list[float]) -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements()
+    engine = GatedEngine()
+    service = QueryService(engine, entitlements, store, coalescer=QueryCoalescer(billing=billing))
+
+    outcomes = run_concurrently(service, engine, 3)
+
+    assert engine.calls == 1
+    assert entitlements.contexts == 1
+    assert [result.rows for result in outcomes] == [((42,),)] * 3
+    assert entitlements.recorded_usage == expected_usage
+    history = store.search(QueryHistoryFilter(client_id="client-1"))
+    assert len(history) == 3
+    assert {entry.status for entry in history} == {"SUCCEEDED"}
+    assert len({entry.query_id for entry in history}) == 3
+
+
+def test_followers_share_the_leader_failure() -> None:
+    store = InMemoryQueryHistoryStore()
+    engine = GatedEngine(error=QueryError("execution_error", "boom"))
+    service = QueryService(engine, StubEntitlements(), store, coalescer=QueryCoalescer())
+
+    outcomes = run_concurrently(service, engine, 2)
+
+    assert engine.calls == 1
+    assert all(isinstance(outcome, QueryError) for outcome in outcomes)
+    assert [entry.status for entry in store.search(QueryHistoryFilter(client_id="client-1"))] == ["FAILED", "FAILED"]
+
+
+def test_followers_can_be_cancelled_and_honour_the_plan_timeout() -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements()
+    # The plan gains a timeout after the leader was admitted, so only the followers see it.
+    timeouts = iter([None, 200, 200])
+    entitlements.get_entitlements = lambda client_id: type("Plan", (), {"query_timeout_ms": next(timeouts)})()
+    engine = GatedEngine()
+    service = QueryService(engine, entitlements, store, coalescer=QueryCoalescer())
+    outcomes: dict[str, QueryResult | Exception] = {}
+
+    def run(query_id: str) -> None:
+        try:
+            outcomes[query_id] = service.execute(
+                QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main"), query_id=query_id
+            )
+        except Exception as exc:
+            outcomes[query_id] = exc
+
+    def start(query_id: str, participants: int) -> threading.Thread:
+        thread = threading.Thread(target=run, args=(query_id,))
+        thread.start()
+        deadline = time.monotonic() + 5
+        while next(iter(service._coalescer._flights.values())).participants < participants:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        return thread
+
+    leader = threading.Thread(target=run, args=("leader",))
+    leader.start()
+    assert engine.started.wait(timeout=5)
+    cancelled = start("cancelled", 2)
+    assert service.cancel("cancelled", client_id="client-1")
+    cancelled.join(timeout=5)
+    timed_out = start("timed-out", 3)
+    timed_out.join(timeout=5)
+    engine.release.set()
+    leader.join(timeout=5)
+
+    assert isinstance(outcomes["cancelled"], QueryError) and outcomes["cancelled"].code == "query_cancelled"
+    assert isinstance(outcomes["timed-out"], QueryError) and outcomes["timed-out"].code == "query_timeout"
+    assert outcomes["leader"].rows == ((42,),)
+    statuses = {entry.query_id: entry.status for entry in store.search(QueryHistoryFilter(client_id="client-1"))}
+    assert statuses == {"leader": "SUCCEEDED", "cancelled": "CANCELLED", "timed-out": "TIMED_OUT"}
+
+
+def test_followers_run_again_when_the_leader_is_cancelled() -> None:
+    store = InMemoryQueryHistoryStore()
+    engine = GatedEngine()
+    service = QueryService(engine, StubEntitlements(), store, coalescer=QueryCoalescer())
+    outcomes: dict[str, QueryResult | Exception] = {}
+
+    def run(query_id: str) -> None:
+        try:
+            outcomes[query_id] = service.execute(
+                QueryRequest(client_id="client-1", sql="SELECT count(*) FROM analytics.main"), query_id=query_id
+            )
+        except Exception as exc:
+            outcomes[query_id] = exc
+
+    threads = [threading.Thread(target=run, args=("leader",)), threading.Thread(target=run, args=("follower",))]
+    threads[0].start()
+    assert engine.started.wait(timeout=5)
+    threads[1].start()
+    deadline = time.monotonic() + 5
+    while next(iter(service._coalescer._flights.values())).participants < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    assert service.cancel("leader", client_id="client-1")
+    engine.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert isinstance(outcomes["leader"], QueryError) and outcomes["leader"].code == "query_cancelled"
+    assert outcomes["follower"].rows == ((42,),)
+    assert engine.calls == 2
+    statuses = {entry.query_id: entry.status for entry in store.search(QueryHistoryFilter(client_id="client-1"))}
+    assert statuses == {"leader": "CANCELLED", "follower": "SUCCEEDED"}
+
+
+def test_unknown_billing_policy_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        QueryCoalescer(billing="free-for-all")
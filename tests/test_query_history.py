@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from query import (
+    InMemoryQueryHistoryStore,
+    LatencySketch,
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    RollupQueryHistoryStore,
+    summarise_history,
+)
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_entry(index: int, *, client_id: str = "client-1", tables: tuple[str, ...] = ()) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=f"q-{index}",
+        client_id=client_id,
+        statement="SELECT 1",
+        status="SUCCEEDED",
+        submitted_at=BASE + timedelta(minutes=index),
+        completed_at=None,
+        elapsed_ms=1.0,
+        data_scanned_mb=0.0,
+        row_count=1,
+        cost_usd=0.0,
+        tables=tables,
+    )
+
+
+def ids(entries) -> list[str]:  # noqa: ANN001
+    return [entry.query_id for entry in entries]
+
+
+def test_search_bisects_time_range_and_stops_at_limit() -> None:
+    store = InMemoryQueryHistoryStore()
+    store.append_many([make_entry(index) for index in (0, 1, 2, 5, 6)])
+    store.append(make_entry(4))  # out of order
+    store.append(make_entry(3, client_id="client-2"))
+
+    everything = store.search(QueryHistoryFilter(client_id="client-1"))
+    bounded = store.search(
+        QueryHistoryFilter(client_id="client-1", start=BASE + timedelta(minutes=1), end=BASE + timedelta(minutes=5))
+    )
+    limited = store.search(QueryHistoryFilter(client_id="client-1", limit=2))
+
+    assert ids(everything) == ["q-6", "q-5", "q-4", "q-2", "q-1", "q-0"]
+    assert ids(bounded) == ["q-5", "q-4", "q-2", "q-1"]
+    assert ids(limited) == ["q-6", "q-5"]
+    assert store.search(QueryHistoryFilter(client_id="client-3")) == []
+
+
+def test_table_filter_uses_index_and_matches_qualified_names() -> None:
+    store = InMemoryQueryHistoryStore()
+    store.append_many(
+        [
+            make_entry(0, tables=("analytics.Events",)),
+            make_entry(1, tables=("analytics.users",)),
+            make_entry(2, tables=("analytics.events", "staging.events")),
+            make_entry(3, tables=("staging.events",)),
+        ]
+    )
+
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="EVENTS"))) == ["q-3", "q-2", "q-0"]
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="analytics.events"))) == ["q-2", "q-0"]
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="events", limit=2))) == ["q-3", "q-2"]
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="orders")) == []
+    # Only full or unqualified names match, as in the persistent stores.
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="vents")) == []
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="analytics")) == []
+
+
+def test_retention_hides_and_evicts_old_entries() -> None:
+    store = InMemoryQueryHistoryStore(retention=timedelta(minutes=10))
+    store.append_many([make_entry(index, tables=("analytics.events",)) for index in range(5)])
+    store.append(make_entry(12, tables=("analytics.events",)))
+
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1"))) == ["q-12", "q-4", "q-3", "q-2"]
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="events"))) == ["q-12", "q-4", "q-3", "q-2"]
+
+    store.append(make_entry(30))
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1"))) == ["q-30"]
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="events")) == []
+
+
+def test_latency_sketch_quantiles_are_relative_and_mergeable() -> None:
+    values = [float(value) for value in range(1, 1001)]
+    left = LatencySketch().add(*values[:400])
+    right = LatencySketch().add(*values[400:], 0.0)
+
+    merged = left.merge(right)
+
+    assert merged.count == 1001
+    assert merged.quantile(0.5) == pytest.approx(500, rel=0.02)
+    assert merged.quantile(0.95) == pytest.approx(950, rel=0.02)
+    assert LatencySketch.from_document(merged.to_document()) == merged
+    assert LatencySketch().quantile(0.5) is None
+
+
+class CountingStore(InMemoryQueryHistoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.searches: list[QueryHistoryFilter] = []
+
+    def search(self, query: QueryHistoryFilter):  # noqa: ANN201
+        self.searches.append(query)
+        return super().search(query)
+
+
+def test_rollups_summarise_ranges_without_scanning_full_days() -> None:
+    inner = CountingStore()
+    store = RollupQueryHistoryStore(inner)
+    entries = [
+        QueryHistoryEntry(
+            query_id=f"q-{index}",
+            client_id="client-1",
+            statement="SELECT 1",
+            status="FAILED" if index % 5 == 0 else "SUCCEEDED",
+            submitted_at=BASE + timedelta(hours=5 * index),
+            completed_at=None,
+            elapsed_ms=float(index + 1),
+            data_scanned_mb=1.5,
+            row_count=1,
+            cost_usd=0.25,
+        )
+        for index in range(60)
+    ]
+    store.append_many(entries)
+
+    ranges = [
+        (None, None),
+        (BASE + timedelta(hours=30), None),
+        (None, BASE + timedelta(days=4, hours=7)),
+        (BASE + timedelta(hours=13), BASE + timedelta(days=8, hours=2)),
+        (BASE + timedelta(days=2), BASE + timedelta(days=5) - timedelta(microseconds=1)),
+        (BASE + timedelta(days=3, hours=1), BASE + timedelta(days=3, hours=20)),
+    ]
+    for start, end in ranges:
+        query = QueryHistoryFilter(client_id="client-1", start=start, end=end, limit=1)
+        expected = summarise_history(
+            entry for entry in entries if (start is None or entry.submitted_at >= start) and (end is None or entry.submitted_at <= end)
+        )
+        inner.searches.clear()
+        summary = store.summarise(query)
+
+        assert summary.total_queries == expected.total_queries
+        assert summary.failed_queries == expected.failed_queries
+        assert summary.total_cost_usd == pytest.approx(expected.total_cost_usd)
+        assert summary.total_scanned_mb == pytest.approx(expected.total_scanned_mb)
+        assert (summary.range_start, summary.range_end) == (expected.range_start, expected.range_end)
+        assert summary.p95_elapsed_ms == pytest.approx(expected.p95_elapsed_ms)
+        # Only the partially covered days at the edges are searched.
+        for searched in inner.searches:
+            assert searched.start is not None and searched.end is not None
+            assert searched.end - searched.start < timedelta(days=1)
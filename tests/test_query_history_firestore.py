@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import pytest
+from google.cloud import firestore
+
+from query import FirestoreQueryHistoryStore, QueryHistoryEntry, QueryHistoryFilter, summarise_history
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_OPERATORS = {
+    ">=": lambda value, bound: value >= bound,
+    "<=": lambda value, bound: value <= bound,
+    "array_contains": lambda value, bound: bound in value,
+}
+
+
+def _merge(document: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for field, value in data.items():
+        current = document.get(field)
+        if isinstance(value, firestore.Increment):
+            document[field] = (current or 0) + value.value
+        elif isinstance(value, firestore.Minimum):
+            document[field] = value.value if current is None else min(current, value.value)
+        elif isinstance(value, firestore.Maximum):
+            document[field] = value.value if current is None else max(current, value.value)
+        elif isinstance(value, dict):
+            _merge(document.setdefault(field, {}), value)
+        else:
+            document[field] = value
+
+
+class FakeSnapshot:
+    def __init__(self, document_id: str, data: Dict[str, Any]) -> None:
+        self.id = document_id
+        self._data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store: "FakeFirestore", path: str) -> None:
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "FakeQuery":
+        return FakeQuery(self._store, f"{self.path}/{name}")
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        if merge:
+            _merge(self._store.documents.setdefault(self.path, {}), data)
+        else:
+            self._store.documents[self.path] = dict(data)
+
+
+class FakeQuery:
+    def __init__(self, store: "FakeFirestore", path: str, filters=(), orders=(), after=None, limit=None) -> None:  # noqa: ANN001
+        self._store = store
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._after = after
+        self._limit = limit
+
+    def _copy(self, **changes: Any) -> "FakeQuery":  # noqa: ANN401
+        state = {"filters": self._filters, "orders": self._orders, "after": self._after, "limit": self._limit}
+        state.update(changes)
+        return FakeQuery(self._store, self._path, **state)
+
+    def document(self, document_id: str) -> FakeDocument:
+        return FakeDocument(self._store, f"{self._path}/{document_id}")
+
+    def where(self, *, filter: Any) -> "FakeQuery":  # noqa: A002, ANN401
+        return self._copy(filters=(*self._filters, filter))
+
+    def order_by(self, field: str, direction: str) -> "FakeQuery":
+        assert direction == "DESCENDING"
+        return self._copy(orders=(*self._orders, field))
+
+    def start_after(self, values: Dict[str, Any]) -> "FakeQuery":
+        return self._copy(after=values)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def stream(self) -> list[FakeSnapshot]:
+        self._store.queries += 1
+        prefix = self._path + "/"
+        rows = [
+            (path.rsplit("/", 1)[-1], data)
+            for path, data in self._store.documents.items()
+            if path.startswith(prefix) and "/" not in path[len(prefix) :]
+        ]
+        for condition in self._filters:
+            rows = [row for row in rows if _OPERATORS[condition.op_string](row[1][condition.field_path], condition.value)]
+        if self._orders:
+            rows.sort(key=lambda row: (row[1]["submitted_at"], row[0]), reverse=True)
+        if self._after is not None:
+            position = (self._after["submitted_at"], self._after["__name__"].id)
+            rows = [row for row in rows if (row[1]["submitted_at"], row[0]) < position]
+        return [FakeSnapshot(document_id, data) for document_id, data in rows[: self._limit]]
+
+
+class FakeBatch:
+    def __init__(self, store: "FakeFirestore") -> None:
+        self._store = store
+        self._writes: list[tuple[FakeDocument, Dict[str, Any], bool]] = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append((ref, data, merge))
+
+    def commit(self) -> None:
+        self._store.commits += 1
+        for ref, data, merge in self._writes:
+            ref.set(data, merge=merge)
+
+
+class FakeFirestore:
+    def __init__(self) -> None:
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.commits = 0
+        self.queries = 0
+
+    def collection(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+
+def make_entry(index: int, *, hours: Optional[int] = None, tables: tuple[str, ...] = ()) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=f"q-{index:02d}",
+        client_id="client-1",
+        statement="SELECT 1",
+        status="SUCCEEDED",
+        submitted_at=BASE + timedelta(hours=index if hours is None else hours),
+        completed_at=None,
+        elapsed_ms=1.0,
+        data_scanned_mb=0.5,
+        row_count=1,
+        cost_usd=0.01,
+        tables=tables,
+    )
+
+
+def test_pages_follow_cursors_across_equal_timestamps() -> None:
+    db = FakeFirestore()
+    store = FirestoreQueryHistoryStore(db)  # type: ignore[arg-type]
+    store.append_many([make_entry(index, hours=index // 3) for index in range(7)])
+
+    seen: list[str] = []
+    cursor = None
+    while True:
+        page = store.search_page(QueryHistoryFilter(client_id="client-1"), page_size=3, cursor=cursor)
+        seen.extend(entry.query_id for entry in page.entries)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert seen == ["q-06", "q-05", "q-04", "q-03", "q-02", "q-01", "q-00"]
+    assert db.commits == 1
+    assert db.queries == 3
+
+
+def test_search_filters_by_range_and_table() -> None:
+    db = FakeFirestore()
+    store = FirestoreQueryHistoryStore(db)  # type: ignore[arg-type]
+    for index in range(6):
+        store.append(make_entry(index, tables=("Analytics.Events",) if index % 2 else ("analytics.users",)))
+
+    by_table = store.search(QueryHistoryFilter(client_id="client-1", table="events", limit=2))
+    by_range = store.search(
+        QueryHistoryFilter(client_id="client-1", start=BASE + timedelta(hours=1), end=BASE + timedelta(hours=3))
+    )
+
+    assert [entry.query_id for entry in by_table] == ["q-05", "q-03"]
+    assert by_table[0].tables == ("Analytics.Events",)
+    assert [entry.query_id for entry in by_range] == ["q-03", "q-02", "q-01"]
+
+
+def test_appends_maintain_daily_rollups() -> None:
+    db = FakeFirestore()
+    store = FirestoreQueryHistoryStore(db)  # type: ignore[arg-type]
+    entries = [make_entry(index, hours=7 * index) for index in range(10)]
+    store.append_many(entries[:6])
+    store.append_many(entries[6:])
+
+    rollups = {path.rsplit("/", 1)[-1]: data for path, data in db.documents.items() if "query_history_rollups" in path}
+    assert sorted(rollups) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert sum(data["total_queries"] for data in rollups.values()) == 10
+
+    start, end = BASE + timedelta(hours=10), BASE + timedelta(days=2, hours=12)
+    db.queries = 0
+    summary = store.summarise(QueryHistoryFilter(client_id="client-1", start=start, end=end))
+    expected = summarise_history(entry for entry in entries if start <= entry.submitted_at <= end)
+
+    assert db.queries == 3  # one rollup read plus the two partial days
+    assert summary.total_queries == expected.total_queries
+    assert summary.total_cost_usd == pytest.approx(expected.total_cost_usd)
+    assert (summary.range_start, summary.range_end) == (expected.range_start, expected.range_end)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pyarrow as pa
+
+from iceberg import QUERY_HISTORY_TABLE
+from iceberg.config import CatalogProvider, IcebergCatalogConfig
+from query import IcebergQueryHistoryStore, QueryHistoryEntry, QueryHistoryFilter
+
+BASE = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+_CLAUSE = re.compile(r"submitted_at (>=|<=) '([^']+)'")
+
+
+class FakeScan:
+    def __init__(self, table: "FakeTable", row_filter: str | None) -> None:
+        self._table = table
+        self._bounds = [(op, datetime.fromisoformat(value)) for op, value in _CLAUSE.findall(row_filter or "")]
+
+    def _rows(self) -> list[dict]:
+        rows = [row for batch in self._table.batches for row in batch.to_pylist()]
+        for op, value in self._bounds:
+            rows = [row for row in rows if (row["submitted_at"] >= value if op == ">=" else row["submitted_at"] <= value)]
+        return rows
+
+    def to_arrow(self) -> pa.Table:
+        self._table.reads += 1
+        return pa.Table.from_pylist(self._rows(), schema=self._table.batches[0].schema)
+
+    def plan_files(self) -> list[SimpleNamespace]:
+        days = {(row["submitted_at"].date() - datetime(1970, 1, 1).date()).days for row in self._rows()}
+        return [SimpleNamespace(file=SimpleNamespace(partition=[day])) for day in days]
+
+
+class FakeTable:
+    def __init__(self) -> None:
+        self.batches: list[pa.Table] = []
+        self.reads = 0
+
+    def append(self, batch: pa.Table) -> None:
+        self.batches.append(batch)
+
+    def refresh(self) -> "FakeTable":
+        return self
+
+    def spec(self) -> SimpleNamespace:
+        return SimpleNamespace(fields=[SimpleNamespace(name="submitted_at_day", transform="day")])
+
+    def scan(self, row_filter: str | None = None) -> FakeScan:
+        return FakeScan(self, row_filter)
+
+
+class FakeBootstrapper:
+    def __init__(self) -> None:
+        self.tables: dict[str, FakeTable] = {}
+
+    def ensure_table(self, client_id, config, table):  # noqa: ANN001, ANN201
+        assert table is QUERY_HISTORY_TABLE
+        return self.tables.setdefault(client_id, FakeTable())
+
+    def load_table(self, client_id, config, table):  # noqa: ANN001, ANN201
+        assert table is QUERY_HISTORY_TABLE
+        return self.tables.get(client_id)
+
+
+def make_entry(index: int, *, client_id: str = "client-1", tables: tuple[str, ...] = ()) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=f"q-{index}",
+        client_id=client_id,
+        statement="SELECT 1",
+        status="SUCCEEDED",
+        submitted_at=BASE + timedelta(hours=6 * index),
+        completed_at=None,
+        elapsed_ms=1.0,
+        data_scanned_mb=0.5,
+        row_count=index,
+        cost_usd=0.01,
+        tables=tables,
+    )
+
+
+def make_store() -> tuple[IcebergQueryHistoryStore, FakeBootstrapper]:
+    bootstrapper = FakeBootstrapper()
+    config = IcebergCatalogConfig(name="clients", provider=CatalogProvider.GCS, warehouse_bucket="analytics")
+    return IcebergQueryHistoryStore(config, bootstrapper), bootstrapper  # type: ignore[arg-type]
+
+
+def test_appends_one_batch_per_client_and_round_trips_entries() -> None:
+    store, bootstrapper = make_store()
+    entry = make_entry(0, tables=("analytics.events",))
+
+    store.append_many([entry, make_entry(1), make_entry(2, client_id="client-2")])
+
+    assert [batch.num_rows for batch in bootstrapper.tables["client-1"].batches] == [2]
+    assert [batch.num_rows for batch in bootstrapper.tables["client-2"].batches] == [1]
+    assert store.search(QueryHistoryFilter(client_id="client-1"))[-1] == entry
+
+
+def test_searching_a_client_without_history_does_not_create_its_table() -> None:
+    store, bootstrapper = make_store()
+
+    assert store.search(QueryHistoryFilter(client_id="client-1")) == []
+    assert "client-1" not in bootstrapper.tables
+
+    store.append(make_entry(0))
+    assert len(store.search(QueryHistoryFilter(client_id="client-1"))) == 1
+
+
+def test_limited_search_reads_newest_days_first() -> None:
+    store, bootstrapper = make_store()
+    store.append_many([make_entry(index, tables=("analytics.events",) if index % 2 else ()) for index in range(12)])
+    table = bootstrapper.tables["client-1"]
+
+    newest = store.search(QueryHistoryFilter(client_id="client-1", limit=2))
+    assert [entry.query_id for entry in newest] == ["q-11", "q-10"]
+    assert table.reads == 1
+
+    table.reads = 0
+    filtered = store.search(
+        QueryHistoryFilter(client_id="client-1", table="EVENTS", end=BASE + timedelta(hours=42), limit=3)
+    )
+    assert [entry.query_id for entry in filtered] == ["q-7", "q-5", "q-3"]
+    assert table.reads == 2
+
+    bounded = store.search(
+        QueryHistoryFilter(client_id="client-1", start=BASE + timedelta(hours=6), end=BASE + timedelta(hours=18))
+    )
+    assert [entry.query_id for entry in bounded] == ["q-3", "q-2", "q-1"]
+    # Table filters match full or unqualified names only, like the other stores.
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="vents")) == []
+    assert len(store.search(QueryHistoryFilter(client_id="client-1", table="analytics.events"))) == 6
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from query import QueryHistoryEntry, QueryHistoryFilter, SQLiteQueryHistoryStore
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_entry(index: int, *, client_id: str = "client-1", tables: tuple[str, ...] = ()) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=f"q-{index:02d}",
+        client_id=client_id,
+        statement="SELECT 1",
+        status="SUCCEEDED",
+        submitted_at=BASE + timedelta(hours=index // 2),
+        completed_at=BASE + timedelta(hours=index // 2, seconds=1),
+        elapsed_ms=1.0,
+        data_scanned_mb=0.5,
+        row_count=index,
+        cost_usd=0.01,
+        tables=tables,
+        snapshot_id="42" if index % 3 == 0 else None,
+        cache_hit=index % 4 == 0,
+    )
+
+
+def ids(entries) -> list[str]:  # noqa: ANN001
+    return [entry.query_id for entry in entries]
+
+
+def test_entries_survive_reopening_and_are_searched_by_range_and_table(tmp_path: Path) -> None:
+    path = tmp_path / "history.db"
+    store = SQLiteQueryHistoryStore(path)
+    entries = [make_entry(index, tables=("Analytics.Events",) if index % 2 else ("analytics.users",)) for index in range(8)]
+    store.append_many(entries)
+    store.append_many(entries[:2])  # a retried batch replaces rather than duplicates
+    store.append(make_entry(9, client_id="client-2"))
+    store.close()
+
+    reopened = SQLiteQueryHistoryStore(path)
+    everything = reopened.search(QueryHistoryFilter(client_id="client-1"))
+    assert ids(everything) == ["q-07", "q-06", "q-05", "q-04", "q-03", "q-02", "q-01", "q-00"]
+    assert everything[-1] == entries[0]
+
+    bounded = reopened.search(
+        QueryHistoryFilter(client_id="client-1", start=BASE + timedelta(hours=1), end=BASE + timedelta(hours=2), limit=3)
+    )
+    assert ids(bounded) == ["q-05", "q-04", "q-03"]
+    assert ids(reopened.search(QueryHistoryFilter(client_id="client-1", table="EVENTS"))) == ["q-07", "q-05", "q-03", "q-01"]
+    assert ids(reopened.search(QueryHistoryFilter(client_id="client-1", table="analytics.users", limit=1))) == ["q-06"]
+
+
+def test_replacing_an_entry_replaces_its_tables(tmp_path: Path) -> None:
+    store = SQLiteQueryHistoryStore(tmp_path / "history.db")
+    store.append(make_entry(1, tables=("analytics.events",)))
+    store.append(make_entry(1, tables=("analytics.users",)))
+
+    assert store.search(QueryHistoryFilter(client_id="client-1", table="events")) == []
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="users"))) == ["q-01"]
+
+
+def test_pages_follow_cursors(tmp_path: Path) -> None:
+    store = SQLiteQueryHistoryStore(tmp_path / "history.db")
+    store.append_many([make_entry(index) for index in range(7)])
+
+    seen: list[str] = []
+    cursor = None
+    while True:
+        page = store.search_page(QueryHistoryFilter(client_id="client-1"), page_size=3, cursor=cursor)
+        seen.extend(ids(page.entries))
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert seen == ["q-06", "q-05", "q-04", "q-03", "q-02", "q-01", "q-00"]
+
+
+def test_retention_prunes_old_entries(tmp_path: Path) -> None:
+    now = [(BASE + timedelta(hours=3)).timestamp()]
+    store = SQLiteQueryHistoryStore(
+        tmp_path / "history.db", retention=timedelta(hours=2), prune_interval_s=60, clock=lambda: now[0]
+    )
+    store.append_many([make_entry(index, tables=("events",)) for index in range(8)])
+
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1"))) == ["q-07", "q-06", "q-05", "q-04", "q-03", "q-02"]
+    now[0] += 3600
+    assert store.prune() == 2
+    assert ids(store.search(QueryHistoryFilter(client_id="client-1", table="events"))) == ["q-07", "q-06", "q-05", "q-04"]
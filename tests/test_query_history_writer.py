@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Sequence
+
+from query import (
+    BufferedHistoryWriter,
+    InMemoryQueryHistoryStore,
+    QueryHistoryEntry,
+    QueryHistoryFilter,
+    RollupQueryHistoryStore,
+    page_history,
+    summarise_search,
+)
+
+
+def make_entry(index: int) -> QueryHistoryEntry:
+    return QueryHistoryEntry(
+        query_id=f"q-{index}",
+        client_id="client-1",
+        statement="SELECT 1",
+        status="SUCCEEDED",
+        submitted_at=datetime(2024, 1, 1, 0, 0, index, tzinfo=timezone.utc),
+        completed_at=None,
+        elapsed_ms=1.0,
+        data_scanned_mb=0.0,
+        row_count=1,
+        cost_usd=0.0,
+    )
+
+
+class GatedStore(InMemoryQueryHistoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches: list[int] = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.failures = 0
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        self.started.set()
+        self.gate.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("backend unavailable")
+        self.batches.append(len(entries))
+        super().append_many(entries)
+
+
+def test_writer_batches_entries_and_flushes_on_close() -> None:
+    store = GatedStore()
+    store.gate.set()
+    writer = BufferedHistoryWriter(store, max_batch=2, flush_interval_s=3600)
+
+    for index in range(5):
+        writer.append(make_entry(index))
+    writer.close()
+
+    assert sum(store.batches) == 5
+    assert max(store.batches) == 2
+    assert writer.stats.written == 5
+    assert [entry.query_id for entry in store.search(QueryHistoryFilter(client_id="client-1"))][0] == "q-4"
+
+
+def test_full_queue_drops_entries_and_counts_overflows() -> None:
+    store = GatedStore()
+    writer = BufferedHistoryWriter(store, max_batch=2, max_queue=2, flush_interval_s=3600)
+
+    writer.append_many([make_entry(0), make_entry(1)])
+    assert store.started.wait(5)  # the first batch is stuck in the backend
+    writer.append_many([make_entry(2), make_entry(3), make_entry(4)])
+
+    stats = writer.stats
+    assert (stats.queued, stats.dropped, stats.overflows) == (2, 1, 1)
+    store.gate.set()
+    writer.close()
+    assert writer.stats.written == 4
+
+
+def test_failed_batches_are_retried() -> None:
+    store = GatedStore()
+    store.gate.set()
+    store.failures = 1
+    writer = BufferedHistoryWriter(store, max_batch=10, flush_interval_s=3600)
+
+    writer.append(make_entry(0))
+    assert writer.flush() == 0
+    assert writer.stats.failed_batches == 1
+    assert len(writer.search(QueryHistoryFilter(client_id="client-1"))) == 1
+    writer.close()
+
+
+class FailingStore(InMemoryQueryHistoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.attempts = 0
+
+    def append_many(self, entries: Sequence[QueryHistoryEntry]) -> None:
+        self.attempts += 1
+        raise RuntimeError("backend unavailable")
+
+
+def test_failed_writes_back_off_instead_of_spinning() -> None:
+    store = FailingStore()
+    writer = BufferedHistoryWriter(store, max_batch=1, flush_interval_s=0.05, max_backoff_s=0.2)
+
+    writer.append_many([make_entry(index) for index in range(5)])
+    time.sleep(0.5)
+
+    # Waits of 0.05, 0.1, 0.2, 0.2 ... seconds allow a handful of attempts, not thousands.
+    assert 1 <= store.attempts <= 8
+    assert writer.stats.queued == 5
+    writer.close()
+
+
+def test_writer_forwards_pages_and_summaries_to_the_wrapped_store() -> None:
+    rollups = RollupQueryHistoryStore(InMemoryQueryHistoryStore())
+    writer = BufferedHistoryWriter(rollups, flush_interval_s=3600)
+    writer.append_many([make_entry(index) for index in range(3)])
+    query = QueryHistoryFilter(client_id="client-1")
+
+    page = page_history(writer, query, page_size=2)
+    summary = summarise_search(writer, query, page.entries)
+
+    assert [entry.query_id for entry in page.entries] == ["q-2", "q-1"]
+    assert page.next_cursor is not None
+    assert summary.total_queries == 3
+    plain = BufferedHistoryWriter(InMemoryQueryHistoryStore(), flush_interval_s=3600)
+    assert plain.summarise(query) is None
+    writer.close()
+    plain.close()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from query import (
+    InMemoryQueryHistoryStore,
+    QueryError,
+    QueryHistoryFilter,
+    QueryJobManager,
+    QueryRequest,
+    QueryResult,
+    QueryResultColumn,
+    QueryResultStream,
+    QueryService,
+    QueryStatistics,
+)
+
+
+class StubEntitlements:
+    def __init__(self) -> None:
+        self.recorded_usage: list[int] = []
+
+    @contextmanager
+    def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):
+        yield {"client_id": client_id}
+
+    def record_query_usage(self, client_id: str, stats, *, entitlements=None) -> None:  # noqa: ANN001
+        self.recorded_usage.append(stats.result_rows)
+
+
+class StreamingEngine:
+    def __init__(self, rows: list[tuple[int]], *, chunk_size: int = 2, error: QueryError | None = None) -> None:
+        self._rows = rows
+        self._chunk_size = chunk_size
+        self._error = error
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        if self._error is not None:
+            raise self._error
+        assert request.stream
+        chunks = [self._rows[i : i + self._chunk_size] for i in range(0, len(self._rows), self._chunk_size)]
+        stream = QueryResultStream(
+            iter(chunks),
+            stats=lambda: QueryStatistics(elapsed_ms=1.0, data_scanned_mb=0.5, row_count=len(self._rows)),
+        )
+        return QueryResult(
+            statement=request.sql,
+            columns=(QueryResultColumn(name="id"),),
+            rows=stream,
+            stats=QueryStatistics(elapsed_ms=0.0, data_scanned_mb=0.0),
+        )
+
+
+def _manager(engine, **kwargs) -> tuple[QueryJobManager, InMemoryQueryHistoryStore]:  # noqa: ANN001
+    store = InMemoryQueryHistoryStore()
+    service = QueryService(engine, StubEntitlements(), store)
+    return QueryJobManager(service, **kwargs), store
+
+
+def test_submitted_query_spools_rows_into_pages() -> None:
+    manager, store = _manager(StreamingEngine([(i,) for i in range(5)]), page_size=2)
+
+    info = manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    manager.shutdown()
+
+    job = manager.get(info.query_id)
+    assert job is not None
+    assert job.status == "SUCCEEDED"
+    assert job.rows_spooled == 5
+    assert job.pages_available == 3
+    assert job.stats is not None and job.stats.data_scanned_mb == 0.5
+
+    first = manager.fetch_page(info.query_id, 0)
+    assert first is not None and first.ready
+    assert list(first.rows) == [(0,), (1,)]
+    assert first.next_page == 1
+    last = manager.fetch_page(info.query_id, 2)
+    assert last is not None
+    assert list(last.rows) == [(4,)]
+    assert last.next_page is None
+
+    (history,) = store.search(QueryHistoryFilter(client_id="client-1"))
+    assert history.query_id == info.query_id
+    assert history.status == "SUCCEEDED"
+
+
+def test_spooling_stops_at_row_budget() -> None:
+    manager, store = _manager(StreamingEngine([(i,) for i in range(10)]), page_size=3, max_spooled_rows=4)
+
+    info = manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    manager.shutdown()
+
+    job = manager.get(info.query_id)
+    assert job is not None
+    assert job.truncated
+    assert job.rows_spooled == 4
+    assert job.status == "SUCCEEDED"
+    assert job.stats is not None and job.stats.data_scanned_mb == 0.5
+    history = store.search(QueryHistoryFilter(client_id="client-1"))[0]
+    assert (history.status, history.data_scanned_mb, history.row_count) == ("SUCCEEDED", 0.5, 10)
+
+
+def test_failed_query_reports_error() -> None:
+    engine = StreamingEngine([], error=QueryError("invalid_sql", "bad query"))
+    manager, _ = _manager(engine)
+
+    info = manager.submit(QueryRequest(client_id="client-1", sql="SELEC 1"))
+    manager.shutdown()
+
+    job = manager.get(info.query_id)
+    assert job is not None
+    assert job.status == "FAILED"
+    assert job.error_code == "invalid_sql"
+    assert manager.get("unknown") is None
+    assert manager.fetch_page("unknown", 0) is None
+
+
+def test_submissions_are_capped_per_client_and_by_the_spool_budget() -> None:
+    manager, _ = _manager(StreamingEngine([(i,) for i in range(5)]), max_retained_jobs_per_client=1)
+    manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    manager.shutdown()
+
+    with pytest.raises(QueryError) as retained:
+        manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    assert retained.value.code == "too_many_jobs"
+
+    manager, _ = _manager(StreamingEngine([(i,) for i in range(5)]), max_total_spooled_rows=5)
+    manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    manager.shutdown()
+
+    with pytest.raises(QueryError) as spool:
+        manager.submit(QueryRequest(client_id="client-2", sql="SELECT id FROM demo.events"))
+    assert spool.value.code == "spool_full"
+
+
+def test_active_jobs_are_capped_per_client() -> None:
+    gate = threading.Event()
+
+    class BlockingEngine(StreamingEngine):
+        def execute(self, request: QueryRequest) -> QueryResult:
+            gate.wait(5)
+            return super().execute(request)
+
+    manager, _ = _manager(BlockingEngine([(1,)]), max_active_jobs_per_client=1)
+    manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+    try:
+        with pytest.raises(QueryError) as excinfo:
+            manager.submit(QueryRequest(client_id="client-1", sql="SELECT id FROM demo.events"))
+        assert excinfo.value.code == "too_many_jobs"
+        manager.submit(QueryRequest(client_id="client-2", sql="SELECT id FROM demo.events"))
+    finally:
+        gate.set()
+        manager.shutdown()
+
+
+def test_cancel_before_the_service_registers_the_job_is_honoured() -> None:
+    entered = threading.Event()
+    release = threading.Event()
+
+    class UnregisteredService:
+        def __init__(self) -> None:
+            self.cancel_calls = 0
+
+        def execute(self, request: QueryRequest, *, query_id: str) -> QueryResult:
+            entered.set()
+            release.wait(5)
+
+            def chunks():
+                if self.cancel_calls > 1:
+                    raise QueryError("query_cancelled", "Query was cancelled")
+                yield [(1,)]
+
+            return QueryResult(statement=request.sql, columns=(), rows=QueryResultStream(chunks()))
+
+        def cancel(self, query_id: str, *, client_id: str | None = None) -> bool:
+            self.cancel_calls += 1
+            # The first call lands before the query is registered with the service.
+            return self.cancel_calls > 1
+
+    service = UnregisteredService()
+    manager = QueryJobManager(service)  # type: ignore[arg-type]
+    info = manager.submit(QueryRequest(client_id="client-1", sql="SELECT 1"))
+    assert entered.wait(5)
+
+    assert manager.cancel(info.query_id)
+    release.set()
+    manager.shutdown()
+
+    job = manager.get(info.query_id)
+    assert job is not None
+    assert job.status == "CANCELLED"
+    assert service.cancel_calls == 2
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from iceberg.bootstrap import ClientCatalogHandle
+from query import (
+    IcebergScanPlanner,
+    InMemoryQueryHistoryStore,
+    QueryRequest,
+    QueryResult,
+    QueryService,
+    catalog_table_loader,
+)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class FakeSnapshot:
+    snapshot_id: int
+    summary: dict[str, str]
+
+
+@dataclass
+class FakeDataFile:
+    file_size_in_bytes: int
+    day: str
+    column_sizes: dict[int, int] | None = None
+
+
+@dataclass
+class FakeTask:
+    file: FakeDataFile
+    delete_files: tuple[Any, ...] = ()
+
+
+@dataclass
+class FakeField:
+    name: str
+    field_id: int
+
+
+class FakeSchema:
+    def __init__(self, *columns: str) -> None:
+        self._fields = {column.lower(): FakeField(column, field_id) for field_id, column in enumerate(columns, 1)}
+
+    def find_field(self, name: str, case_sensitive: bool = True) -> FakeField:
+        if name.lower() not in self._fields:
+            raise ValueError(name)
+        return self._fields[name.lower()]
+
+
+class FakeScan:
+    def __init__(self, files: list[FakeDataFile], keep: Callable[[FakeDataFile], bool]) -> None:
+        self._tasks = [FakeTask(file) for file in files if keep(file)]
+
+    def plan_files(self) -> list[FakeTask]:
+        return self._tasks
+
+
+@dataclass
+class FakeTable:
+    files: list[FakeDataFile]
+    snapshot: FakeSnapshot
+    filters: list[str | None] = field(default_factory=list)
+
+    def schema(self) -> FakeSchema:
+        return FakeSchema("ts", "kind", "id")
+
+    def current_snapshot(self) -> FakeSnapshot:
+        return self.snapshot
+
+    def snapshot_by_id(self, snapshot_id: int) -> FakeSnapshot:
+        return self.snapshot
+
+    def scan(self, row_filter: str | None = None, snapshot_id: int | None = None) -> FakeScan:
+        self.filters.append(row_filter)
+        # Stand-in for manifest pruning: keep files whose partition day is quoted in the filter.
+        return FakeScan(self.files, lambda file: row_filter is None or f"'{file.day}'" in row_filter)
+
+
+def make_table() -> FakeTable:
+    files = [FakeDataFile(100 * MB, "2024-01-01"), FakeDataFile(300 * MB, "2024-01-02")]
+    return FakeTable(files=files, snapshot=FakeSnapshot(7, {"total-files-size": str(400 * MB)}))
+
+
+def test_unfiltered_scans_use_the_snapshot_summary() -> None:
+    table = make_table()
+    planner = IcebergScanPlanner(lambda client_id, name: table if name == "events" else None)
+
+    estimate = planner.plan("client-1", "SELECT * FROM events e JOIN missing m ON e.id = m.id")
+
+    assert estimate.total_mb == 400.0
+    assert estimate.unresolved == ("missing",)
+    assert table.filters == []
+
+
+def test_simple_predicates_prune_files_through_the_planned_scan() -> None:
+    table = make_table()
+    planner = IcebergScanPlanner(lambda client_id, name: table)
+    request = QueryRequest(
+        client_id="client-1",
+        sql="SELECT kind FROM events WHERE ts = '2024-01-01' AND lower(kind) = 'x' AND unknown > 3",
+    )
+
+    assert planner(request) == 100.0
+    assert table.filters == ["ts = '2024-01-01'"]
+    assert planner(request) == 100.0
+    assert len(table.filters) == 1  # cached per snapshot and filter
+
+    grouped = "SELECT kind, count(*) AS ts FROM events GROUP BY kind HAVING ts = '2024-01-01'"
+    assert planner.plan("client-1", grouped).row_filter is None
+
+
+def test_service_prechecks_with_the_larger_estimate() -> None:
+    class RecordingEntitlements:
+        def __init__(self) -> None:
+            self.estimates: list[float] = []
+
+        def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):  # noqa: ANN201
+            self.estimates.append(estimated_scan_mb)
+            return nullcontext(None)
+
+        def record_query_usage(self, client_id: str, stats, *, entitlements=None) -> None:  # noqa: ANN001
+            pass
+
+    class Engine:
+        def execute(self, request: QueryRequest) -> QueryResult:
+            return QueryResult(statement=request.sql, columns=(), rows=())
+
+    entitlements = RecordingEntitlements()
+    table = make_table()
+    service = QueryService(
+        Engine(),
+        entitlements,
+        InMemoryQueryHistoryStore(),
+        clock=lambda: datetime(2024, 1, 1, tzinfo=timezone.utc),
+        scan_estimator=IcebergScanPlanner(lambda client_id, name: table),
+    )
+
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM events", estimated_scan_mb=1.0))
+    service.execute(QueryRequest(client_id="client-1", sql="SELECT * FROM events", estimated_scan_mb=900.0))
+
+    assert entitlements.estimates == [400.0, 900.0]
+
+
+def test_projected_columns_are_sized_from_the_manifests() -> None:
+    table = make_table()
+    table.files[0].column_sizes = {1: 10 * MB, 2: 40 * MB, 3: 50 * MB}
+    table.files[1].column_sizes = {1: 30 * MB, 2: 120 * MB, 3: 150 * MB}
+    planner = IcebergScanPlanner(lambda client_id, name: table)
+
+    assert planner.plan("client-1", "SELECT e.id, total FROM events e").total_mb == 200.0
+    assert planner.plan("client-1", "SELECT kind FROM events WHERE ts = '2024-01-02'").total_mb == 150.0
+    assert planner.plan("client-1", "SELECT e.*, id FROM events e").total_mb == 400.0
+
+
+def test_limits_without_ordering_make_the_estimate_unreliable() -> None:
+    table = make_table()
+    planner = IcebergScanPlanner(lambda client_id, name: table)
+
+    assert planner.plan("client-1", "SELECT id FROM big LIMIT 10").limited
+    assert planner(QueryRequest(client_id="client-1", sql="SELECT id FROM big LIMIT 10")) is None
+    assert planner(QueryRequest(client_id="client-1", sql="SELECT id FROM big ORDER BY ts LIMIT 10")) == 400.0
+
+
+def test_catalog_loader_caches_tables_until_the_ttl_expires() -> None:
+    class Catalog:
+        def __init__(self) -> None:
+            self.calls: list[str] = []
+
+        def table_exists(self, identifier: tuple[str, ...]) -> bool:
+            self.calls.append("exists")
+            return identifier[-1] == "events"
+
+        def load_table(self, identifier: tuple[str, ...]) -> str:
+            self.calls.append("load")
+            return ".".join(identifier)
+
+    catalog = Catalog()
+
+    class Bootstrapper:
+        def open_catalog(self, client_id: str, config: Any) -> ClientCatalogHandle:  # noqa: ANN401
+            return ClientCatalogHandle(client_id=client_id, catalog=catalog, namespace=(client_id,), warehouse_uri="")
+
+    now = [0.0]
+    load = catalog_table_loader(None, Bootstrapper(), ttl_s=60.0, clock=lambda: now[0])
+
+    assert load("client-1", "events") == "client-1.events"
+    assert load("client-1", "events") == "client-1.events"
+    assert load("client-1", "missing") is None
+    assert load("client-1", "missing") is None
+    assert catalog.calls == ["exists", "load", "exists"]
+
+    now[0] = 61.0
+    assert load("client-1", "events") == "client-1.events"
+    assert catalog.calls[3:] == ["exists", "load"]
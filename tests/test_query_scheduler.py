@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from query import (
+    FairShareScheduler,
+    InMemoryQueryHistoryStore,
+    QueryError,
+    QueryHistoryFilter,
+    QueryRequest,
+    QueryResult,
+    QueryService,
+)
+
+
+def wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:  # pragma: no cover - diagnostic guard
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def test_backlogged_clients_are_admitted_in_proportion_to_plan_weight() -> None:
+    scheduler = FairShareScheduler(max_concurrency=1)
+    holder = scheduler.acquire("holder")
+    order: list[str] = []
+    lock = threading.Lock()
+
+    def run(client_id: str, plan_id: str) -> None:
+        with scheduler.admit(client_id, plan_id=plan_id):
+            with lock:
+                order.append(client_id)
+
+    threads = [threading.Thread(target=run, args=("starter-client", "starter")) for _ in range(4)]
+    threads += [threading.Thread(target=run, args=("enterprise-client", "enterprise")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: scheduler.stats().queued == 8)
+    assert scheduler.stats().running == 1
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert order[:3] == ["enterprise-client"] * 3
+    assert order[-3:] == ["starter-client"] * 3
+    assert scheduler.stats().running == 0
+
+
+def test_queue_timeout_and_queue_bound_raise_query_errors() -> None:
+    scheduler = FairShareScheduler(max_concurrency=1, max_queued_per_client=1, queue_timeout_s=0.05)
+    holder = scheduler.acquire("client-a")
+
+    with pytest.raises(QueryError) as excinfo:
+        scheduler.acquire("client-b")
+    assert excinfo.value.code == "queue_timeout"
+    assert scheduler.stats().queued == 0
+
+    scheduler.release(holder)
+
+    bounded = FairShareScheduler(max_concurrency=1, max_queued_per_client=1, queue_timeout_s=5.0)
+    holder = bounded.acquire("client-a")
+    queued = threading.Thread(target=lambda: bounded.release(bounded.acquire("client-b")))
+    queued.start()
+    wait_for(lambda: bounded.stats().queued == 1)
+    with pytest.raises(QueryError) as excinfo:
+        bounded.acquire("client-b")
+    assert excinfo.value.code == "queue_full"
+    bounded.release(holder)
+    queued.join(timeout=2)
+    assert bounded.stats().running == 0
+
+
+def test_service_queues_before_taking_a_slot_and_can_cancel_queued_queries() -> None:
+    class Entitlements:
+        def __init__(self) -> None:
+            self.contexts = 0
+
+        @contextmanager
+        def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):
+            self.contexts += 1
+            yield None
+
+        def record_query_usage(self, client_id, stats, *, entitlements=None) -> None:  # noqa: ANN001
+            return None
+
+    class Engine:
+        def execute(self, request: QueryRequest) -> QueryResult:
+            return QueryResult(statement=request.sql, rows=((1,),))
+
+    scheduler = FairShareScheduler(max_concurrency=1, queue_timeout_s=5.0)
+    holder = scheduler.acquire("client-a")
+    entitlements = Entitlements()
+    store = InMemoryQueryHistoryStore()
+    service = QueryService(Engine(), entitlements, store, scheduler=scheduler)
+    outcomes: dict[str, Exception] = {}
+
+    def run(query_id: str, timeout_ms: int | None = None) -> None:
+        try:
+            service.execute(QueryRequest(client_id="client-a", sql="SELECT 1", timeout_ms=timeout_ms), query_id=query_id)
+        except QueryError as exc:
+            outcomes[query_id] = exc
+
+    cancelled = threading.Thread(target=run, args=("cancelled",))
+    cancelled.start()
+    wait_for(lambda: scheduler.stats().queued == 1)
+    assert entitlements.contexts == 0  # queued queries hold no entitlement slot
+    assert service.cancel("cancelled")
+    cancelled.join(timeout=2)
+
+    run("timed-out", timeout_ms=50)
+    scheduler.release(holder)
+
+    assert outcomes["cancelled"].code == "query_cancelled"
+    assert outcomes["timed-out"].code == "query_timeout"
+    assert entitlements.contexts == 0
+    assert scheduler.stats().queued == 0
+    statuses = {entry.query_id: entry.status for entry in store.search(QueryHistoryFilter(client_id="client-a"))}
+    assert statuses == {"cancelled": "CANCELLED", "timed-out": "TIMED_OUT"}
+
+
+def test_service_reports_queue_time_in_statistics() -> None:
+    class Entitlements:
+        @contextmanager
+        def query_context(self, client_id: str, *, estimated_scan_mb: float = 0.0):
+            yield None
+
+        def record_query_usage(self, client_id, stats, *, entitlements=None) -> None:  # noqa: ANN001
+            return None
+
+    class Engine:
+        def execute(self, request: QueryRequest) -> QueryResult:
+            return QueryResult(statement=request.sql, rows=((1,),))
+
+    service = QueryService(Engine(), Entitlements(), InMemoryQueryHistoryStore(), scheduler=FairShareScheduler())
+
+    result = service.execute(QueryRequest(client_id="client-a", sql="SELECT 1"))
+
+    assert result.stats.queue_ms is not None and result.stats.queue_ms >= 0
+    assert result.rows == ((1,),)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import threading
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from typing import Iterator
@@ -15,6 +16,7 @@ from query import (
     QueryRequest,
     QueryResult,
     QueryResultColumn,
+    QueryResultStream,
     QueryService,
     QueryStatistics,
     summarise_history,
@@ -134,3 +136,114 @@ def test_history_store_filters_by_date_and_table() -> None:
     assert summary.total_queries == 3
     assert summary.failed_queries == 0
     assert summary.total_cost_usd == pytest.approx(sum(e.cost_usd for e in filtered))
+
+
+def test_streaming_result_finalises_history_and_usage_when_exhausted() -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements()
+    stream = QueryResultStream(
+        iter([[(1,), (2,)], [(3,)]]),
+        stats=lambda: QueryStatistics(elapsed_ms=4.0, data_scanned_mb=8.0, row_count=3),
+    )
+    engine = StubEngine(QueryResult(statement="SELECT id FROM demo.events", rows=stream))
+    clock = iter(iter_times(datetime(2024, 1, 3, tzinfo=timezone.utc), count=2))
+    service = QueryService(engine, entitlements, store, clock=lambda: next(clock))
+
+    result = service.execute(QueryRequest(client_id="client-789", sql="SELECT id FROM demo.events", stream=True))
+
+    assert store.search(QueryHistoryFilter(client_id="client-789")) == []
+    assert list(result.iter_rows()) == [(1,), (2,), (3,)]
+    assert entitlements.recorded_usage == [("client-789", 8.0, 3)]
+    entry = store.search(QueryHistoryFilter(client_id="client-789"))[0]
+    assert entry.status == "SUCCEEDED"
+    assert entry.row_count == 3
+
+
+def test_streaming_result_closed_early_is_recorded_as_cancelled() -> None:
+    store = InMemoryQueryHistoryStore()
+    entitlements = StubEntitlements()
+    stream = QueryResultStream(iter([[(1,)], [(2,)]]))
+    engine = StubEngine(QueryResult(statement="SELECT 1", rows=stream))
+    service = QueryService(engine, entitlements, store)
+
+    result = service.execute(
+        QueryRequest(client_id="client-789", sql="SELECT 1", stream=True, estimated_scan_mb=8.0)
+    )
+    next(result.rows)
+    result.rows.close()
+
+    entry = store.search(QueryHistoryFilter(client_id="client-789"))[0]
+    assert entry.status == "CANCELLED"
+    assert entry.row_count == 1
+    # The scan of an abandoned stream is unknown, so the precheck estimate is billed.
+    assert entry.data_scanned_mb == 8.0
+    assert entitlements.recorded_usage == [("client-789", 8.0, 1)]
+
+
+class BlockingEngine:
+    def __init__(self) -> None:
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        self.started.set()
+        if not self.cancelled.wait(timeout=5):
+            raise AssertionError("query was never interrupted")
+        raise QueryError("query_cancelled", "Query was cancelled")
+
+    def cancel(self, query_id: str) -> bool:
+        self.cancelled.set()
+        return True
+
+
+def test_query_exceeding_timeout_is_interrupted_and_recorded() -> None:
+    store = InMemoryQueryHistoryStore()
+    service = QueryService(BlockingEngine(), StubEntitlements(), store)
+
+    with pytest.raises(QueryError) as excinfo:
+        service.execute(QueryRequest(client_id="client-1", sql="SELECT 1", timeout_ms=20))
+
+    assert excinfo.value.code == "query_timeout"
+    entry = store.search(QueryHistoryFilter(client_id="client-1"))[0]
+    assert entry.status == "TIMED_OUT"
+
+
+def test_cancel_interrupts_running_query() -> None:
+    store = InMemoryQueryHistoryStore()
+    engine = BlockingEngine()
+    service = QueryService(engine, StubEntitlements(), store)
+    errors: list[QueryError] = []
+
+    def run() -> None:
+        try:
+            service.execute(QueryRequest(client_id="client-1", sql="SELECT 1"), query_id="query-1")
+        except QueryError as exc:
+            errors.append(exc)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    assert engine.started.wait(timeout=5)
+    with pytest.raises(QueryError) as duplicate:
+        service.execute(QueryRequest(client_id="client-2", sql="SELECT 2"), query_id="query-1")
+    assert duplicate.value.code == "duplicate_query_id"
+    assert not service.cancel("query-1", client_id="client-2")
+    assert service.cancel("query-1", client_id="client-1")
+    worker.join(timeout=5)
+
+    assert [error.code for error in errors] == ["query_cancelled"]
+    assert store.search(QueryHistoryFilter(client_id="client-1"))[0].status == "CANCELLED"
+    assert not service.cancel("query-1")
+
+
+def test_cancelled_stream_fails_on_next_read() -> None:
+    store = InMemoryQueryHistoryStore()
+    stream = QueryResultStream(iter([[(1,)], [(2,)]]))
+    service = QueryService(StubEngine(QueryResult(statement="SELECT 1", rows=stream)), StubEntitlements(), store)
+
+    result = service.execute(QueryRequest(client_id="client-1", sql="SELECT 1", stream=True), query_id="query-2")
+    next(result.rows)
+    assert service.cancel("query-2")
+    with pytest.raises(QueryError):
+        next(result.rows)
+
+    assert store.search(QueryHistoryFilter(client_id="client-1"))[0].status == "CANCELLED"
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from query import analyze_sql, extract_tables
+from query.sql import is_cacheable, is_read_only, tokenize
+
+
+def test_tokenize_skips_comments_and_keeps_quoted_identifiers() -> None:
+    tokens = tokenize('SELECT "Total ""Sales""" -- note\nFROM/* inline */t')
+
+    assert [token.text for token in tokens] == ["SELECT", '"Total ""Sales"""', "FROM", "t"]
+    assert tokens[1].value == 'Total "Sales"'
+
+
+def test_extract_tables_handles_ctes_subqueries_and_quoting() -> None:
+    statement = """
+        WITH recent AS (SELECT id FROM "Analytics"."Events" WHERE ts > now() - INTERVAL 1 DAY)
+        SELECT r.id FROM(SELECT id FROM recent) r, demo.users u
+        JOIN `raw events` e ON e.id = r.id
+    """
+
+    assert extract_tables(statement) == ("Analytics.Events", "demo.users", "raw events")
+
+
+def test_extract_tables_continues_comma_joins_after_lateral_sources() -> None:
+    assert extract_tables("SELECT * FROM a, lateral (select 1) x, t4") == ("a", "t4")
+    assert extract_tables("SELECT * FROM a, LATERAL (SELECT * FROM b WHERE b.id = a.id) x, t4") == ("a", "b", "t4")
+    assert extract_tables("SELECT * FROM a, lateral unnest(a.tags) u, t4") == ("a", "t4")
+
+
+def test_extract_tables_continues_comma_joins_after_join_clauses() -> None:
+    assert extract_tables("select * from a join b on a.x = b.x, c") == ("a", "b", "c")
+    assert extract_tables("select * from a join b using (id), c") == ("a", "b", "c")
+    assert extract_tables("select * from (a join b on true), c") == ("a", "b", "c")
+    assert extract_tables("select * from ((select 1) s join b on true) g, c") == ("b", "c")
+
+
+def test_extract_tables_continues_comma_joins_after_samples_and_pivots() -> None:
+    assert extract_tables("select * from a tablesample 10%, c") == ("a", "c")
+    assert extract_tables("select * from a using sample 10% (bernoulli), c") == ("a", "c")
+    assert extract_tables("select * from a pivot (sum(x) for y in (1, 2)) p, c") == ("a", "c")
+    assert extract_tables("select a, b from t group by a, b") == ("t",)
+    assert extract_tables("insert into t (a, b) values (1, 2)") == ("t",)
+
+
+def test_extract_tables_ignores_table_functions_and_from_arguments() -> None:
+    statement = "SELECT extract(year FROM ts) FROM read_parquet('s3://bucket/a.parquet') p, demo.events"
+
+    assert extract_tables(statement) == ("demo.events",)
+    assert extract_tables("INSERT INTO audit.log SELECT * FROM demo.events") == ("audit.log", "demo.events")
+
+
+def test_analyze_sql_reports_columns_and_predicates() -> None:
+    analysis = analyze_sql(
+        "SELECT e.id, count(*) AS total FROM demo.events e "
+        "WHERE e.ts BETWEEN ? AND ? AND e.kind = 'click' GROUP BY e.id HAVING count(*) > 1"
+    )
+
+    assert analysis.tables == ("demo.events",)
+    assert analysis.columns == ("e.id", "e.kind", "e.ts")
+    assert analysis.predicates == ("e.ts BETWEEN ? AND ?", "e.kind = 'click'", "count(*) > 1")
+    assert analyze_sql("SELECT e.id, count(*) AS total FROM demo.events e") is analyze_sql(
+        "SELECT e.id, count(*) AS total FROM demo.events e"
+    )
+
+
+def test_is_read_only_rejects_writes_behind_ctes_and_extra_statements() -> None:
+    assert is_read_only("WITH a AS (SELECT 1), b(x) AS MATERIALIZED (SELECT 2) SELECT * FROM a, b;")
+    assert is_read_only("(SELECT 1) UNION (SELECT 2)")
+    assert not is_read_only("WITH x AS (SELECT 1) DELETE FROM t")
+    assert not is_read_only("WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d")
+    assert not is_read_only("SELECT 1; DROP TABLE t")
+    assert not is_read_only("INSERT INTO t SELECT 1")
+
+
+def test_is_cacheable_requires_catalog_tables_and_deterministic_functions() -> None:
+    assert is_cacheable("SELECT count(*) FROM analytics.events")
+    assert not is_cacheable("SELECT now()")
+    assert not is_cacheable("SELECT random() FROM analytics.events")
+    assert not is_cacheable("SELECT * FROM analytics.events WHERE day = current_date")
+    assert not is_cacheable("SELECT * FROM read_parquet('gs://bucket/a.parquet')")
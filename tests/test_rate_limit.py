@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from api.rate_limit import BucketSize, InMemorySharedCounter, RateLimiter, RateLimitExceeded
+from billing.models import PlanEntitlements
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+PLAN = PlanEntitlements(max_queries_per_day=1_000, max_scan_mb_per_day=None, max_concurrent_queries=1)
+
+
+def test_bucket_is_sized_from_entitlements() -> None:
+    assert BucketSize.from_entitlements(PLAN) == BucketSize(rate_per_s=2.0, capacity=10.0)
+    small = PlanEntitlements(max_queries_per_day=3, max_scan_mb_per_day=None, max_concurrent_queries=2)
+    assert BucketSize.from_entitlements(small) == BucketSize(rate_per_s=4.0, capacity=3.0)
+    unlimited = PlanEntitlements(max_queries_per_day=None, max_scan_mb_per_day=None, max_concurrent_queries=None)
+    assert BucketSize.from_entitlements(unlimited) is None
+
+
+def test_limiter_rejects_bursts_and_refills() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+
+    limiter.acquire("client-1", None)  # unknown plan: let through
+    for _ in range(10):
+        limiter.acquire("client-1", PLAN)
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.acquire("client-1", None)
+    assert excinfo.value.retry_after_s == pytest.approx(0.5)
+
+    clock.now = 0.5
+    limiter.acquire("client-1", PLAN)
+    limiter.acquire("client-2", PLAN)  # buckets are per client
+
+
+def test_shared_counter_drains_tokens_spent_by_other_instances() -> None:
+    clock = FakeClock()
+    shared = InMemorySharedCounter(clock=clock)
+    first = RateLimiter(shared=shared, sync_interval_s=0.0, clock=clock, wall_clock=clock)
+    second = RateLimiter(shared=shared, sync_interval_s=0.0, clock=clock, wall_clock=clock)
+
+    for _ in range(6):
+        first.acquire("client-1", PLAN)
+    first.acquire("client-1", PLAN)  # reports the six tokens above
+
+    for _ in range(4):  # ten tokens minus the six spent by the first instance
+        second.acquire("client-1", PLAN)
+    with pytest.raises(RateLimitExceeded):
+        second.acquire("client-1", PLAN)
+
+
+def test_async_acquire_syncs_the_shared_counter_off_the_event_loop() -> None:
+    clock = FakeClock()
+    threads: list[int] = []
+
+    class RecordingCounter(InMemorySharedCounter):
+        def increment(self, key: str, amount: int, ttl_s: float) -> int:
+            threads.append(threading.get_ident())
+            return super().increment(key, amount, ttl_s)
+
+    limiter = RateLimiter(shared=RecordingCounter(clock=clock), sync_interval_s=0.0, clock=clock, wall_clock=clock)
+
+    async def scenario() -> int:
+        for _ in range(10):
+            await limiter.acquire_async("client-1", PLAN)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire_async("client-1", PLAN)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert threads and loop_thread not in threads